@@ -23,14 +23,14 @@ class CitaAdmin(admin.ModelAdmin):
     list_display = ('paciente', 'terapeuta', 'fecha_hora', 'estado', 'tipo_sesion')
     list_filter = ('estado', 'tipo_sesion', 'fecha_hora')
     search_fields = ('paciente__nombres', 'paciente__apellidos', 'terapeuta__nombres')
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    readonly_fields = ('fecha_hora_fin', 'fecha_creacion', 'fecha_actualizacion')
     
     fieldsets = (
         ('Paciente y Terapeuta', {
             'fields': ('paciente', 'terapeuta')
         }),
         ('Fecha y Hora', {
-            'fields': ('fecha_hora', 'duracion_minutos')
+            'fields': ('fecha_hora', 'duracion_minutos', 'fecha_hora_fin')
         }),
         ('Detalles', {
             'fields': ('tipo_sesion', 'estado', 'motivo_cita', 'notas_adicionales')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CitasConfig(AppConfig):
     name = 'citas'
+
+    def ready(self):
+        from citas import exportacion, indices, signals  # noqa: F401
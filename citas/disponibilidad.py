@@ -0,0 +1,122 @@
+"""
+Cálculo de huecos libres de la agenda.
+
+Convierte las ventanas semanales de AgendaDisponibilidad en intervalos
+concretos y les resta las citas existentes con un barrido sobre listas
+ordenadas. Todo el rango se resuelve con dos consultas (disponibilidades y
+citas), sin importar cuántos días o terapeutas se pidan. Internamente los
+intervalos se manejan como segundos epoch para que el barrido compare enteros.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from citas.models import AgendaDisponibilidad, Cita, ESTADOS_QUE_OCUPAN
+
+
+def _epoch(valor, tz):
+    """Segundos epoch de un datetime local ingenuo interpretado en ``tz``."""
+    return int(valor.replace(tzinfo=tz).timestamp())
+
+
+def _desde_epoch(segundos, tz):
+    """Datetime en ``tz`` a partir de segundos epoch."""
+    return datetime.fromtimestamp(segundos, dt_timezone.utc).astimezone(tz)
+
+
+def _fusionar(intervalos):
+    """Ordena y une intervalos (inicio, fin) que se traslapan o se tocan."""
+    fusionados = []
+    for inicio, fin in sorted(intervalos):
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return [(inicio, fin) for inicio, fin in fusionados]
+
+
+def _restar(ventanas, ocupados):
+    """Resta los intervalos ocupados a las ventanas; ambas listas deben venir ordenadas."""
+    libres = []
+    j = 0
+    for inicio, fin in ventanas:
+        cursor = inicio
+        # Saltar citas que terminan antes de que empiece la ventana
+        while j < len(ocupados) and ocupados[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < fin:
+            ocupado_inicio, ocupado_fin = ocupados[k]
+            if ocupado_inicio > cursor:
+                libres.append((cursor, ocupado_inicio))
+            cursor = max(cursor, ocupado_fin)
+            if cursor >= fin:
+                break
+            k += 1
+        if cursor < fin:
+            libres.append((cursor, fin))
+    return libres
+
+
+def calcular_huecos(desde, hasta, terapeutas=None, duracion_minima=0):
+    """Huecos libres por terapeuta entre las fechas ``desde`` y ``hasta`` (inclusive).
+
+    Devuelve un diccionario ``{terapeuta_id: [(inicio, fin), ...]}`` con
+    datetimes en la zona horaria actual. Si se indica ``duracion_minima`` se
+    descartan los huecos más cortos que esa cantidad de minutos.
+    """
+    tz = timezone.get_current_timezone()
+    disponibilidades = AgendaDisponibilidad.objects.filter(activo=True, terapeuta__activo=True)
+    if terapeutas is not None:
+        disponibilidades = disponibilidades.filter(terapeuta_id__in=terapeutas)
+
+    ventanas_semana = defaultdict(lambda: defaultdict(list))
+    for terapeuta_id, dia_semana, hora_inicio, hora_fin in disponibilidades.values_list(
+        'terapeuta_id', 'dia_semana', 'hora_inicio', 'hora_fin'
+    ):
+        if hora_inicio < hora_fin:
+            ventanas_semana[terapeuta_id][dia_semana].append((hora_inicio, hora_fin))
+
+    if not ventanas_semana:
+        return {}
+
+    rango_inicio = timezone.make_aware(datetime.combine(desde, datetime.min.time()), tz)
+    rango_fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), datetime.min.time()), tz)
+
+    # Una sola consulta para todas las citas que tocan el rango
+    ocupados = defaultdict(list)
+    citas = Cita.objects.filter(
+        terapeuta_id__in=ventanas_semana.keys(),
+        estado__in=ESTADOS_QUE_OCUPAN,
+        fecha_hora__lt=rango_fin,
+        fecha_hora_fin__gt=rango_inicio,
+    ).order_by().values_list('terapeuta_id', 'fecha_hora', 'fecha_hora_fin')
+    for terapeuta_id, fecha_hora, fecha_hora_fin in citas:
+        ocupados[terapeuta_id].append((int(fecha_hora.timestamp()), int(fecha_hora_fin.timestamp())))
+
+    # Los terapeutas suelen compartir horarios: se memoriza la conversión a epoch
+    epochs = {}
+
+    def epoch(dia, hora):
+        clave = (dia, hora)
+        if clave not in epochs:
+            epochs[clave] = _epoch(datetime.combine(dia, hora), tz)
+        return epochs[clave]
+
+    dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    minimo = duracion_minima * 60
+    huecos = {}
+    for terapeuta_id, por_dia in ventanas_semana.items():
+        ventanas = [
+            (epoch(dia, hora_inicio), epoch(dia, hora_fin))
+            for dia in dias
+            for hora_inicio, hora_fin in por_dia.get(dia.weekday(), ())
+        ]
+        libres = _restar(_fusionar(ventanas), _fusionar(ocupados.get(terapeuta_id, ())))
+        huecos[terapeuta_id] = [
+            (_desde_epoch(inicio, tz), _desde_epoch(fin, tz))
+            for inicio, fin in libres if fin - inicio >= minimo
+        ]
+    return huecos
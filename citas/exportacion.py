@@ -0,0 +1,21 @@
+"""Conjuntos exportables de la agenda (ver ``fisioterapia.exportacion``)."""
+from citas.models import Cita
+from fisioterapia import exportacion
+
+exportacion.registrar('citas', 'Citas', lambda: Cita.objects.order_by('fecha_hora', 'pk'), (
+    ('ID', 'id'),
+    ('Fecha y hora', 'fecha_hora'),
+    ('Fin', 'fecha_hora_fin'),
+    ('Duración (min)', 'duracion_minutos'),
+    ('Estado', 'estado'),
+    ('Tipo de sesión', 'tipo_sesion'),
+    ('Paciente ID', 'paciente_id'),
+    ('Paciente', 'paciente__apellidos'),
+    ('Nombres', 'paciente__nombres'),
+    ('Terapeuta ID', 'terapeuta_id'),
+    ('Terapeuta', 'terapeuta__apellidos'),
+    ('Nombres terapeuta', 'terapeuta__nombres'),
+    ('Motivo', 'motivo_cita'),
+    ('Notas', 'notas_adicionales'),
+    ('Fecha de creación', 'fecha_creacion'),
+))
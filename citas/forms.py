@@ -1,6 +1,9 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.utils import timezone
 from citas.models import Cita, Terapeuta
+from pacientes.widgets import PacienteAutocompleteWidget
+from fisioterapia.seleccion_remota import SeleccionRemotaWidget
 
 
 class CitaForm(forms.ModelForm):
@@ -18,12 +21,15 @@ class CitaForm(forms.ModelForm):
         fields = ['paciente', 'terapeuta', 'fecha_hora', 'duracion_minutos',
                   'tipo_sesion', 'estado', 'motivo_cita', 'notas_adicionales']
         widgets = {
-            'paciente': forms.Select(attrs={
-                'class': 'form-select'
-            }),
-            'terapeuta': forms.Select(attrs={
-                'class': 'form-select'
-            }),
+            'paciente': PacienteAutocompleteWidget(
+                attrs={'class': 'form-control'},
+                placeholder='Sin paciente (escribe para buscar)'
+            ),
+            'terapeuta': SeleccionRemotaWidget(
+                reverse_lazy('citas:terapeuta-opciones'),
+                attrs={'class': 'form-control'},
+                placeholder='Buscar terapeuta...'
+            ),
             'fecha_hora': forms.DateTimeInput(
                 attrs={
                     'class': 'form-control',
@@ -0,0 +1,10 @@
+from citas.models import Cita, CitasProximas
+from fisioterapia import indices
+
+# Primera página de los listados por cursor: orden descendente + pk
+PAGINA = 21
+
+indices.registrar('cita_fecha_idx', lambda: Cita.objects.order_by('-fecha_hora', '-pk')[:PAGINA])
+indices.registrar('cita_estado_fecha_idx', lambda: Cita.objects.filter(estado='cancelada').order_by('-fecha_hora', '-pk')[:PAGINA])
+indices.registrar('cita_activas_fecha_idx', lambda: CitasProximas.objects.order_by('fecha_hora'), solo_postgresql=True)
+indices.registrar('cita_activas_fin_idx', lambda: Cita.objects.vencidas(), solo_postgresql=True)
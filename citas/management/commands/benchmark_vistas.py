@@ -0,0 +1,157 @@
+import json
+import re
+import time
+from pathlib import Path
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from fisioterapia.medicion import cliente_autenticado
+from historiaclinica.models import HistoriaClinica
+from pacientes.models import Paciente
+from tratamientos.models import TratamientoEstetico
+
+# Rutas que no se miden: autenticación, admin y la propia instrumentación
+EXCLUIDAS = {'login', 'logout', 'instrumentacion'}
+ESPACIOS_EXCLUIDOS = {'admin'}
+
+# Argumentos de URL que no son el pk del modelo de la vista
+MODELOS_POR_ARGUMENTO = {
+    'paciente_pk': Paciente,
+    'historia_pk': HistoriaClinica,
+    'tratamiento_pk': TratamientoEstetico,
+}
+
+
+def _rutas(patrones, prefijo='', espacio=None):
+    """(nombre_completo, patrón de texto, clase de vista) de todas las rutas con nombre."""
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            anidado = patron.namespace or espacio
+            if anidado in ESPACIOS_EXCLUIDOS:
+                continue
+            yield from _rutas(patron.url_patterns, prefijo + str(patron.pattern), anidado)
+        elif isinstance(patron, URLPattern) and patron.name:
+            nombre = f'{espacio}:{patron.name}' if espacio else patron.name
+            vista = getattr(patron.callback, 'view_class', None)
+            yield nombre, prefijo + str(patron.pattern), patron.pattern.converters, vista
+
+
+# Tiempo de conexión que publica InstrumentacionMiddleware en Server-Timing
+_CONEXION = re.compile(r'conn;dur=([\d.]+)')
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Recorre con el cliente de pruebas cada ruta GET del proyecto e informa p50/p95 y '
+        'consultas SQL; opcionalmente compara contra (o guarda) una línea base en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--base', type=str, default=str(Path(settings.BASE_DIR) / 'benchmark_base.json'),
+                            help='Archivo JSON con la línea base.')
+        parser.add_argument('--guardar', action='store_true', help='Guarda los resultados como nueva línea base.')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo de p95 aceptado antes de marcar una regresión.')
+        parser.add_argument('--filtro', type=str, default='', help='Solo rutas cuyo nombre contenga este texto.')
+        parser.add_argument('--usuario', help='Usuario existente con el que medir (por defecto uno temporal que se borra al terminar).')
+        parser.add_argument(
+            '--conexiones-reales', action='store_true',
+            help='Cierra o devuelve la conexión al terminar cada petición, como el servidor (según '
+                 'DB_CONN_MAX_AGE y DB_POOL); el cliente de pruebas normalmente la deja abierta.',
+        )
+
+    def handle(self, *args, **options):
+        resultados = {}
+        # Las rutas que fallan se reportan con su estado 500 en lugar de detener la medición
+        with cliente_autenticado(
+            options['usuario'],
+            raise_request_exception=False,
+            HTTP_HOST=(settings.ALLOWED_HOSTS or ['localhost'])[0],
+        ) as cliente:
+            for nombre, patron, convertidores, vista in _rutas(get_resolver().url_patterns):
+                if nombre in EXCLUIDAS or options['filtro'] not in nombre:
+                    continue
+                url = self.construir_url(patron, convertidores, vista)
+                if url is None:
+                    self.stdout.write(self.style.WARNING(f'{nombre}: sin datos para {patron}, se omite'))
+                    continue
+                resultados[nombre] = self.medir(cliente, url, options['repeticiones'], options['conexiones_reales'])
+
+        base = self.leer_base(options['base'])
+        regresiones = self.reportar(resultados, base, options['tolerancia'])
+        if options['guardar']:
+            Path(options['base']).write_text(json.dumps(resultados, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Línea base guardada en {options["base"]}'))
+        if regresiones and not options['guardar']:
+            self.stdout.write(self.style.ERROR(f'{regresiones} ruta(s) con regresión respecto a la línea base.'))
+
+    def construir_url(self, patron, convertidores, vista):
+        url = patron.replace('^', '').replace('$', '')
+        for argumento in convertidores:
+            modelo = MODELOS_POR_ARGUMENTO.get(argumento) or getattr(vista, 'model', None)
+            pk = modelo.objects.order_by('-pk').values_list('pk', flat=True).first() if modelo else None
+            if pk is None:
+                return None
+            url = url.replace(f'<int:{argumento}>', str(pk))
+        return '/' + url
+
+    def medir(self, cliente, url, repeticiones, conexiones_reales=False):
+        tiempos, conexion, consultas, estado = [], [], 0, None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            if conexiones_reales:
+                # Lo que hace la señal request_finished fuera de las pruebas
+                close_old_connections()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = max(consultas, int(respuesta.get('X-Consultas-SQL', 0)))
+            estado = respuesta.status_code
+            medida = _CONEXION.search(respuesta.get('Server-Timing', ''))
+            conexion.append(float(medida.group(1)) if medida else 0.0)
+        return {
+            'url': url,
+            'estado': estado,
+            'p50_ms': round(median(tiempos), 2),
+            'p95_ms': round(_percentil(tiempos, 0.95), 2),
+            'conexion_ms': round(median(conexion), 2),
+            'consultas': consultas,
+        }
+
+    def leer_base(self, ruta):
+        try:
+            return json.loads(Path(ruta).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def reportar(self, resultados, base, tolerancia):
+        regresiones = 0
+        self.stdout.write(f'{"ruta":<50} {"estado":>6} {"p50 ms":>9} {"p95 ms":>9} {"conn ms":>8} {"SQL":>5}  comparación')
+        for nombre, r in sorted(resultados.items()):
+            comparacion = ''
+            anterior = base.get(nombre)
+            if anterior:
+                lenta = r['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia)
+                mas_sql = r['consultas'] > anterior['consultas']
+                comparacion = (
+                    f'p95 {anterior["p95_ms"]:.1f} -> {r["p95_ms"]:.1f}, '
+                    f'SQL {anterior["consultas"]} -> {r["consultas"]}'
+                )
+                if lenta or mas_sql:
+                    regresiones += 1
+                    comparacion = self.style.ERROR('REGRESIÓN ' + comparacion)
+            linea = (
+                f'{nombre:<50} {r["estado"]:>6} {r["p50_ms"]:>9.1f} {r["p95_ms"]:>9.1f} '
+                f'{r.get("conexion_ms", 0):>8.1f} {r["consultas"]:>5}  {comparacion}'
+            )
+            self.stdout.write(linea)
+        return regresiones
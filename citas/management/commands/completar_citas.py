@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from citas.models import Cita
+
+
+class Command(BaseCommand):
+    help = 'Marca como completadas las citas activas cuya hora de fin ya pasó.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Segundos entre barridos. Con 0 (por defecto) se ejecuta una sola vez, ideal para cron.',
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            # En modo permanente, descartar la conexión si venció (CONN_MAX_AGE) o quedó rota
+            close_old_connections()
+            actualizadas = Cita.objects.marcar_completadas(timezone.now())
+            self.stdout.write(self.style.SUCCESS(f'{actualizadas} cita(s) marcadas como completadas.'))
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
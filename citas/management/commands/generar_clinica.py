@@ -0,0 +1,279 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from citas.models import AgendaDisponibilidad, Cita, Terapeuta
+from fisioterapia import contadores
+from historiaclinica.models import EjercioTerapeutico, EscalaDaniels, EvolucionTratamiento, HistoriaClinica
+from pacientes.models import AntecedentePatologico, AntecedentesNoPatologicos, Paciente
+from tratamientos.models import (
+    Anticipo, EstadoCuenta, EvolucionTratamientoEstetico, MedidasZona, TratamientoEstetico, ZonaCorporal,
+)
+
+NOMBRES_F = ['María', 'Lucía', 'Sofía', 'Valentina', 'Ximena', 'Fernanda', 'Guadalupe', 'Ana', 'Daniela',
+             'Renata', 'Camila', 'Mariana', 'Andrea', 'Paola', 'Itzel', 'Regina', 'Verónica', 'Mónica']
+NOMBRES_M = ['José', 'Juan', 'Luis', 'Carlos', 'Jesús', 'Miguel', 'Alejandro', 'Diego', 'Andrés', 'Héctor',
+             'Jorge', 'Ramón', 'Sebastián', 'Emiliano', 'Iván', 'Óscar', 'Rubén', 'Martín']
+APELLIDOS = ['Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez',
+             'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Jiménez', 'Reyes', 'Díaz', 'Torres', 'Gutiérrez',
+             'Ruiz', 'Mendoza', 'Aguilar', 'Ortiz', 'Moreno', 'Castillo', 'Romero', 'Álvarez', 'Núñez']
+DIAGNOSTICOS = ['Lumbalgia mecánica', 'Cervicalgia', 'Esguince de tobillo grado II', 'Tendinitis del manguito rotador',
+                'Gonartrosis', 'Epicondilitis lateral', 'Fascitis plantar', 'Hernia discal L4-L5',
+                'Rehabilitación postquirúrgica de rodilla', 'Síndrome del túnel carpiano']
+MUSCULOS = ['Deltoides', 'Bíceps braquial', 'Tríceps', 'Cuádriceps', 'Isquiotibiales', 'Glúteo medio',
+            'Gastrocnemio', 'Tibial anterior', 'Trapecio', 'Recto abdominal']
+EJERCICIOS = ['Puente de glúteo', 'Sentadilla asistida', 'Estiramiento de isquiotibiales', 'Plancha',
+              'Rotación externa con banda', 'Elevación de talones', 'Bird dog', 'Retracción cervical']
+ZONAS = [clave for clave, _ in ZonaCorporal.ZONA_CHOICES if clave not in ('otra', 'cara', 'cuello')]
+
+
+def _lotes(objetos, tamano):
+    for inicio in range(0, len(objetos), tamano):
+        yield objetos[inicio:inicio + tamano]
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera una clínica sintética reproducible (misma semilla y referencia = mismos datos) '
+        'con bulk_create por lotes. Pensado para una base de datos de pruebas o benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=20000)
+        parser.add_argument('--terapeutas', type=int, default=40)
+        parser.add_argument('--anios', type=int, default=3, help='Años de agenda hacia atrás desde la referencia.')
+        parser.add_argument('--semilla', type=int, default=2024)
+        parser.add_argument('--lote', type=int, default=2000, help='Filas por INSERT.')
+        parser.add_argument('--referencia', type=str, default=None,
+                            help='Fecha AAAA-MM-DD que se toma como "hoy" (por defecto la fecha actual).')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.hoy = timezone.localdate()
+        if options['referencia']:
+            self.hoy = parse_date(options['referencia'])
+            if self.hoy is None:
+                raise CommandError('--referencia debe tener el formato AAAA-MM-DD.')
+
+        with transaction.atomic():
+            terapeutas = self.generar_terapeutas(options['terapeutas'])
+            pacientes = self.generar_pacientes(options['pacientes'])
+            self.generar_antecedentes(pacientes)
+            self.generar_citas(terapeutas, pacientes, options['anios'])
+            historias = self.generar_historias(pacientes)
+            self.generar_tratamientos(historias)
+
+        # bulk_create no dispara señales: contar de nuevo lo cacheado
+        contadores.reconciliar()
+        self.stdout.write(self.style.SUCCESS('Clínica generada.'))
+
+    def crear(self, modelo, objetos):
+        for grupo in _lotes(objetos, self.lote):
+            modelo.objects.bulk_create(grupo, batch_size=self.lote)
+        self.stdout.write(f'  {modelo._meta.verbose_name_plural}: {len(objetos)}')
+        return objetos
+
+    def telefono(self):
+        return f'55{self.rnd.randint(10000000, 99999999)}'
+
+    def fecha_pasada(self, max_dias):
+        return self.hoy - timedelta(days=self.rnd.randint(0, max_dias))
+
+    def generar_terapeutas(self, cantidad):
+        terapeutas = self.crear(Terapeuta, [
+            Terapeuta(
+                nombres=self.rnd.choice(NOMBRES_F + NOMBRES_M),
+                apellidos=f'{self.rnd.choice(APELLIDOS)} {self.rnd.choice(APELLIDOS)}',
+                email=f'terapeuta{i}@clinica.test',
+                telefono=self.telefono(),
+                especialidades=self.rnd.choice(['Fisioterapia deportiva', 'Masajes reductivos', 'Rehabilitación']),
+            )
+            for i in range(cantidad)
+        ])
+        self.crear(AgendaDisponibilidad, [
+            AgendaDisponibilidad(terapeuta=terapeuta, dia_semana=dia, hora_inicio=inicio, hora_fin=fin)
+            for terapeuta in terapeutas
+            for dia in range(5)
+            for inicio, fin in ((time(9), time(14)), (time(15), time(19)))
+        ])
+        return terapeutas
+
+    def generar_pacientes(self, cantidad):
+        pacientes = []
+        for _ in range(cantidad):
+            genero = self.rnd.choice('FM')
+            nombres = self.rnd.choice(NOMBRES_F if genero == 'F' else NOMBRES_M)
+            apellidos = f'{self.rnd.choice(APELLIDOS)} {self.rnd.choice(APELLIDOS)}'
+            telefono = self.telefono()
+            edad = self.rnd.randint(16, 85)
+            paciente = Paciente(
+                nombres=nombres,
+                apellidos=apellidos,
+                edad=edad,
+                fecha_nacimiento=self.hoy - timedelta(days=edad * 365 + self.rnd.randint(0, 364)),
+                genero=genero,
+                telefono=telefono,
+                domicilio=f'Calle {self.rnd.randint(1, 300)} #{self.rnd.randint(1, 999)}',
+                tipo_paciente=self.rnd.choices(['consulta_unica', 'patologia', 'estetico'], weights=[3, 5, 2])[0],
+                es_frecuente=self.rnd.random() < 0.4,
+            )
+            # bulk_create no llama a save(): búsqueda y claves de duplicados se calculan aquí
+            paciente.calcular_claves()
+            pacientes.append(paciente)
+        return self.crear(Paciente, pacientes)
+
+    def generar_antecedentes(self, pacientes):
+        self.crear(AntecedentePatologico, [
+            AntecedentePatologico(
+                paciente=paciente,
+                hipertension=self.rnd.random() < 0.2,
+                diabetes=self.rnd.random() < 0.1,
+                obesidad=self.rnd.random() < 0.25,
+                tiroides=self.rnd.random() < 0.05,
+                numero_partos=self.rnd.randint(0, 3) if paciente.genero == 'F' else 0,
+            )
+            for paciente in pacientes
+        ])
+        self.crear(AntecedentesNoPatologicos, [
+            AntecedentesNoPatologicos(
+                paciente=paciente,
+                realiza_actividad_fisica=self.rnd.random() < 0.5,
+                frecuencia_ejercicio=self.rnd.choice(['no', 'ocasional', 'regular', 'intenso']),
+                tipo_alimentacion=self.rnd.choice(['omnivora', 'vegetariana', 'mediterranea']),
+                tabaco=self.rnd.random() < 0.15,
+                horas_sueno=self.rnd.randint(5, 9),
+            )
+            for paciente in pacientes
+        ])
+
+    def generar_citas(self, terapeutas, pacientes, anios):
+        """Agenda sin traslapes: bloques de una hora dentro de la disponibilidad de cada terapeuta."""
+        tz = timezone.get_current_timezone()
+        ahora = timezone.make_aware(datetime.combine(self.hoy, time(12)), tz)
+        horas = [9, 10, 11, 12, 13, 15, 16, 17, 18]
+        citas = []
+        dia = self.hoy - timedelta(days=365 * anios)
+        fin = self.hoy + timedelta(days=30)
+        while dia <= fin:
+            if dia.weekday() < 5:
+                for terapeuta in terapeutas:
+                    for hora in horas:
+                        if self.rnd.random() > 0.45:
+                            continue
+                        inicio = timezone.make_aware(datetime.combine(dia, time(hora)), tz)
+                        duracion = self.rnd.choice([30, 45, 60])
+                        if inicio < ahora:
+                            estado = self.rnd.choices(['completada', 'cancelada'], weights=[9, 1])[0]
+                        else:
+                            estado = self.rnd.choices(['ocupada', 'disponible'], weights=[4, 1])[0]
+                        citas.append(Cita(
+                            paciente=None if estado == 'disponible' else self.rnd.choice(pacientes),
+                            terapeuta=terapeuta,
+                            fecha_hora=inicio,
+                            duracion_minutos=duracion,
+                            # bulk_create no llama a save(): se calcula aquí
+                            fecha_hora_fin=inicio + timedelta(minutes=duracion),
+                            estado=estado,
+                            tipo_sesion=self.rnd.choice(['sesion_regular', 'sesion_estetica', 'seguimiento', 'evaluacion']),
+                        ))
+            dia += timedelta(days=1)
+        self.crear(Cita, citas)
+
+    def generar_historias(self, pacientes):
+        con_historia = [p for p in pacientes if p.tipo_paciente in ('patologia', 'estetico')]
+        historias = self.crear(HistoriaClinica, [
+            HistoriaClinica(
+                paciente=paciente,
+                diagnostico=self.rnd.choice(DIAGNOSTICOS),
+                tratamiento_planificado='Terapia manual, ejercicio terapéutico y electroterapia',
+                escala_eva=str(self.rnd.randint(2, 9)),
+            )
+            for paciente in con_historia
+        ])
+        evoluciones, ejercicios, daniels = [], [], []
+        for historia in historias:
+            if historia.paciente.tipo_paciente != 'patologia':
+                continue
+            inicio = self.fecha_pasada(700)
+            for numero in range(1, self.rnd.randint(2, 12)):
+                evoluciones.append(EvolucionTratamiento(
+                    historia=historia,
+                    fecha_sesion=inicio + timedelta(days=7 * numero),
+                    numero_sesion=numero,
+                    escala_eva_sesion=str(max(0, 9 - numero)),
+                    notas_sesion='Sesión sin incidencias',
+                ))
+            for nombre in self.rnd.sample(EJERCICIOS, 3):
+                ejercicios.append(EjercioTerapeutico(
+                    historia=historia, nombre_ejercicio=nombre, descripcion='3 series controladas',
+                    repeticiones='10-15', frecuencia='3 veces por semana',
+                ))
+            for musculo in self.rnd.sample(MUSCULOS, 3):
+                daniels.append(EscalaDaniels(historia=historia, musculo=musculo, grado=str(self.rnd.randint(2, 5))))
+        self.crear(EvolucionTratamiento, evoluciones)
+        self.crear(EjercioTerapeutico, ejercicios)
+        self.crear(EscalaDaniels, daniels)
+        return historias
+
+    def generar_tratamientos(self, historias):
+        tratamientos = self.crear(TratamientoEstetico, [
+            TratamientoEstetico(
+                paciente=historia.paciente,
+                historia_clinica=historia,
+                objetivo_principal='Reducción de medidas',
+                zona_trabajo='Abdomen, cintura',
+                activo=self.rnd.random() < 0.6,
+            )
+            for historia in historias if historia.paciente.tipo_paciente == 'estetico'
+        ])
+        zonas, evoluciones, cuentas = [], [], []
+        for tratamiento in tratamientos:
+            for zona in self.rnd.sample(ZONAS, self.rnd.randint(2, 4)):
+                zonas.append(ZonaCorporal(tratamiento=tratamiento, zona=zona))
+            inicio = self.fecha_pasada(700)
+            for numero in range(1, self.rnd.randint(2, 9)):
+                evoluciones.append(EvolucionTratamientoEstetico(
+                    tratamiento=tratamiento, numero_sesion=numero, fecha_sesion=inicio + timedelta(days=7 * numero),
+                    tecnica_utilizada=self.rnd.choice(['Radiofrecuencia', 'Cavitación', 'Masaje reductivo']),
+                    satisfaccion_paciente=self.rnd.choice(['muy_satisfecho', 'satisfecho', 'neutral']),
+                ))
+            cuentas.append(EstadoCuenta(tratamiento=tratamiento, costo_total=Decimal(self.rnd.randint(20, 120) * 100)))
+        self.crear(ZonaCorporal, zonas)
+        self.crear(EvolucionTratamientoEstetico, evoluciones)
+
+        medidas = []
+        for zona in zonas:
+            medida = Decimal(self.rnd.randint(600, 1100)) / 10
+            fecha = self.fecha_pasada(600)
+            for numero in (1, 3, 6):
+                medidas.append(MedidasZona(zona_corporal=zona, numero_sesion=numero, medida_cm=medida, fecha_medicion=fecha))
+                medida -= Decimal(self.rnd.randint(0, 30)) / 10
+                fecha += timedelta(days=14)
+        self.crear(MedidasZona, medidas)
+
+        # bulk_create no pasa por Anticipo.save(): los saldos desnormalizados se calculan aquí
+        montos = []
+        for cuenta in cuentas:
+            restante = cuenta.costo_total
+            pagos = []
+            for _ in range(self.rnd.randint(0, 4)):
+                monto = min(restante, Decimal(self.rnd.randint(5, 30) * 100))
+                if monto <= 0:
+                    break
+                restante -= monto
+                pagos.append(monto)
+            cuenta.total_pagado = sum(pagos, Decimal('0'))
+            cuenta.saldo_pendiente = restante
+            montos.append(pagos)
+        self.crear(EstadoCuenta, cuentas)
+        anticipos = [
+            Anticipo(estado_cuenta=cuenta, monto=monto, fecha_pago=self.fecha_pasada(600))
+            for cuenta, pagos in zip(cuentas, montos) for monto in pagos
+        ]
+        self.crear(Anticipo, anticipos)
@@ -0,0 +1,162 @@
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from statistics import median
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from fisioterapia.medicion import cliente_autenticado
+
+# Rutas medidas por defecto: dashboard y listados
+RUTAS = ('dashboard', 'pacientes:lista', 'citas:lista', 'historiaclinica:lista', 'tratamientos:lista')
+
+# Segundos para que gunicorn quede escuchando
+ESPERA_ARRANQUE = 60
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga HTTP: levanta gunicorn con cada perfil de gunicorn.conf.py (wsgi, asgi), '
+        'lanza peticiones concurrentes a las rutas indicadas y compara latencias y peticiones por segundo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', default='wsgi,asgi', help='Perfiles de GUNICORN_PERFIL, separados por coma.')
+        parser.add_argument('--url', help='Medir un servidor ya levantado en esta URL en lugar de arrancar gunicorn.')
+        parser.add_argument('--puerto', type=int, default=8765)
+        parser.add_argument('--concurrencia', type=int, default=16, help='Clientes simultáneos.')
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones por perfil.')
+        parser.add_argument('--rutas', default=','.join(RUTAS), help='Nombres de ruta separados por coma.')
+        parser.add_argument('--usuario', help='Usuario existente con el que medir (por defecto uno temporal que se borra al terminar).')
+
+    def handle(self, *args, **options):
+        rutas = [reverse(nombre) for nombre in options['rutas'].split(',')]
+
+        resultados = {}
+        # La sesión vive en la misma base que usará el servidor y se cierra al terminar
+        with cliente_autenticado(options['usuario']) as cliente:
+            cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+            if options['url']:
+                resultados[options['url']] = self.cargar(options['url'], cookie, rutas, options)
+            else:
+                for perfil in options['perfiles'].split(','):
+                    url = f'http://127.0.0.1:{options["puerto"]}'
+                    with self.servidor(perfil, options['puerto'], url):
+                        resultados[perfil] = self.cargar(url, cookie, rutas, options)
+        self.reportar(resultados)
+
+    @contextmanager
+    def servidor(self, perfil, puerto, url):
+        """gunicorn con el perfil indicado mientras dura el bloque; su salida va a un temporal."""
+        entorno = {**os.environ, 'GUNICORN_PERFIL': perfil, 'GUNICORN_BIND': f'127.0.0.1:{puerto}', 'GUNICORN_ACCESSLOG': ''}
+        with tempfile.TemporaryFile() as log:
+            proceso = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                cwd=settings.BASE_DIR, env=entorno, stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                self.esperar(url, proceso, log)
+                yield
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=30)
+
+    def esperar(self, url, proceso, log):
+        limite = time.monotonic() + ESPERA_ARRANQUE
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'gunicorn terminó al arrancar:\n{log.read().decode(errors="replace")}')
+            try:
+                conexion = http.client.HTTPConnection(urlsplit(url).netloc, timeout=5)
+                conexion.request('GET', reverse('login'))
+                conexion.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'gunicorn no respondió en {ESPERA_ARRANQUE} s')
+
+    def cargar(self, url, cookie, rutas, options):
+        """Latencias (ms) por ruta y peticiones por segundo con ``concurrencia`` clientes keep-alive."""
+        destino = urlsplit(url).netloc
+        pendientes = iter(range(options['peticiones']))
+        candado = threading.Lock()
+        tiempos = {ruta: [] for ruta in rutas}
+        errores = []
+
+        def cliente(_):
+            conexion = http.client.HTTPConnection(destino, timeout=60)
+            while True:
+                with candado:
+                    n = next(pendientes, None)
+                if n is None:
+                    break
+                ruta = rutas[n % len(rutas)]
+                inicio = time.perf_counter()
+                try:
+                    conexion.request('GET', ruta, headers={'Cookie': cookie})
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                    estado = respuesta.status
+                except (OSError, http.client.HTTPException) as error:
+                    conexion.close()
+                    conexion = http.client.HTTPConnection(destino, timeout=60)
+                    estado = type(error).__name__
+                transcurrido = (time.perf_counter() - inicio) * 1000
+                with candado:
+                    if estado == 200:
+                        tiempos[ruta].append(transcurrido)
+                    else:
+                        errores.append((ruta, estado))
+            conexion.close()
+
+        # Calentamiento: una petición por ruta y worker aproximado antes de medir
+        calentamiento = http.client.HTTPConnection(destino, timeout=60)
+        for ruta in rutas * 3:
+            calentamiento.request('GET', ruta, headers={'Cookie': cookie})
+            calentamiento.getresponse().read()
+        calentamiento.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            list(pool.map(cliente, range(options['concurrencia'])))
+        duracion = time.perf_counter() - inicio
+        todas = [t for lista in tiempos.values() for t in lista]
+        return {
+            'rps': len(todas) / duracion if duracion else 0,
+            'errores': errores,
+            'total': todas,
+            'rutas': tiempos,
+        }
+
+    def reportar(self, resultados):
+        self.stdout.write(f'{"perfil":<12} {"ruta":<28} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"errores":>8}')
+        for perfil, r in resultados.items():
+            filas = [('(todas)', r['total'])] + list(r['rutas'].items())
+            for ruta, tiempos in filas:
+                if not tiempos:
+                    self.stdout.write(f'{perfil:<12} {ruta:<28} {"sin respuestas 200":>26}')
+                    continue
+                rps = f'{r["rps"]:8.1f}' if ruta == '(todas)' else ' ' * 8
+                errores = f'{len(r["errores"]):8d}' if ruta == '(todas)' else ' ' * 8
+                self.stdout.write(
+                    f'{perfil:<12} {ruta:<28} {median(tiempos):8.1f} {_percentil(tiempos, 0.95):8.1f} '
+                    f'{_percentil(tiempos, 0.99):8.1f} {rps} {errores}'
+                )
+            if r['errores']:
+                ruta, estado = r['errores'][0]
+                self.stdout.write(self.style.WARNING(f'{perfil}: {len(r["errores"])} errores (p. ej. {ruta} -> {estado})'))
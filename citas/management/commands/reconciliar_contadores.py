@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from fisioterapia import contadores
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a contar en la base de datos los contadores cacheados del dashboard y los listados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombres', nargs='*', help='Contadores a reconciliar (por defecto todos).')
+
+    def handle(self, *args, **options):
+        for nombre, (anterior, real) in contadores.reconciliar(options['nombres'] or None).items():
+            if anterior is not None and anterior != real:
+                self.stdout.write(self.style.WARNING(f'{nombre}: {anterior} -> {real}'))
+            else:
+                self.stdout.write(f'{nombre}: {real}')
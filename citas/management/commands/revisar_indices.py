@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fisioterapia import indices
+
+
+class Command(BaseCommand):
+    help = 'Muestra si cada consulta frecuente usa el índice pensado para ella (EXPLAIN).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', action='store_true', help='Muestra el plan completo de cada consulta.')
+
+    def handle(self, *args, **options):
+        sin_indice = 0
+        for indice, usado, plan in indices.revisar():
+            if usado is None:
+                self.stdout.write(self.style.WARNING(f'OMITE {indice}: {plan}'))
+                continue
+            if usado:
+                self.stdout.write(self.style.SUCCESS(f'OK    {indice}'))
+            else:
+                sin_indice += 1
+                self.stdout.write(self.style.ERROR(f'FALTA {indice}'))
+            if options['plan'] or not usado:
+                self.stdout.write(plan)
+        if sin_indice:
+            raise CommandError(f'{sin_indice} consulta(s) no usan su índice.')
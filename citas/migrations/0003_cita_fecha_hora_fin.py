@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def calcular_fecha_hora_fin(apps, schema_editor):
+    Cita = apps.get_model('citas', 'Cita')
+    citas = list(Cita.objects.only('fecha_hora', 'duracion_minutos'))
+    for cita in citas:
+        cita.fecha_hora_fin = cita.fecha_hora + timedelta(minutes=cita.duracion_minutos)
+    Cita.objects.bulk_update(citas, ['fecha_hora_fin'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_alter_cita_paciente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='fecha_hora_fin',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(calcular_fecha_hora_fin, migrations.RunPython.noop),
+    ]
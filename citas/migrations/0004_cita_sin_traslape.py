@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+# Si ya existen citas traslapadas (no canceladas) la restricción no se puede
+# crear: se deben corregir o cancelar antes de aplicar esta migración.
+RESTRICCION_SQL = """
+ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_traslape
+    EXCLUDE USING gist (
+        terapeuta_id WITH =,
+        tstzrange(fecha_hora, fecha_hora_fin, '[)') WITH &&
+    )
+    WHERE (terapeuta_id IS NOT NULL AND estado <> 'cancelada');
+"""
+
+
+def crear_restriccion(apps, schema_editor):
+    # Restricción de exclusión solo disponible en PostgreSQL; en otros motores
+    # la validación con bloqueo vive en Cita.save().
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist;')
+        schema_editor.execute(RESTRICCION_SQL)
+
+
+def eliminar_restriccion(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_traslape;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0003_cita_fecha_hora_fin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='fecha_hora_fin',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.RunPython(crear_restriccion, eliminar_restriccion),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_cita_sin_traslape'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora', 'id'], name='cita_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha_hora', 'id'], name='cita_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora'], condition=models.Q(('estado__in', ['disponible', 'ocupada'])), name='cita_activas_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora_fin'], condition=models.Q(('estado__in', ['disponible', 'ocupada'])), name='cita_activas_fin_idx'),
+        ),
+    ]
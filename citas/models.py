@@ -1,9 +1,45 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
+from fisioterapia import fragmentos
 from pacientes.models import Paciente
 
 
+ESTADOS_ACTIVOS = ['disponible', 'ocupada']
+# Estados que bloquean el horario del terapeuta (todo excepto canceladas)
+ESTADOS_QUE_OCUPAN = ['disponible', 'ocupada', 'completada']
+
+
+class CitaQuerySet(models.QuerySet):
+    """Consultas reutilizables sobre la agenda de citas"""
+    def vencidas(self, ahora=None):
+        """Citas activas cuya hora de fin (fecha_hora_fin) ya pasó."""
+        ahora = ahora or timezone.now()
+        return self.filter(estado__in=ESTADOS_ACTIVOS, fecha_hora_fin__lt=ahora)
+
+    def traslapadas(self, terapeuta_id, inicio, fin, excluir_pk=None):
+        """Citas del terapeuta que ocupan parte del intervalo [inicio, fin)."""
+        qs = self.filter(
+            terapeuta_id=terapeuta_id,
+            estado__in=ESTADOS_QUE_OCUPAN,
+            fecha_hora__lt=fin,
+            fecha_hora_fin__gt=inicio,
+        )
+        if excluir_pk:
+            qs = qs.exclude(pk=excluir_pk)
+        return qs
+
+    def marcar_completadas(self, ahora=None):
+        """Marca como completadas las citas vencidas con un único UPDATE."""
+        actualizadas = self.vencidas(ahora).update(estado='completada')
+        if actualizadas:
+            # update() no dispara las señales que invalidan los listados cacheados
+            fragmentos.invalidar('citas')
+        return actualizadas
+
+
 class CitasProximasManager(models.Manager):
     """Manager personalizado para filtrar citas próximas (próximos 7 días)"""
     def get_queryset(self):
@@ -12,7 +48,7 @@ class CitasProximasManager(models.Manager):
         return super().get_queryset().filter(
             fecha_hora__gt=ahora,
             fecha_hora__lte=proxima_semana,
-            estado__in=['disponible', 'ocupada']
+            estado__in=ESTADOS_ACTIVOS
         )
 
 
@@ -66,6 +102,8 @@ class Cita(models.Model):
     # Fecha y hora
     fecha_hora = models.DateTimeField()
     duracion_minutos = models.PositiveIntegerField(default=60)
+    # Desnormalizado en save(): permite indexar y validar traslapes por intervalo
+    fecha_hora_fin = models.DateTimeField(editable=False)
     
     # Estado
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='disponible')
@@ -79,11 +117,24 @@ class Cita(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = CitaQuerySet.as_manager()
+    
     class Meta:
         ordering = ['fecha_hora']
         verbose_name = 'Cita'
         verbose_name_plural = 'Citas'
         unique_together = ['terapeuta', 'fecha_hora']  # No puede haber 2 citas del mismo terapeuta a la misma hora
+        # El índice único de unique_together ya cubre (terapeuta, fecha_hora): agenda y traslapes
+        indexes = [
+            # Listado (paginación por cursor: fecha_hora + pk), con y sin filtro de estado
+            models.Index(fields=['fecha_hora', 'id'], name='cita_fecha_idx'),
+            models.Index(fields=['estado', 'fecha_hora', 'id'], name='cita_estado_fecha_idx'),
+            # Solo citas activas: próximas (CitasProximasManager, contador) y vencidas (completar_citas)
+            models.Index(fields=['fecha_hora'], condition=Q(estado__in=ESTADOS_ACTIVOS), name='cita_activas_fecha_idx'),
+            models.Index(fields=['fecha_hora_fin'], condition=Q(estado__in=ESTADOS_ACTIVOS), name='cita_activas_fin_idx'),
+        ]
+        # En PostgreSQL además existe la restricción de exclusión citas_cita_sin_traslape
+        # (GiST sobre terapeuta + tstzrange(fecha_hora, fecha_hora_fin)), creada en la migración 0004.
     
     def __str__(self):
         paciente_nombre = self.paciente.nombre_completo if self.paciente else 'Sin paciente'
@@ -93,11 +144,50 @@ class Cita(models.Model):
         """Calcula la hora de finalización de la cita"""
         return self.fecha_hora + timedelta(minutes=self.duracion_minutos)
     
+    def ocupa_agenda(self):
+        """Indica si la cita bloquea el horario del terapeuta"""
+        return bool(self.terapeuta_id and self.fecha_hora and self.estado in ESTADOS_QUE_OCUPAN)
+    
+    def clean(self):
+        super().clean()
+        if self.ocupa_agenda() and self.duracion_minutos:
+            choque = Cita.objects.traslapadas(
+                self.terapeuta_id, self.fecha_hora, self.get_hora_fin(), excluir_pk=self.pk
+            ).order_by('fecha_hora').first()
+            if choque:
+                raise ValidationError({
+                    'fecha_hora': (
+                        f"El terapeuta ya tiene una cita de {timezone.localtime(choque.fecha_hora):%H:%M} "
+                        f"a {timezone.localtime(choque.fecha_hora_fin):%H:%M} que se traslapa con este horario."
+                    )
+                })
+    
+    def save(self, *args, **kwargs):
+        self.fecha_hora_fin = self.get_hora_fin()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'fecha_hora', 'duracion_minutos'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'fecha_hora_fin'}
+        if connection.vendor == 'postgresql' or not self.ocupa_agenda():
+            # En PostgreSQL la restricción de exclusión garantiza la integridad
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Bloqueo por terapeuta (no de toda la agenda) antes de validar e insertar.
+            # En SQLite el bloqueo lo da transaction_mode=IMMEDIATE (ver settings).
+            Terapeuta.objects.select_for_update().filter(pk=self.terapeuta_id).first()
+            if Cita.objects.traslapadas(self.terapeuta_id, self.fecha_hora, self.fecha_hora_fin, excluir_pk=self.pk).exists():
+                raise IntegrityError('citas_cita_sin_traslape: el terapeuta ya tiene una cita en ese horario.')
+            return super().save(*args, **kwargs)
+    
     def esta_proxima(self):
         """Verifica si la cita está próxima (dentro de 7 días)"""
         ahora = timezone.now()
         proxima_semana = ahora + timedelta(days=7)
         return ahora <= self.fecha_hora <= proxima_semana
+    
+    def esta_vencida(self, ahora=None):
+        """Verifica si la cita sigue activa pero su hora de fin ya pasó"""
+        ahora = ahora or timezone.now()
+        return self.estado in ESTADOS_ACTIVOS and self.get_hora_fin() < ahora
 
 
 class AgendaDisponibilidad(models.Model):
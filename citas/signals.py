@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+
+from citas.models import Cita
+from fisioterapia import contadores, fragmentos
+from pacientes.models import Paciente
+
+contadores.registrar('citas', Cita)
+# La tabla de citas muestra el nombre del paciente
+fragmentos.registrar('citas', Cita, Paciente)
+
+post_save.connect(contadores.invalidar_citas_proximas, sender=Cita, dispatch_uid='citas_proximas:save')
+post_delete.connect(contadores.invalidar_citas_proximas, sender=Cita, dispatch_uid='citas_proximas:delete')
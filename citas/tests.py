@@ -1,3 +1,402 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from citas import disponibilidad
+from citas.models import ESTADOS_QUE_OCUPAN, AgendaDisponibilidad, Cita, Terapeuta
+from citas.views import MENSAJE_CHOQUE_HORARIO, DisponibilidadView
+from fisioterapia import contadores, fragmentos
+from pacientes.models import Paciente
+from tratamientos.models import EstadoCuenta
+
+
+def hora(h, m=0, dia=4):
+    """Hora local del 4 de mayo de 2026 (lunes)."""
+    return timezone.make_aware(datetime(2026, 5, dia, h, m))
+
+
+def crear_terapeuta(nombres='Laura'):
+    return Terapeuta.objects.create(
+        nombres=nombres, apellidos='Paz', email='laura@example.com', telefono='5550000', especialidades='Fisioterapia'
+    )
+
+
+def crear_cita(terapeuta, inicio, duracion=60, estado='ocupada'):
+    return Cita.objects.create(
+        terapeuta=terapeuta, fecha_hora=inicio, duracion_minutos=duracion,
+        estado=estado, tipo_sesion='sesion_regular',
+    )
+
+
+class TraslapeCitasTests(TestCase):
+    def setUp(self):
+        self.terapeuta = crear_terapeuta()
+        self.existente = crear_cita(self.terapeuta, hora(10))
+
+    def nueva(self, inicio, duracion=60, estado='ocupada', terapeuta=None):
+        return Cita(
+            terapeuta=terapeuta or self.terapeuta, fecha_hora=inicio, duracion_minutos=duracion,
+            estado=estado, tipo_sesion='sesion_regular',
+        )
+
+    def test_traslape_rechazado_al_validar_y_al_guardar(self):
+        cita = self.nueva(hora(10, 30))
+        with self.assertRaises(ValidationError) as contexto:
+            cita.full_clean()
+        self.assertIn('fecha_hora', contexto.exception.message_dict)
+        # Sin pasar por clean(): la revisión con bloqueo de save() también lo impide
+        with self.assertRaises(IntegrityError):
+            cita.save()
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_horarios_contiguos_permitidos(self):
+        for inicio in (hora(9), hora(11)):
+            cita = self.nueva(inicio)
+            cita.full_clean()
+            cita.save()
+        self.assertEqual(Cita.objects.count(), 3)
+
+    def test_otro_terapeuta_no_choca(self):
+        cita = self.nueva(hora(10, 30), terapeuta=crear_terapeuta('Pedro'))
+        cita.full_clean()
+        cita.save()
+
+    def test_canceladas_no_ocupan_el_horario(self):
+        self.existente.estado = 'cancelada'
+        self.existente.save()
+        cita = self.nueva(hora(10, 15))
+        cita.full_clean()
+        cita.save()
+        # Y una cita cancelada puede guardarse encima de otra activa
+        self.nueva(hora(10, 45), estado='cancelada').save()
+        self.assertEqual(Cita.objects.count(), 3)
+
+    def test_editar_alargando_la_duracion_rechazado(self):
+        crear_cita(self.terapeuta, hora(11))
+        self.existente.duracion_minutos = 90
+        with self.assertRaises(ValidationError):
+            self.existente.full_clean()
+        with self.assertRaises(IntegrityError):
+            self.existente.save()
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.duracion_minutos, 60)
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class FormularioCitaTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+        self.terapeuta = crear_terapeuta()
+        self.existente = crear_cita(self.terapeuta, hora(10))
+
+    def datos(self, inicio, duracion=60):
+        return {
+            'terapeuta': self.terapeuta.pk,
+            'fecha_hora': timezone.localtime(inicio).strftime('%Y-%m-%dT%H:%M'),
+            'duracion_minutos': duracion,
+            'tipo_sesion': 'sesion_regular',
+            'estado': 'ocupada',
+        }
+
+    def test_crear_con_traslape_muestra_el_error(self):
+        respuesta = self.client.post(reverse('citas:crear'), self.datos(hora(10, 30)))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('se traslapa', respuesta.context['form'].errors['fecha_hora'][0])
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_crear_y_editar_convierten_la_carrera_en_error_del_formulario(self):
+        # Otra reserva gana entre clean() y save(): simulado saltando la validación del modelo
+        with mock.patch.object(Cita, 'clean'):
+            respuesta = self.client.post(reverse('citas:crear'), self.datos(hora(10, 30)))
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.context['form'].errors['fecha_hora'], [MENSAJE_CHOQUE_HORARIO])
+            self.assertContains(respuesta, MENSAJE_CHOQUE_HORARIO)
+
+            otra = crear_cita(self.terapeuta, hora(11))
+            respuesta = self.client.post(reverse('citas:editar', args=[otra.pk]), self.datos(hora(10, 30)))
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertContains(respuesta, MENSAJE_CHOQUE_HORARIO)
+        otra.refresh_from_db()
+        self.assertEqual(otra.fecha_hora, hora(11))
+
+    def test_formularios_dentro_del_presupuesto(self):
+        self.assertEqual(self.client.get(reverse('citas:crear')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('citas:editar', args=[self.existente.pk])).status_code, 200)
+        respuesta = self.client.post(reverse('citas:crear'), self.datos(hora(14)))
+        self.assertRedirects(respuesta, reverse('citas:lista'), fetch_redirect_response=False)
+
+    def test_editar_sin_traslape_redirige(self):
+        respuesta = self.client.post(reverse('citas:editar', args=[self.existente.pk]), self.datos(hora(12), 90))
+        self.assertRedirects(respuesta, reverse('citas:lista'), fetch_redirect_response=False)
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.fecha_hora_fin, hora(13, 30))
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class CitasVencidasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        terapeuta = crear_terapeuta()
+        self.ahora = hora(12)
+        self.vencida = crear_cita(terapeuta, hora(9))
+        self.disponible_vencida = crear_cita(terapeuta, hora(10), estado='disponible')
+        # Termina justo ahora: todavía no vence
+        self.en_curso = crear_cita(terapeuta, hora(11))
+        self.cancelada = crear_cita(terapeuta, hora(8), estado='cancelada')
+        self.futura = crear_cita(terapeuta, hora(13))
+
+    def test_vencidas_solo_activas_con_la_hora_de_fin_pasada(self):
+        self.assertCountEqual(Cita.objects.vencidas(self.ahora), [self.vencida, self.disponible_vencida])
+        self.assertTrue(self.vencida.esta_vencida(self.ahora))
+        self.assertFalse(self.en_curso.esta_vencida(self.ahora))
+
+    def test_marcar_completadas_invalida_los_fragmentos(self):
+        version = fragmentos._version('citas')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Cita.objects.marcar_completadas(self.ahora), 2)
+        self.assertEqual(cache.get('fragmentos:version:citas'), version + 1)
+        self.assertEqual(
+            set(Cita.objects.filter(estado='completada').values_list('pk', flat=True)),
+            {self.vencida.pk, self.disponible_vencida.pk},
+        )
+        self.cancelada.refresh_from_db()
+        self.assertEqual(self.cancelada.estado, 'cancelada')
+        # Sin cambios no se invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Cita.objects.marcar_completadas(self.ahora), 0)
+        self.assertEqual(cache.get('fragmentos:version:citas'), version + 1)
+
+    def test_completar_citas_renueva_la_conexion_en_cada_barrido(self):
+        modulo = 'citas.management.commands.completar_citas'
+        # El tercer sleep corta el ciclo permanente
+        with mock.patch(f'{modulo}.close_old_connections') as cerrar, \
+                mock.patch(f'{modulo}.time.sleep', side_effect=[None, None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('completar_citas', intervalo=60, stdout=StringIO())
+        self.assertEqual(cerrar.call_count, 3)
+        # Con la hora real todas las activas del 4 de mayo ya vencieron
+        self.assertEqual(Cita.objects.filter(estado='completada').count(), 4)
+
+    def test_la_lista_muestra_las_vencidas_sin_guardarlas(self):
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+        with mock.patch('citas.views.timezone.now', return_value=self.ahora):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                todas = self.client.get(reverse('citas:lista')).context['citas']
+                ocupadas = self.client.get(reverse('citas:lista'), {'estado': 'ocupada'}).context['citas']
+                completadas = self.client.get(reverse('citas:lista'), {'estado': 'completada'}).context['citas']
+        self.assertEqual(callbacks, [])
+        estados = {cita.pk: cita.estado for cita in todas}
+        self.assertEqual(estados[self.vencida.pk], 'completada')
+        self.assertEqual(estados[self.en_curso.pk], 'ocupada')
+        self.assertEqual({cita.pk for cita in ocupadas}, {self.en_curso.pk, self.futura.pk})
+        self.assertEqual({cita.pk for cita in completadas}, {self.vencida.pk, self.disponible_vencida.pk})
+        self.assertFalse(Cita.objects.filter(estado='completada').exists())
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class TerapeutaOpcionesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+        for i in range(24):
+            crear_terapeuta(f'Terapeuta{i:02d}')
+        self.laura = Terapeuta.objects.create(
+            nombres='Laura', apellidos='Zamora', email='lz@example.com', telefono='5551111',
+            especialidades='Drenaje linfático',
+        )
+        self.inactivo = Terapeuta.objects.create(
+            nombres='Alberto', apellidos='Zamora', email='az@example.com', telefono='5552222',
+            especialidades='Drenaje linfático', activo=False,
+        )
+
+    def pedir(self, **parametros):
+        respuesta = self.client.get(reverse('citas:terapeuta-opciones'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_paginas_sin_repetir_y_activos_primero(self):
+        primera, segunda = self.pedir(), self.pedir(pagina=2)
+        self.assertEqual((len(primera['resultados']), primera['hay_mas'], primera['pagina']), (20, True, 1))
+        self.assertEqual((len(segunda['resultados']), segunda['hay_mas']), (6, False))
+        ids = [r['id'] for r in primera['resultados'] + segunda['resultados']]
+        self.assertEqual(len(set(ids)), 26)
+        self.assertEqual(ids[-1], self.inactivo.pk)
+        self.assertEqual(self.pedir(pagina=3)['resultados'], [])
+
+    def test_busqueda_por_cada_palabra(self):
+        resultados = self.pedir(q='zamora')['resultados']
+        self.assertEqual([r['id'] for r in resultados], [self.laura.pk, self.inactivo.pk])
+        self.assertEqual(resultados[0]['texto'], str(self.laura))
+        # Cada palabra puede coincidir en un campo distinto, pero todas deben coincidir
+        self.assertEqual([r['id'] for r in self.pedir(q='laura DRENAJE')['resultados']], [self.laura.pk])
+        self.assertEqual(self.pedir(q='laura fisioterapia')['resultados'], [])
+
+    def test_parametros_invalidos_y_sesion(self):
+        respuesta = self.client.get(reverse('citas:terapeuta-opciones'), {'pagina': 'dos'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.pedir(pagina=0)['pagina'], 1)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('citas:terapeuta-opciones')).status_code, 302)
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class DisponibilidadTests(TestCase):
+    def setUp(self):
+        self.terapeuta = crear_terapeuta()
+        # Lunes de 9:00 a 13:00
+        AgendaDisponibilidad.objects.create(
+            terapeuta=self.terapeuta, dia_semana=0, hora_inicio=time(9), hora_fin=time(13)
+        )
+        self.lunes = date(2026, 5, 4)
+
+    def huecos(self, **kwargs):
+        return disponibilidad.calcular_huecos(self.lunes, self.lunes, **kwargs)[self.terapeuta.pk]
+
+    def test_fusionar_une_intervalos_que_se_traslapan_o_se_tocan(self):
+        self.assertEqual(
+            disponibilidad._fusionar([(5, 10), (1, 3), (3, 4), (8, 12), (20, 21)]),
+            [(1, 4), (5, 12), (20, 21)],
+        )
+        self.assertEqual(disponibilidad._restar([(0, 10)], [(2, 4), (3, 6), (8, 12)]), [(0, 2), (6, 8)])
+
+    def test_citas_en_los_bordes_no_dejan_huecos_vacios(self):
+        crear_cita(self.terapeuta, hora(9))
+        crear_cita(self.terapeuta, hora(11))
+        crear_cita(self.terapeuta, hora(12))
+        # Una cancelada no ocupa el horario
+        crear_cita(self.terapeuta, hora(10), duracion=30, estado='cancelada')
+        self.assertEqual(self.huecos(), [(hora(10), hora(11))])
+
+    def test_duracion_minima_y_dias_sin_ventana(self):
+        crear_cita(self.terapeuta, hora(9, 30), duracion=210)
+        self.assertEqual(self.huecos(), [(hora(9), hora(9, 30))])
+        self.assertEqual(self.huecos(duracion_minima=45), [])
+        martes = self.lunes + timedelta(days=1)
+        self.assertEqual(disponibilidad.calcular_huecos(martes, martes), {self.terapeuta.pk: []})
+
+    def test_vista_limite_de_dias_y_parametros_invalidos(self):
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+        url = reverse('citas:disponibilidad')
+        ultimo = self.lunes + timedelta(days=DisponibilidadView.MAX_DIAS - 1)
+        respuesta = self.client.get(url, {'desde': self.lunes.isoformat(), 'hasta': ultimo.isoformat()})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['terapeutas'][0]['huecos'][0]['inicio'], hora(9).isoformat())
+
+        invalidos = (
+            {'desde': self.lunes.isoformat(), 'hasta': (ultimo + timedelta(days=1)).isoformat()},
+            {'desde': self.lunes.isoformat(), 'hasta': (self.lunes - timedelta(days=1)).isoformat()},
+            {'desde': '2026-02-30'},
+            {'duracion': 'media hora'},
+            {'terapeuta': 'laura'},
+        )
+        for parametros in invalidos:
+            with self.subTest(parametros=parametros):
+                respuesta = self.client.get(url, parametros)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn('error', respuesta.json())
+
+
+class GenerarClinicaTests(TestCase):
+    opciones = {'pacientes': 30, 'terapeutas': 2, 'anios': 0, 'referencia': '2026-05-04', 'stdout': StringIO()}
+
+    def generar(self, semilla):
+        """Genera la clínica dentro de una transacción revertida y devuelve un resumen sin pks."""
+        with transaction.atomic():
+            call_command('generar_clinica', semilla=semilla, **self.opciones)
+            resumen = (
+                list(Paciente.objects.order_by('pk').values_list('nombres', 'apellidos', 'telefono', 'tipo_paciente')),
+                list(Cita.objects.order_by('pk').values_list('fecha_hora', 'duracion_minutos', 'estado')),
+                list(EstadoCuenta.objects.order_by('pk').values_list('costo_total', 'total_pagado', 'saldo_pendiente')),
+            )
+            transaction.set_rollback(True)
+        return resumen
+
+    def test_misma_semilla_mismos_datos(self):
+        primera = self.generar(7)
+        pacientes, citas, _ = primera
+        self.assertEqual(len(pacientes), 30)
+        self.assertTrue(citas)
+        self.assertEqual(self.generar(7), primera)
+        self.assertNotEqual(self.generar(8)[0], pacientes)
+        self.assertFalse(Paciente.objects.exists())
+
+    def test_agenda_sin_traslapes_y_contadores_al_dia(self):
+        cache.clear()
+        call_command('generar_clinica', semilla=7, **self.opciones)
+        for cita in Cita.objects.filter(estado__in=ESTADOS_QUE_OCUPAN):
+            self.assertFalse(
+                Cita.objects.traslapadas(cita.terapeuta_id, cita.fecha_hora, cita.fecha_hora_fin, cita.pk).exists()
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.valor('pacientes'), 30)
+
+
+    def test_pacientes_con_claves_de_busqueda_y_duplicados(self):
+        call_command('generar_clinica', semilla=7, **self.opciones)
+        self.assertFalse(
+            Paciente.objects.filter(Q(texto_busqueda='') | Q(telefono_clave='') | Q(apellido_fonetico='')).exists()
+        )
+        for paciente in Paciente.objects.all()[:5]:
+            guardadas = (paciente.texto_busqueda, paciente.telefono_clave, paciente.apellido_fonetico)
+            paciente.calcular_claves()
+            self.assertEqual(guardadas, (paciente.texto_busqueda, paciente.telefono_clave, paciente.apellido_fonetico))
+
+
+class BenchmarkVistasTests(TestCase):
+    def setUp(self):
+        crear_cita(crear_terapeuta(), hora(10))
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.base = Path(carpeta.name) / 'base.json'
+
+    def medir(self, **opciones):
+        salida = StringIO()
+        call_command(
+            'benchmark_vistas', base=str(self.base), filtro='citas:lista', repeticiones=2, stdout=salida, **opciones
+        )
+        return salida.getvalue()
+
+    def test_guardar_y_comparar_contra_la_linea_base(self):
+        salida = self.medir(guardar=True)
+        self.assertIn('Línea base guardada', salida)
+        base = json.loads(self.base.read_text())
+        self.assertEqual(set(base), {'citas:lista'})
+        medida = base['citas:lista']
+        self.assertEqual(medida['estado'], 200)
+        self.assertGreater(medida['consultas'], 0)
+
+        salida = self.medir(tolerancia=1000)
+        self.assertIn(f'SQL {medida["consultas"]} -> ', salida)
+        self.assertNotIn('REGRESIÓN', salida)
+
+        # Una línea base con menos consultas marca la ruta como regresión
+        medida['consultas'] = 0
+        self.base.write_text(json.dumps(base))
+        salida = self.medir(tolerancia=1000)
+        self.assertIn('REGRESIÓN', salida)
+        self.assertIn('1 ruta(s) con regresión', salida)
+
+    def test_no_deja_usuarios_ni_sesiones(self):
+        self.medir()
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+        existente = User.objects.create_user('supervisor', password='x', is_staff=True)
+        self.medir(usuario='supervisor')
+        self.assertEqual(list(User.objects.all()), [existente])
+        self.assertFalse(Session.objects.exists())
+        with self.assertRaises(CommandError):
+            self.medir(usuario='nadie')
@@ -11,9 +11,11 @@ urlpatterns = [
     path('<int:pk>/', views.CitaDetailView.as_view(), name='detalle'),
     path('<int:pk>/editar/', views.CitaUpdateView.as_view(), name='editar'),
     path('<int:pk>/cancelar/', views.CitaDeleteView.as_view(), name='cancelar'),
+    path('disponibilidad/', views.DisponibilidadView.as_view(), name='disponibilidad'),
 
     # Terapeutas
     path('terapeutas/', views.TerapeutaListView.as_view(), name='terapeutas'),
+    path('terapeutas/opciones/', views.TerapeutaOpcionesView.as_view(), name='terapeuta-opciones'),
     path('terapeutas/crear/', views.TerapeutaCreateView.as_view(), name='terapeuta-crear'),
     path('terapeutas/<int:pk>/', views.TerapeutaDetailView.as_view(), name='terapeuta-detalle'),
     path('terapeutas/<int:pk>/editar/', views.TerapeutaUpdateView.as_view(), name='terapeuta-editar'),
@@ -1,60 +1,79 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from fisioterapia.fragmentos import FragmentoCacheMixin
+from fisioterapia.paginacion import CursorPaginationMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
+from django.db import IntegrityError
+from django.db.models import Q
 from django.utils import timezone
 from django.http import JsonResponse
 from django.template.loader import render_to_string
-from citas.models import Cita, Terapeuta, CitasProximas
+from django.utils.dateparse import parse_date
+from django.views import View
+from citas.models import Cita, Terapeuta, CitasProximas, ESTADOS_ACTIVOS
 from citas.forms import CitaForm, TerapeutaForm
+from citas.disponibilidad import calcular_huecos
+from fisioterapia.seleccion_remota import OpcionesRemotasView
+from fisioterapia import contadores
 
+MENSAJE_CHOQUE_HORARIO = 'Otra cita acaba de ocupar ese horario del terapeuta. Elija otro horario.'
 
-class CitaListView(LoginRequiredMixin, ListView):
+
+class CitaListView(LoginRequiredMixin, FragmentoCacheMixin, CursorPaginationMixin, ListView):
     """Lista todas las citas."""
     model = Cita
     template_name = 'citas/cita_list.html'
     context_object_name = 'citas'
     paginate_by = 20
+    cursor_campo = 'fecha_hora'
+    fragmento_grupo = 'citas'
 
     def get_queryset(self):
-        queryset = Cita.objects.all().order_by('-fecha_hora')
-        ahora = timezone.now()
-        for cita in queryset:
-            hora_fin = cita.get_hora_fin()
-            if cita.estado in ['disponible', 'ocupada'] and hora_fin < ahora:
-                cita.estado = 'completada'
-                cita.save(update_fields=['estado'])
+        # Solo lectura: la transición a 'completada' la hace el comando completar_citas
+        self.ahora = timezone.now()
+        queryset = Cita.objects.select_related('paciente').order_by('-fecha_hora')
         estado = self.request.GET.get('estado')
-        if estado:
+        if estado in ESTADOS_ACTIVOS:
+            # Las vencidas se muestran como completadas aunque el comando aún no las guarde
+            queryset = queryset.filter(estado=estado, fecha_hora_fin__gte=self.ahora)
+        elif estado == 'completada':
+            queryset = queryset.filter(
+                Q(estado=estado) | Q(estado__in=ESTADOS_ACTIVOS, fecha_hora_fin__lt=self.ahora)
+            )
+        elif estado:
             queryset = queryset.filter(estado=estado)
         return queryset
 
+    def _completar_vencidas(self, citas, ahora):
+        """Muestra como completadas las citas vencidas de la página, sin guardarlas."""
+        for cita in citas:
+            if cita.esta_vencida(ahora):
+                cita.estado = 'completada'
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        ahora = timezone.now()
-        proxima_semana = ahora + timezone.timedelta(days=7)
-        proximas_qs = Cita.objects.filter(
-            fecha_hora__gt=ahora,
-            fecha_hora__lte=proxima_semana,
-            estado__in=['disponible', 'ocupada']
-        )
-        context['total_citas'] = Cita.objects.count()
-        context['citas_proximas'] = proximas_qs.count()
+        ahora = self.ahora
+        citas = list(context['object_list'])
+        self._completar_vencidas(citas, ahora)
+        context['object_list'] = context['citas'] = citas
+        if context.get('page_obj'):
+            context['page_obj'].object_list = citas
+        context['total_citas'] = contadores.valor('citas')
+        context['citas_proximas'] = contadores.citas_proximas(ahora)
         context['estados'] = ['disponible', 'ocupada', 'cancelada', 'completada']
         return context
 
-    def render_to_response(self, context, **response_kwargs):
-        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            tabla_html = render_to_string('citas/partials/_cita_table.html', context=context, request=self.request)
-            paginacion_html = render_to_string('citas/partials/_cita_pagination.html', context=context, request=self.request)
-            return JsonResponse({
-                'tabla': tabla_html,
-                'paginacion': paginacion_html,
-                'total_citas': context['page_obj'].paginator.count,
-                'citas_proximas': context['citas_proximas'],
-            })
-        return super().render_to_response(context, **response_kwargs)
+    def datos_fragmento(self, context):
+        tabla_html = render_to_string('citas/partials/_cita_table.html', context=context, request=self.request)
+        paginacion_html = render_to_string('citas/partials/_cita_pagination.html', context=context, request=self.request)
+        return {
+            'tabla': tabla_html,
+            'paginacion': paginacion_html,
+            'total_citas': context['page_obj'].paginator.count,
+            'citas_proximas': context['citas_proximas'],
+        }
 
 
 class CitasProximasView(LoginRequiredMixin, ListView):
@@ -67,7 +86,7 @@ class CitasProximasView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         ahora = timezone.now()
         proxima_semana = ahora + timezone.timedelta(days=7)
-        return Cita.objects.filter(
+        return Cita.objects.select_related('paciente', 'terapeuta').filter(
             fecha_hora__gt=ahora,
             fecha_hora__lte=proxima_semana,
             estado__in=['disponible', 'ocupada']
@@ -89,7 +108,12 @@ class CitaCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy('citas:lista')
 
     def form_valid(self, form):
-        response = super().form_valid(form)
+        try:
+            response = super().form_valid(form)
+        except IntegrityError:
+            # Otra reserva ganó la carrera entre la validación y el guardado
+            form.add_error('fecha_hora', MENSAJE_CHOQUE_HORARIO)
+            return self.form_invalid(form)
         messages.success(self.request, 'Cita creada correctamente.')
         return response
 
@@ -115,7 +139,12 @@ class CitaUpdateView(LoginRequiredMixin, UpdateView):
         return context
 
     def form_valid(self, form):
-        response = super().form_valid(form)
+        try:
+            response = super().form_valid(form)
+        except IntegrityError:
+            # Otra reserva ganó la carrera entre la validación y el guardado
+            form.add_error('fecha_hora', MENSAJE_CHOQUE_HORARIO)
+            return self.form_invalid(form)
         messages.success(self.request, 'Cita actualizada correctamente.')
         return response
 
@@ -170,3 +199,48 @@ class TerapeutaUpdateView(LoginRequiredMixin, UpdateView):
         context = super().get_context_data(**kwargs)
         context['titulo'] = f'Editar Terapeuta: {self.object.nombre_completo}'
         return context
+
+
+class TerapeutaOpcionesView(OpcionesRemotasView):
+    """Opciones paginadas de terapeutas para la selección remota."""
+    campos_busqueda = ('nombres', 'apellidos', 'especialidades')
+
+    def get_queryset(self):
+        return Terapeuta.objects.order_by('-activo', 'nombres', 'apellidos')
+
+
+class DisponibilidadView(LoginRequiredMixin, View):
+    """Huecos libres de la agenda en JSON (calculados desde AgendaDisponibilidad)."""
+    MAX_DIAS = 62
+
+    def get(self, request):
+        try:
+            desde = parse_date(request.GET.get('desde', '')) or timezone.localdate()
+            hasta = parse_date(request.GET.get('hasta', '')) or desde + timezone.timedelta(days=6)
+            terapeutas = [int(pk) for pk in request.GET.getlist('terapeuta')] or None
+            duracion = int(request.GET.get('duracion', 0))
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros inválidos (fechas en formato AAAA-MM-DD).'}, status=400)
+        if hasta < desde or (hasta - desde).days >= self.MAX_DIAS:
+            return JsonResponse({'error': f'El rango debe ser válido y no superar {self.MAX_DIAS} días.'}, status=400)
+
+        huecos = calcular_huecos(desde, hasta, terapeutas=terapeutas, duracion_minima=duracion)
+        nombres = {
+            terapeuta.pk: terapeuta.nombre_completo
+            for terapeuta in Terapeuta.objects.filter(pk__in=huecos.keys()).only('nombres', 'apellidos')
+        }
+        return JsonResponse({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'terapeutas': [
+                {
+                    'id': terapeuta_id,
+                    'nombre': nombres.get(terapeuta_id, ''),
+                    'huecos': [
+                        {'inicio': inicio.isoformat(), 'fin': fin.isoformat()}
+                        for inicio, fin in intervalos
+                    ],
+                }
+                for terapeuta_id, intervalos in sorted(huecos.items())
+            ],
+        })
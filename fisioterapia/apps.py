@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+
+class FisioterapiaConfig(AppConfig):
+    """Módulos compartidos del proyecto (exportaciones, contadores, instrumentación) y sus comandos."""
+    name = 'fisioterapia'
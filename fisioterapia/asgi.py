@@ -3,6 +3,13 @@ ASGI config for fisioterapia project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+En producción se sirve con gunicorn y workers de uvicorn:
+``GUNICORN_PERFIL=asgi gunicorn -c gunicorn.conf.py``. Aquí las conexiones no
+se reutilizan entre peticiones (``CONN_MAX_AGE = 0``): Django las cierra al
+terminar cada petición solo en el hilo que la atendió, y con ASGI las consultas
+pueden correr en otros hilos que nunca las cierran. Para reutilizarlas, el pool
+de ``DB_POOL=True``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +19,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fisioterapia.settings')
+# Antes de cargar los settings: manda sobre lo que diga .env
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
@@ -0,0 +1,91 @@
+"""
+Estado de la reutilización de conexiones a la base de datos (ver ``DATABASES``).
+
+Cada alias funciona en uno de tres modos:
+
+* ``pool``: pool de psycopg 3 por proceso (``DB_POOL=True``); cada petición
+  toma una conexión al empezar a consultar y la devuelve al terminar.
+* ``persistente``: la conexión de cada hilo se reutiliza ``CONN_MAX_AGE``
+  segundos (el modo con psycopg2 o sin pool).
+* ``por_peticion``: ``CONN_MAX_AGE = 0``, una conexión nueva por petición.
+
+``estadisticas()`` se publica en ``/instrumentacion/``. En modo pool incluye
+la espera para obtener una conexión (``requests_wait_ms`` de psycopg_pool):
+si el promedio o las peticiones en cola crecen, ``DB_POOL_MAX`` se quedó corto.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def medir(acumular, alias=DEFAULT_DB_ALIAS):
+    """Mientras dura el bloque, pasa a ``acumular`` los segundos que tarde en abrirse la conexión.
+
+    La usa ``InstrumentacionMiddleware`` en cada petición. No abre la conexión:
+    se mide solo cuando la vista hace su primera consulta (``ensure_connection``
+    de Django), así que las peticiones que no consultan no conectan. Con
+    conexiones persistentes suele ser 0 y en modo ``por_peticion`` es el costo
+    de conectar y autenticarse (o de sacarla del pool).
+    """
+    conexion = connections[alias]
+    original = conexion.ensure_connection
+
+    def ensure_connection():
+        if conexion.connection is not None:
+            return original()
+        inicio = time.perf_counter()
+        try:
+            return original()
+        finally:
+            acumular(time.perf_counter() - inicio)
+
+    # El objeto de conexión es propio del hilo: el reemplazo no afecta a otras peticiones
+    conexion.ensure_connection = ensure_connection
+    try:
+        yield
+    finally:
+        del conexion.ensure_connection
+
+
+def modo(alias='default'):
+    conexion = connections[alias]
+    if conexion.settings_dict.get('OPTIONS', {}).get('pool'):
+        return 'pool'
+    return 'persistente' if conexion.settings_dict['CONN_MAX_AGE'] else 'por_peticion'
+
+
+def _pool(alias):
+    stats = connections[alias].pool.get_stats()
+    solicitudes = stats.get('requests_num', 0)
+    espera_ms = stats.get('requests_wait_ms', 0)
+    return {
+        'tamano': stats.get('pool_size', 0),
+        'minimo': stats.get('pool_min', 0),
+        'maximo': stats.get('pool_max', 0),
+        'disponibles': stats.get('pool_available', 0),
+        'esperando': stats.get('requests_waiting', 0),
+        'solicitudes': solicitudes,
+        # Solicitudes que no encontraron una conexión libre y tuvieron que esperar
+        'encoladas': stats.get('requests_queued', 0),
+        'espera_total_ms': espera_ms,
+        'espera_promedio_ms': round(espera_ms / solicitudes, 2) if solicitudes else 0,
+        'errores': stats.get('requests_errors', 0),
+        'conexiones_nuevas': stats.get('connections_num', 0),
+        'conexion_total_ms': stats.get('connections_ms', 0),
+    }
+
+
+def estadisticas():
+    resultado = {}
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        resultado[alias] = {
+            'modo': modo(alias),
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        if resultado[alias]['modo'] == 'pool':
+            resultado[alias]['pool'] = _pool(alias)
+    return resultado
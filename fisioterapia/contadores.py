@@ -0,0 +1,146 @@
+"""
+Contadores compartidos (dashboard y encabezados de los listados) en la caché.
+
+Cada contador se registra con su modelo y un filtro opcional. El valor se
+guarda en la caché de Django (memoria local o archivos, ver ``CACHES``) y se
+ajusta con las señales del modelo: +1/-1 al crear/borrar una fila que cumple
+el filtro, e invalidación cuando se edita alguno de los campos del filtro.
+Los ajustes se aplican al confirmar la transacción. Cada valor expira a los
+``CONTADORES_RECONCILIACION`` segundos y se vuelve a contar en la base de
+datos, lo que corrige cualquier deriva (otros procesos, ``bulk_create``,
+``update``); ``manage.py reconciliar_contadores`` fuerza esa reconciliación.
+
+Las citas próximas (ventana móvil de 7 días) se cuentan por intervalos de
+``CONTADORES_INTERVALO_PROXIMAS`` segundos: todas las peticiones de un mismo
+intervalo comparten el conteo tomado al inicio del intervalo.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+PREFIJO = 'contadores'
+
+# nombre -> (modelo, filtro, campos del filtro)
+_registro = {}
+
+
+def _ttl():
+    return getattr(settings, 'CONTADORES_RECONCILIACION', 600)
+
+
+def _clave(nombre):
+    return f'{PREFIJO}:{nombre}'
+
+
+def _cumple(instancia, filtro):
+    return all(getattr(instancia, campo) == valor for campo, valor in filtro.items())
+
+
+def _contar(nombre):
+    modelo, filtro, _ = _registro[nombre]
+    return modelo._default_manager.filter(**filtro).count()
+
+
+def registrar(nombre, modelo, **filtro):
+    """Registra un contador de filas de ``modelo`` que cumplen ``filtro`` (solo igualdades)."""
+    _registro[nombre] = (modelo, filtro, set(filtro))
+    uid = f'{PREFIJO}:{nombre}'
+    post_save.connect(_al_guardar(nombre), sender=modelo, weak=False, dispatch_uid=f'{uid}:save')
+    post_delete.connect(_al_borrar(nombre), sender=modelo, weak=False, dispatch_uid=f'{uid}:delete')
+
+
+def _ajustar(nombre, delta):
+    def aplicar():
+        try:
+            cache.incr(_clave(nombre), delta)
+        except ValueError:
+            # No está en caché: la próxima lectura lo cuenta
+            pass
+    transaction.on_commit(aplicar)
+
+
+def _invalidar(nombre):
+    transaction.on_commit(lambda: cache.delete(_clave(nombre)))
+
+
+def _al_guardar(nombre):
+    def receptor(sender, instance, created, update_fields=None, raw=False, **kwargs):
+        if raw:
+            return
+        _, filtro, campos = _registro[nombre]
+        if created:
+            if _cumple(instance, filtro):
+                _ajustar(nombre, 1)
+        elif campos and (update_fields is None or campos & set(update_fields)):
+            # El valor anterior del filtro no se conoce: se vuelve a contar
+            _invalidar(nombre)
+    return receptor
+
+
+def _al_borrar(nombre):
+    def receptor(sender, instance, **kwargs):
+        _, filtro, _ = _registro[nombre]
+        if _cumple(instance, filtro):
+            _ajustar(nombre, -1)
+    return receptor
+
+
+def obtener(*nombres):
+    """Diccionario ``{nombre: valor}``; los que faltan en caché se cuentan y guardan."""
+    claves = {_clave(nombre): nombre for nombre in nombres}
+    valores = {claves[clave]: v for clave, v in cache.get_many(claves).items()}
+    faltantes = {}
+    for nombre in nombres:
+        if nombre not in valores:
+            valores[nombre] = faltantes[_clave(nombre)] = _contar(nombre)
+    if faltantes:
+        cache.set_many(faltantes, _ttl())
+    return valores
+
+
+def valor(nombre):
+    return obtener(nombre)[nombre]
+
+
+def reconciliar(nombres=None):
+    """Vuelve a contar en la base de datos y devuelve ``{nombre: (anterior, real)}``."""
+    nombres = list(nombres or _registro)
+    claves = {_clave(nombre): nombre for nombre in nombres}
+    anteriores = {claves[clave]: v for clave, v in cache.get_many(claves).items()}
+    reales = {nombre: _contar(nombre) for nombre in nombres}
+    cache.set_many({_clave(nombre): real for nombre, real in reales.items()}, _ttl())
+    return {nombre: (anteriores.get(nombre), reales[nombre]) for nombre in nombres}
+
+
+def citas_proximas(ahora=None):
+    """Citas activas en los próximos 7 días, cacheadas por intervalo de tiempo."""
+    from citas.models import Cita, ESTADOS_ACTIVOS
+
+    ahora = ahora or timezone.now()
+    intervalo = getattr(settings, 'CONTADORES_INTERVALO_PROXIMAS', 300)
+    cubeta = int(ahora.timestamp()) // intervalo
+    clave = f'{PREFIJO}:citas_proximas:{cubeta}:{cache.get(_clave("citas_version"), 0)}'
+    total = cache.get(clave)
+    if total is None:
+        inicio = datetime.fromtimestamp(cubeta * intervalo, tz=timezone.get_current_timezone())
+        total = Cita.objects.filter(
+            fecha_hora__gt=inicio,
+            fecha_hora__lte=inicio + timedelta(days=7),
+            estado__in=ESTADOS_ACTIVOS,
+        ).count()
+        cache.set(clave, total, intervalo)
+    return total
+
+
+def invalidar_citas_proximas(**kwargs):
+    """Receptor de señales de Cita: cambia la versión de las claves por intervalo."""
+    def aplicar():
+        try:
+            cache.incr(_clave('citas_version'))
+        except ValueError:
+            cache.set(_clave('citas_version'), 1, None)
+    transaction.on_commit(aplicar)
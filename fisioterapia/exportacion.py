@@ -0,0 +1,236 @@
+"""
+Exportaciones en streaming (CSV, JSONL, XLSX y ZIP) para reportes grandes.
+
+Las filas se generan y se envían por partes con ``StreamingHttpResponse``: el
+worker nunca arma el archivo completo en memoria y el cliente empieza a recibir
+datos de inmediato. El XLSX se escribe directamente con ``zipfile`` (una hoja
+por sección, celdas en línea, sin estilos), sin dependencias adicionales; el
+ZIP empaqueta archivos ya escritos en disco leyéndolos por bloques.
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas por bloque enviado al cliente
+FILAS_POR_BLOQUE = 500
+# Bytes leídos por bloque de cada archivo del ZIP
+BYTES_POR_BLOQUE = 256 * 1024
+
+# Caracteres que XML 1.0 no admite ni escapados (tabulador vertical de Excel, etc.)
+_ILEGALES_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+class _Eco:
+    """Pseudo-archivo para ``csv.writer``: ``write`` devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+# Inicios de celda que Excel y LibreOffice interpretan como fórmula
+_INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _texto_csv(valor):
+    """Antepone ``'`` al texto que la hoja de cálculo ejecutaría como fórmula (inyección CSV)."""
+    if isinstance(valor, str) and valor.startswith(_INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def filas_csv(encabezados, filas):
+    """Líneas CSV (con BOM para que Excel detecte UTF-8); el texto con forma de fórmula se neutraliza."""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(encabezados)
+    for fila in filas:
+        yield escritor.writerow([_texto_csv(valor) for valor in fila])
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    respuesta = StreamingHttpResponse(filas_csv(encabezados, filas), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
+
+
+def lineas_jsonl(campos, filas):
+    """Un objeto JSON por línea con las llaves ``campos``."""
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    for fila in filas:
+        yield codificador.encode(dict(zip(campos, fila))) + '\n'
+
+
+def respuesta_jsonl(nombre_archivo, campos, filas):
+    respuesta = StreamingHttpResponse(lineas_jsonl(campos, filas), content_type='application/x-ndjson; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
+
+
+# Conjuntos de datos exportables: nombre -> (título, consulta, columnas)
+_conjuntos = {}
+
+
+def registrar(nombre, titulo, consulta, columnas):
+    """Registra un conjunto exportable.
+
+    ``consulta`` es una función que devuelve el queryset base y ``columnas``
+    una secuencia de ``(encabezado, campo)``; los campos pueden cruzar
+    relaciones (``paciente__apellidos``) y se resuelven con JOIN en la misma
+    consulta.
+    """
+    _conjuntos[nombre] = (titulo, consulta, tuple(columnas))
+
+
+def conjuntos():
+    """``{nombre: título}`` de los conjuntos registrados."""
+    return {nombre: titulo for nombre, (titulo, _, _) in _conjuntos.items()}
+
+
+def conjunto(nombre):
+    """``(encabezados, campos, filas)`` del conjunto; las filas se leen por bloques con un cursor del servidor.
+
+    Lanza ``KeyError`` si el conjunto no existe.
+    """
+    _, consulta, columnas = _conjuntos[nombre]
+    encabezados = [encabezado for encabezado, _ in columnas]
+    campos = [campo for _, campo in columnas]
+    filas = consulta().values_list(*campos).iterator(chunk_size=settings.EXPORTACION_FILAS_POR_CONSULTA)
+    return encabezados, campos, filas
+
+
+class _Buffer:
+    """Destino no posicionable para ``zipfile``; se vacía después de cada bloque."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        valor = 'Sí' if valor else 'No'
+    elif isinstance(valor, (int, float, Decimal)):
+        return f'<c t="n"><v>{valor}</v></c>'
+    elif isinstance(valor, (date, datetime)):
+        valor = valor.isoformat()
+    return f'<c t="inlineStr"><is><t>{escape(_ILEGALES_XML.sub(" ", str(valor)))}</t></is></c>'
+
+
+def _fila(valores):
+    return ('<row>' + ''.join(_celda(valor) for valor in valores) + '</row>').encode()
+
+
+_TIPOS_CONTENIDO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{hojas}</Types>'
+)
+_TIPO_HOJA = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELACIONES_PAQUETE = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_LIBRO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{hojas}</sheets></workbook>'
+)
+_RELACIONES_LIBRO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{hojas}</Relationships>'
+)
+_RELACION_HOJA = (
+    '<Relationship Id="rId{n}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+_INICIO_HOJA = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIN_HOJA = b'</sheetData></worksheet>'
+
+
+def libro_xlsx(hojas):
+    """Bytes de un XLSX; ``hojas`` es una lista de ``(nombre, encabezados, filas)``."""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as libro:
+        for n, (_, encabezados, filas) in enumerate(hojas, 1):
+            with libro.open(f'xl/worksheets/sheet{n}.xml', 'w') as hoja:
+                hoja.write(_INICIO_HOJA)
+                hoja.write(_fila(encabezados))
+                for i, fila in enumerate(filas, 1):
+                    hoja.write(_fila(fila))
+                    if i % FILAS_POR_BLOQUE == 0:
+                        yield buffer.vaciar()
+                hoja.write(_FIN_HOJA)
+            yield buffer.vaciar()
+
+        numeros = range(1, len(hojas) + 1)
+        libro.writestr('[Content_Types].xml', _TIPOS_CONTENIDO.format(
+            hojas=''.join(_TIPO_HOJA.format(n=n) for n in numeros)))
+        libro.writestr('_rels/.rels', _RELACIONES_PAQUETE)
+        libro.writestr('xl/workbook.xml', _LIBRO.format(hojas=''.join(
+            f'<sheet name={quoteattr(nombre[:31])} sheetId="{n}" r:id="rId{n}"/>'
+            for n, (nombre, _, _) in zip(numeros, hojas)
+        )))
+        libro.writestr('xl/_rels/workbook.xml.rels', _RELACIONES_LIBRO.format(
+            hojas=''.join(_RELACION_HOJA.format(n=n) for n in numeros)))
+    yield buffer.vaciar()
+
+
+def respuesta_xlsx(nombre_archivo, hojas):
+    respuesta = StreamingHttpResponse(libro_xlsx(hojas), content_type=TIPO_XLSX)
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
+
+
+def paquete_zip(archivos):
+    """Bytes de un ZIP; ``archivos`` es un iterable de ``(nombre, ruta)`` que puede ir llegando."""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as paquete:
+        for nombre, ruta in archivos:
+            with open(ruta, 'rb') as origen, paquete.open(nombre, 'w') as destino:
+                for bloque in iter(lambda: origen.read(BYTES_POR_BLOQUE), b''):
+                    destino.write(bloque)
+                    yield buffer.vaciar()
+    yield buffer.vaciar()
+
+
+def respuesta_zip(nombre_archivo, archivos):
+    respuesta = StreamingHttpResponse(paquete_zip(archivos), content_type='application/zip')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
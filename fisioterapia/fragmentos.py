@@ -0,0 +1,129 @@
+"""
+Caché de las respuestas AJAX de los listados (tabla y paginación en JSON).
+
+Cada tecla del buscador pide ``?busqueda=...`` al listado, que vuelve a
+consultar y a renderizar los parciales aunque nada haya cambiado. Con
+``FragmentoCacheMixin`` el JSON se guarda en la caché con la clave
+``(ruta, parámetros de la petición, versión del grupo)`` y, si ya está, se
+responde sin tocar la base de datos ni las plantillas.
+
+La versión de un grupo (``registrar('citas', Cita, Paciente)``) sube con cada
+``post_save``/``post_delete`` de sus modelos, al confirmar la transacción; las
+claves viejas dejan de usarse y expiran a los ``FRAGMENTOS_TTL`` segundos. Los
+cambios sin señales (``update``, ``bulk_create``) llaman a ``invalidar``; el
+TTL acota además lo que depende de la hora (citas vencidas, citas próximas).
+
+Versiones y fragmentos viven en la caché ``default``, que con varios workers es
+compartida (``gunicorn.conf.py``): un cambio guardado en un proceso invalida los
+fragmentos de todos. Si la clave de versión se pierde (reinicio, desalojo), el
+grupo vuelve a empezar desde la hora actual y no desde cero, para no reutilizar
+claves de fragmentos que sigan en la caché.
+
+Los aciertos y fallos de este proceso se ven en ``/instrumentacion/``.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import JsonResponse
+
+PREFIJO = 'fragmentos'
+
+_candado = threading.Lock()
+_contadores = defaultdict(lambda: {'aciertos': 0, 'fallos': 0})
+
+
+def _clave_version(grupo):
+    return f'{PREFIJO}:version:{grupo}'
+
+
+def _version(grupo):
+    """Versión vigente de ``grupo``; si falta, la crea a partir de la hora (sin pisar la de otro proceso)."""
+    version = cache.get(_clave_version(grupo))
+    if version is None:
+        cache.add(_clave_version(grupo), time.time_ns() // 1000, None)
+        version = cache.get(_clave_version(grupo))
+    return version
+
+
+def invalidar(grupo, **kwargs):
+    """Sube la versión de ``grupo`` al confirmar la transacción (sirve como receptor de señales)."""
+    def aplicar():
+        try:
+            cache.incr(_clave_version(grupo))
+        except ValueError:
+            _version(grupo)
+            cache.incr(_clave_version(grupo))
+    transaction.on_commit(aplicar)
+
+
+def registrar(grupo, *modelos):
+    """Invalida los fragmentos de ``grupo`` cuando se guarda o borra cualquiera de ``modelos``."""
+    def receptor(sender, raw=False, **kwargs):
+        if not raw:
+            invalidar(grupo)
+
+    for modelo in modelos:
+        uid = f'{PREFIJO}:{grupo}:{modelo._meta.label_lower}'
+        post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'{uid}:save')
+        post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'{uid}:delete')
+
+
+def clave(grupo, request):
+    """Clave del JSON de la petición con la versión vigente del grupo."""
+    version = _version(grupo)
+    # Mismos parámetros en otro orden, misma clave
+    consulta = urlencode(sorted(request.GET.lists()), doseq=True)
+    resumen = hashlib.sha1(f'{request.path}?{consulta}'.encode()).hexdigest()
+    return f'{PREFIJO}:{grupo}:{version}:{resumen}'
+
+
+def _anotar(vista, acierto):
+    with _candado:
+        _contadores[vista]['aciertos' if acierto else 'fallos'] += 1
+
+
+def estadisticas():
+    """``{ruta: {'aciertos', 'fallos', 'tasa_aciertos'}}`` de este proceso."""
+    with _candado:
+        copia = {vista: dict(valores) for vista, valores in _contadores.items()}
+    for valores in copia.values():
+        total = valores['aciertos'] + valores['fallos']
+        valores['tasa_aciertos'] = round(valores['aciertos'] / total, 3) if total else 0.0
+    return copia
+
+
+class FragmentoCacheMixin:
+    """Mixin para ListView: las peticiones AJAX reciben el JSON de ``datos_fragmento`` cacheado.
+
+    La vista declara ``fragmento_grupo`` (un grupo de ``registrar``) e implementa
+    ``datos_fragmento(context)``, que renderiza los parciales y devuelve el diccionario.
+    """
+    fragmento_grupo = None
+
+    def es_ajax(self):
+        return self.request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+    def get(self, request, *args, **kwargs):
+        if not self.es_ajax():
+            return super().get(request, *args, **kwargs)
+        # La clave se fija antes de consultar: si la vista cambia datos al leer, la versión nueva no se pisa
+        self.clave_fragmento = clave(self.fragmento_grupo, request)
+        datos = cache.get(self.clave_fragmento)
+        _anotar(request.resolver_match.view_name, datos is not None)
+        if datos is not None:
+            return JsonResponse(datos)
+        return super().get(request, *args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.es_ajax():
+            return super().render_to_response(context, **response_kwargs)
+        datos = self.datos_fragmento(context)
+        cache.set(self.clave_fragmento, datos, settings.FRAGMENTOS_TTL)
+        return JsonResponse(datos)
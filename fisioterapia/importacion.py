@@ -0,0 +1,127 @@
+"""
+Lectura en streaming de archivos CSV y XLSX para importaciones.
+
+``filas(archivo, nombre)`` devuelve las filas como listas de texto, una a la
+vez, sin cargar el archivo completo. El CSV detecta el separador (``,``,
+``;`` o tabulador) en los primeros KB. Del XLSX se lee la primera hoja con
+``iterparse`` liberando cada fila al procesarla; solo la tabla de cadenas
+compartidas queda en memoria. Sin dependencias adicionales, igual que
+``fisioterapia.exportacion``.
+"""
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PAQUETE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Caracteres leídos para detectar el separador del CSV
+MUESTRA_CSV = 16 * 1024
+
+
+class ArchivoInvalido(ValueError):
+    """El archivo no se puede leer como CSV/XLSX o no tiene el formato esperado."""
+
+
+def filas_csv(archivo, codificacion='utf-8-sig'):
+    texto = io.TextIOWrapper(archivo, encoding=codificacion, newline='')
+    try:
+        muestra = texto.read(MUESTRA_CSV)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(texto, dialecto)
+    except UnicodeDecodeError:
+        raise ArchivoInvalido(f'El archivo no está en {codificacion}.')
+    finally:
+        # El archivo es del llamador: no se cierra junto con el envoltorio
+        texto.detach()
+
+
+def _texto(elemento):
+    """Texto de un ``<si>``/``<is>``: el ``<t>`` directo o los de cada ``<r>`` (sin fonéticos)."""
+    directo = elemento.find(f'{_NS}t')
+    if directo is not None:
+        return directo.text or ''
+    return ''.join(t.text or '' for t in elemento.iterfind(f'{_NS}r/{_NS}t'))
+
+
+def _indice_columna(referencia):
+    """'C12' -> 2."""
+    indice = 0
+    for letra in referencia:
+        if not letra.isalpha():
+            break
+        indice = indice * 26 + ord(letra.upper()) - ord('A') + 1
+    return indice - 1
+
+
+def _primera_hoja(libro):
+    sheets = ElementTree.fromstring(libro.read('xl/workbook.xml')).find(f'{_NS}sheets')
+    rid = sheets[0].get(f'{_NS_REL}id')
+    for relacion in ElementTree.fromstring(libro.read('xl/_rels/workbook.xml.rels')).iter(f'{_NS_PAQUETE}Relationship'):
+        if relacion.get('Id') == rid:
+            destino = relacion.get('Target')
+            return destino.lstrip('/') if destino.startswith('/') else f'xl/{destino}'
+    raise KeyError(rid)
+
+
+def _valor(celda, compartidas):
+    tipo = celda.get('t')
+    if tipo == 'inlineStr':
+        contenido = celda.find(f'{_NS}is')
+        return _texto(contenido) if contenido is not None else ''
+    valor = celda.findtext(f'{_NS}v') or ''
+    if tipo == 's':
+        return compartidas[int(valor)]
+    if tipo == 'b':
+        return 'true' if valor == '1' else 'false'
+    return valor
+
+
+def filas_xlsx(archivo):
+    try:
+        libro = zipfile.ZipFile(archivo)
+        hoja = _primera_hoja(libro)
+    except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError):
+        raise ArchivoInvalido('El archivo no es un libro XLSX válido.')
+
+    with libro:
+        try:
+            compartidas = []
+            if 'xl/sharedStrings.xml' in libro.namelist():
+                with libro.open('xl/sharedStrings.xml') as origen:
+                    for _, elemento in ElementTree.iterparse(origen):
+                        if elemento.tag == f'{_NS}si':
+                            compartidas.append(_texto(elemento))
+                            elemento.clear()
+
+            with libro.open(hoja) as origen:
+                for _, elemento in ElementTree.iterparse(origen):
+                    if elemento.tag != f'{_NS}row':
+                        continue
+                    fila = []
+                    for celda in elemento.iterfind(f'{_NS}c'):
+                        referencia = celda.get('r')
+                        if referencia:
+                            fila.extend([''] * (_indice_columna(referencia) - len(fila)))
+                        fila.append(_valor(celda, compartidas))
+                    yield fila
+                    elemento.clear()
+        except (ElementTree.ParseError, zipfile.BadZipFile, KeyError, IndexError) as error:
+            # La hoja se lee mientras se importa: un XML dañado aparece a mitad de la lectura
+            raise ArchivoInvalido(f'El libro XLSX está dañado: {error}')
+
+
+def filas(archivo, nombre, codificacion='utf-8-sig'):
+    """Filas del archivo según su extensión (``.csv`` o ``.xlsx``)."""
+    extension = nombre.rsplit('.', 1)[-1].lower()
+    if extension == 'xlsx':
+        return filas_xlsx(archivo)
+    if extension in ('csv', 'txt'):
+        return filas_csv(archivo, codificacion)
+    raise ArchivoInvalido('Formato no soportado: use un archivo .csv o .xlsx.')
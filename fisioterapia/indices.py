@@ -0,0 +1,51 @@
+"""
+Consultas frecuentes y el índice de ``Meta.indexes`` que debe atenderlas.
+
+Cada app registra en su ``indices.py`` las consultas de sus listados y managers
+junto con el nombre del índice pensado para ellas. ``revisar()`` obtiene el
+plan de cada una con ``QuerySet.explain()`` y dice si lo usa: las pruebas lo
+comprueban para todas y el comando ``revisar_indices`` hace lo mismo contra
+una base real, con sus estadísticas.
+
+SQLite crea los índices parciales pero no los usa cuando la condición llega
+como parámetro (``estado IN (?, ?)``), que es como Django envía los valores:
+esas consultas se registran con ``solo_postgresql`` y en SQLite no se revisan.
+"""
+from django.db import connections, transaction
+
+_registro = {}
+
+
+def registrar(indice, consulta, solo_postgresql=False):
+    """``consulta`` es un callable que devuelve el queryset; se evalúa al revisar."""
+    _registro[indice] = (consulta, solo_postgresql)
+
+
+def consultas():
+    return dict(_registro)
+
+
+def plan(queryset, sin_secuencial=False):
+    """Plan de ejecución del queryset en el motor actual.
+
+    Con ``sin_secuencial`` PostgreSQL no considera el recorrido secuencial: con
+    las tablas casi vacías de las pruebas siempre sería el más barato.
+    """
+    if sin_secuencial and connections[queryset.db].vendor == 'postgresql':
+        with transaction.atomic(using=queryset.db), connections[queryset.db].cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    return queryset.explain()
+
+
+def revisar(sin_secuencial=False):
+    """``[(indice, usado, plan)]`` de cada consulta registrada; ``usado`` es None si no se revisa en este motor."""
+    resultado = []
+    for indice, (consulta, solo_postgresql) in _registro.items():
+        queryset = consulta()
+        if solo_postgresql and connections[queryset.db].vendor != 'postgresql':
+            resultado.append((indice, None, 'Solo se revisa en PostgreSQL.'))
+            continue
+        texto = plan(queryset, sin_secuencial)
+        resultado.append((indice, indice in texto, texto))
+    return resultado
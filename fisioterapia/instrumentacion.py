@@ -0,0 +1,220 @@
+"""
+Instrumentación por petición: consultas SQL, tiempo en base de datos, tiempo
+de render de plantillas y tiempo total, agrupados por nombre de ruta
+(``pacientes:lista``, ``tratamientos:detalle``...).
+
+Cada petición medida se publica de tres formas:
+
+* cabeceras ``Server-Timing`` y ``X-Consultas-SQL`` en la respuesta
+  (``conn`` es lo que tardó abrir la conexión o sacarla del pool);
+* una línea JSON en el logger ``fisioterapia.instrumentacion``;
+* un histograma en memoria (últimas ``INSTRUMENTACION_MUESTRAS`` peticiones
+  por ruta) que se consulta en ``/instrumentacion/`` (solo staff), junto con
+  el estado de las conexiones a la base (``fisioterapia.conexiones``) y los
+  aciertos de la caché de los listados AJAX (``fisioterapia.fragmentos``).
+
+``PRESUPUESTOS_CONSULTAS`` fija el máximo de consultas por ruta (o por ruta y
+método, con un diccionario ``{'GET': n, 'POST': m}``). Al excederlo
+se registra una advertencia; con ``PRESUPUESTOS_ESTRICTOS = True`` (pensado
+para las pruebas) se lanza ``PresupuestoExcedido`` y la prueba falla.
+
+El tiempo de plantillas se mide con el backend ``PlantillasInstrumentadas``
+configurado en ``TEMPLATES``, así que incluye ``render()`` y
+``render_to_string()`` de los parciales AJAX.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from statistics import median
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates
+
+from fisioterapia import conexiones, fragmentos
+
+logger = logging.getLogger('fisioterapia.instrumentacion')
+
+# Límites superiores (ms) de las cubetas del histograma de tiempo total
+CUBETAS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class PresupuestoExcedido(AssertionError):
+    """Una ruta ejecutó más consultas SQL que su presupuesto."""
+
+
+class Medicion:
+    """Acumuladores de una petición."""
+    __slots__ = ('consultas', 'conexion', 'db', 'plantillas')
+
+    def __init__(self):
+        self.consultas = 0
+        self.conexion = 0.0
+        self.db = 0.0
+        self.plantillas = 0.0
+
+    def sumar_conexion(self, segundos):
+        self.conexion += segundos
+
+    def __call__(self, execute, sql, params, many, context):
+        # Firma de connection.execute_wrapper
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class Histograma:
+    """Muestras recientes por ruta, con un candado para los hilos del servidor."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._muestras = defaultdict(lambda: deque(maxlen=self.maximo))
+        self._candado = threading.Lock()
+
+    def agregar(self, vista, total_ms, db_ms, plantillas_ms, consultas):
+        with self._candado:
+            self._muestras[vista].append((total_ms, db_ms, plantillas_ms, consultas))
+
+    def limpiar(self):
+        with self._candado:
+            self._muestras.clear()
+
+    def resumen(self):
+        with self._candado:
+            copia = {vista: list(muestras) for vista, muestras in self._muestras.items()}
+        return {vista: _resumir(muestras) for vista, muestras in sorted(copia.items())}
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def _resumir(muestras):
+    totales = sorted(m[0] for m in muestras)
+    cubetas = [0] * (len(CUBETAS_MS) + 1)
+    for total in totales:
+        cubetas[bisect_left(CUBETAS_MS, total)] += 1
+    etiquetas = [f'<={limite}ms' for limite in CUBETAS_MS] + [f'>{CUBETAS_MS[-1]}ms']
+    return {
+        'peticiones': len(muestras),
+        'total_ms': {
+            'p50': round(median(totales), 2),
+            'p95': round(_percentil(totales, 0.95), 2),
+            'p99': round(_percentil(totales, 0.99), 2),
+            'max': round(totales[-1], 2),
+        },
+        'db_ms_promedio': round(sum(m[1] for m in muestras) / len(muestras), 2),
+        'plantillas_ms_promedio': round(sum(m[2] for m in muestras) / len(muestras), 2),
+        'consultas_max': max(m[3] for m in muestras),
+        'consultas_promedio': round(sum(m[3] for m in muestras) / len(muestras), 2),
+        'histograma': dict(zip(etiquetas, cubetas)),
+    }
+
+
+histograma = Histograma(getattr(settings, 'INSTRUMENTACION_MUESTRAS', 500))
+
+
+class InstrumentacionMiddleware:
+    """Mide cada petición; debe ir primero en MIDDLEWARE para cubrir todo el ciclo."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(conexiones.medir(medicion.sumar_conexion, alias))
+                    pila.enter_context(connections[alias].execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        total = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        total_ms, db_ms, plantillas_ms = total * 1000, medicion.db * 1000, medicion.plantillas * 1000
+        conexion_ms = medicion.conexion * 1000
+
+        response['Server-Timing'] = (
+            f'conn;dur={conexion_ms:.1f}, db;dur={db_ms:.1f};desc="{medicion.consultas} consultas", '
+            f'tpl;dur={plantillas_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        response['X-Consultas-SQL'] = str(medicion.consultas)
+        histograma.agregar(vista, total_ms, db_ms, plantillas_ms, medicion.consultas)
+        logger.info(json.dumps({
+            'vista': vista,
+            'metodo': request.method,
+            'estado': response.status_code,
+            'consultas': medicion.consultas,
+            'conexion_ms': round(conexion_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'plantillas_ms': round(plantillas_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }))
+
+        presupuesto = getattr(settings, 'PRESUPUESTOS_CONSULTAS', {}).get(vista)
+        if isinstance(presupuesto, dict):
+            presupuesto = presupuesto.get(request.method)
+        if presupuesto is not None and medicion.consultas > presupuesto:
+            mensaje = f'{vista}: {medicion.consultas} consultas SQL (presupuesto {presupuesto})'
+            if getattr(settings, 'PRESUPUESTOS_ESTRICTOS', False):
+                raise PresupuestoExcedido(mensaje)
+            logger.warning(mensaje)
+        return response
+
+
+class _PlantillaMedida:
+    """Envuelve una plantilla del backend para sumar su tiempo de render."""
+
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return self.plantilla.render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasInstrumentadas(DjangoTemplates):
+    """Backend DjangoTemplates que reporta el tiempo de render a la medición actual."""
+
+    def from_string(self, template_code):
+        return _PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name))
+
+
+@staff_member_required
+def instrumentacion_view(request):
+    """Resumen del histograma en memoria de este proceso (JSON), con conexiones y caché de fragmentos."""
+    return JsonResponse({
+        'cubetas_ms': CUBETAS_MS,
+        'vistas': histograma.resumen(),
+        'conexiones': conexiones.estadisticas(),
+        'fragmentos': fragmentos.estadisticas(),
+    })
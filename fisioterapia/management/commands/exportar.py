@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fisioterapia import exportacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta un conjunto de datos completo en CSV o JSONL (sin nombre, lista los conjuntos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombre', nargs='?', help='Conjunto a exportar.')
+        parser.add_argument('--formato', choices=('csv', 'jsonl'), default='csv')
+        parser.add_argument('--salida', help='Archivo de destino (por defecto la salida estándar).')
+
+    def handle(self, *args, **options):
+        if not options['nombre']:
+            for nombre, titulo in exportacion.conjuntos().items():
+                self.stdout.write(f'{nombre}: {titulo}')
+            return
+        try:
+            encabezados, campos, filas = exportacion.conjunto(options['nombre'])
+        except KeyError:
+            raise CommandError(f'Conjunto desconocido: {options["nombre"]}')
+
+        if options['formato'] == 'jsonl':
+            lineas = exportacion.lineas_jsonl(campos, filas)
+        else:
+            lineas = exportacion.filas_csv(encabezados, filas)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+                archivo.writelines(lineas)
+        else:
+            for linea in lineas:
+                self.stdout.write(linea, ending='')
@@ -0,0 +1,37 @@
+"""
+Sesión para los comandos que miden las vistas (``benchmark_vistas``, ``prueba_carga``).
+
+Las vistas piden sesión iniciada, así que los comandos necesitan un usuario.
+``cliente_autenticado`` no deja nada en la base al terminar: sin ``usuario``
+crea un staff temporal con contraseña inutilizable y lo borra al salir; con
+``usuario`` usa esa cuenta existente sin modificarla. En ambos casos la sesión
+abierta para la medición se cierra al salir, aunque la medición falle.
+"""
+import secrets
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.test import Client
+
+
+@contextmanager
+def cliente_autenticado(usuario=None, **kwargs):
+    """``Client`` (con ``kwargs``) con la sesión iniciada mientras dura el bloque."""
+    modelo = get_user_model()
+    temporal = usuario is None
+    if temporal:
+        cuenta = modelo.objects.create_user(f'medicion-{secrets.token_hex(4)}', is_staff=True)
+    else:
+        try:
+            cuenta = modelo.objects.get(username=usuario)
+        except modelo.DoesNotExist:
+            raise CommandError(f'No existe el usuario "{usuario}".')
+    cliente = Client(**kwargs)
+    cliente.force_login(cuenta)
+    try:
+        yield cliente
+    finally:
+        cliente.logout()
+        if temporal:
+            cuenta.delete()
@@ -0,0 +1,154 @@
+"""
+Paginación por cursor (keyset / seek) para los listados grandes.
+
+En lugar de ``OFFSET`` cada página se pide "a partir de" la última fila vista,
+usando la columna de orden del listado más la llave primaria como desempate.
+El costo de una página no depende de qué tan profunda esté y no se ejecuta un
+``COUNT(*)`` salvo que la plantilla lo pida; en PostgreSQL ese conteo se toma
+de las estadísticas del planificador.
+
+El modo se activa cuando la petición trae el parámetro ``cursor`` (vacío para
+la primera página); sin él la vista conserva la paginación por número. Los
+listados que ordenan por relevancia cuando hay búsqueda declaran esos
+parámetros en ``cursor_parametros_relevancia``: con alguno presente se pagina
+por número, porque el cursor solo conoce ``cursor_campo`` y perdería ese orden.
+"""
+import json
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+SALT_CURSOR = 'fisioterapia.paginacion.cursor'
+
+
+def contar_aproximado(queryset):
+    """Número de filas estimado por el planificador (PostgreSQL) o conteo exacto."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class PaginadorCursor:
+    """Sustituto mínimo de Paginator: solo expone ``count`` bajo demanda."""
+
+    def __init__(self, queryset, aproximado=True):
+        self.queryset = queryset
+        self.aproximado = aproximado
+
+    @cached_property
+    def count(self):
+        if self.aproximado:
+            return contar_aproximado(self.queryset)
+        return self.queryset.count()
+
+
+class PaginaCursor:
+    """Página de resultados con tokens opacos hacia la página siguiente/anterior."""
+
+    def __init__(self, object_list, paginator, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginationMixin:
+    """Mixin para ListView que pagina por cursor sobre ``cursor_campo`` descendente + pk.
+
+    Las vistas solo declaran ``cursor_campo`` (y, si ordenan por relevancia,
+    ``cursor_parametros_relevancia``); ``paginate_by`` se reutiliza como
+    tamaño de página. El contexto recibe ``modo_cursor`` y ``filtros_querystring``
+    para que las plantillas armen los enlaces conservando los filtros.
+    """
+    cursor_campo = None
+    cursor_parametro = 'cursor'
+    cursor_conteo_aproximado = True
+    cursor_parametros_relevancia = ()
+
+    def modo_cursor(self):
+        if self.cursor_campo is None or self.cursor_parametro not in self.request.GET:
+            return False
+        return not any(self.request.GET.get(parametro, '').strip() for parametro in self.cursor_parametros_relevancia)
+
+    def _codificar(self, obj, direccion):
+        valor = getattr(obj, self.cursor_campo)
+        return signing.dumps([valor.isoformat(), obj.pk, direccion], salt=SALT_CURSOR, compress=True)
+
+    def _decodificar(self, token, queryset):
+        """Devuelve (valor, pk, direccion) o None si el token no es válido."""
+        try:
+            valor, pk, direccion = signing.loads(token, salt=SALT_CURSOR)
+            campo = queryset.model._meta.get_field(self.cursor_campo)
+            return campo.to_python(valor), int(pk), direccion
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.modo_cursor():
+            return super().paginate_queryset(queryset, page_size)
+
+        campo = self.cursor_campo
+        paginador = PaginadorCursor(queryset, aproximado=self.cursor_conteo_aproximado)
+        posicion = self._decodificar(self.request.GET.get(self.cursor_parametro, ''), queryset)
+
+        if posicion is None:
+            filas = list(queryset.order_by(f'-{campo}', '-pk')[:page_size + 1])
+            hay_mas, hay_menos = len(filas) > page_size, False
+            filas = filas[:page_size]
+        else:
+            valor, pk, direccion = posicion
+            if direccion == 'anterior':
+                filas = list(
+                    queryset.filter(Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'pk__gt': pk}))
+                    .order_by(campo, 'pk')[:page_size + 1]
+                )
+                hay_menos, hay_mas = len(filas) > page_size, True
+                filas = list(reversed(filas[:page_size]))
+            else:
+                filas = list(
+                    queryset.filter(Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'pk__lt': pk}))
+                    .order_by(f'-{campo}', '-pk')[:page_size + 1]
+                )
+                hay_mas, hay_menos = len(filas) > page_size, True
+                filas = filas[:page_size]
+
+        pagina = PaginaCursor(
+            filas,
+            paginador,
+            cursor_siguiente=self._codificar(filas[-1], 'siguiente') if filas and hay_mas else None,
+            cursor_anterior=self._codificar(filas[0], 'anterior') if filas and hay_menos else None,
+        )
+        return paginador, pagina, filas, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['modo_cursor'] = self.modo_cursor()
+        filtros = self.request.GET.copy()
+        filtros.pop(self.cursor_parametro, None)
+        filtros.pop(self.page_kwarg, None)
+        context['filtros_querystring'] = filtros.urlencode()
+        return context
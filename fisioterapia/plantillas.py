@@ -0,0 +1,47 @@
+"""
+Precompilación de las plantillas del proyecto.
+
+Con el cargador en caché (``PLANTILLAS_CACHE``) cada proceso compila una
+plantilla la primera vez que la usa. En las grandes (``tratamiento_form.html``,
+``paciente_list.html`` con su JS en línea) son varios milisegundos que pagaba
+la primera petición después de un despliegue o del reciclaje de un worker.
+``precompilar()`` carga de una vez todas las plantillas de ``TEMPLATES['DIRS']``;
+``gunicorn.conf.py`` la llama en el proceso maestro cuando la app se precarga
+(los workers heredan la caché al crearse) o en cada worker al arrancar.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+
+def nombres(motor):
+    """Nombres de todas las plantillas ``.html`` bajo las carpetas ``DIRS`` del motor."""
+    for carpeta in motor.dirs:
+        carpeta = Path(carpeta)
+        for ruta in sorted(carpeta.rglob('*.html')):
+            yield ruta.relative_to(carpeta).as_posix()
+
+
+def precompilar():
+    """Compila las plantillas del proyecto; devuelve ``(compiladas, {nombre: error})``."""
+    inicio = time.perf_counter()
+    compiladas = 0
+    errores = {}
+    for motor in engines.all():
+        if not isinstance(motor, DjangoTemplates):
+            continue
+        for nombre in nombres(motor):
+            try:
+                motor.engine.get_template(nombre)
+            except (TemplateSyntaxError, TemplateDoesNotExist) as error:
+                errores[nombre] = str(error)
+                logger.warning('Plantilla %s no compila: %s', nombre, error)
+            else:
+                compiladas += 1
+    logger.info('%s plantillas precompiladas en %.0f ms', compiladas, (time.perf_counter() - inicio) * 1000)
+    return compiladas, errores
@@ -0,0 +1,114 @@
+"""
+Selección remota para llaves foráneas con muchas filas.
+
+En lugar de un ``<select>`` con toda la tabla, el formulario muestra un campo
+de texto y un input oculto con la llave primaria. Del lado del servidor solo
+se consulta la fila seleccionada (para su etiqueta); las opciones llegan
+paginadas desde una vista JSON al escribir (``static/js/seleccion_remota.js``).
+La validación sigue siendo la de ``ModelChoiceField``: por llave primaria
+contra el queryset del campo.
+"""
+from django import forms
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.views import View
+
+
+class SeleccionRemotaWidget(forms.Widget):
+    """Widget para ``ModelChoiceField`` que no itera las opciones al renderizar.
+
+    ``depende_de`` es el id de otro input cuyo valor se envía a la vista JSON
+    con el nombre indicado en ``parametro_dependencia``.
+    """
+
+    class Media:
+        js = ('js/seleccion_remota.js',)
+
+    def __init__(self, url, attrs=None, placeholder='Escribe para buscar...', depende_de=None,
+                 parametro_dependencia=None):
+        super().__init__(attrs)
+        self.url = url
+        self.placeholder = placeholder
+        self.depende_de = depende_de
+        self.parametro_dependencia = parametro_dependencia
+
+    def etiqueta(self, value):
+        """Texto de la opción seleccionada, con una sola consulta por llave primaria."""
+        if value in (None, ''):
+            return ''
+        opciones = self.choices
+        queryset = getattr(opciones, 'queryset', None)
+        if queryset is None:
+            return str(value)
+        try:
+            obj = queryset.filter(pk=value).first()
+        except (ValueError, TypeError):
+            return ''
+        return opciones.field.label_from_instance(obj) if obj else ''
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        id_ = attrs.pop('id', f'id_{name}')
+        requerido = attrs.pop('required', False)
+        clases = attrs.pop('class', 'form-control').replace('form-select', 'form-control')
+        dependencia = ''
+        if self.depende_de:
+            dependencia = format_html(
+                ' data-depende-de="{}" data-parametro-dependencia="{}"',
+                self.depende_de, self.parametro_dependencia or self.depende_de,
+            )
+        return format_html(
+            '<div class="seleccion-remota position-relative" data-url="{}"{}>'
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="text" class="{}" id="{}_texto" value="{}" placeholder="{}" autocomplete="off"{}>'
+            '<div class="list-group position-absolute w-100 shadow-sm d-none" '
+            'style="z-index: 1050; max-height: 320px; overflow-y: auto;"></div>'
+            '</div>',
+            self.url, dependencia,
+            name, id_, '' if value is None else value,
+            clases, id_, self.etiqueta(value), self.placeholder,
+            mark_safe(' required') if requerido else '',
+        )
+
+
+class OpcionesRemotasView(LoginRequiredMixin, View):
+    """Vista JSON paginada para ``SeleccionRemotaWidget``.
+
+    Las subclases definen ``get_queryset`` (ya ordenado) y ``campos_busqueda``;
+    responde ``{resultados: [{id, texto}], pagina, hay_mas}`` sin ``COUNT(*)``.
+    """
+    campos_busqueda = ()
+    por_pagina = 20
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def filtrar(self, queryset, termino):
+        for palabra in termino.split():
+            condicion = None
+            for campo in self.campos_busqueda:
+                q = Q(**{f'{campo}__icontains': palabra})
+                condicion = q if condicion is None else condicion | q
+            if condicion is not None:
+                queryset = queryset.filter(condicion)
+        return queryset
+
+    def etiqueta(self, obj):
+        return str(obj)
+
+    def get(self, request):
+        try:
+            pagina = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetro pagina inválido.'}, status=400)
+        queryset = self.filtrar(self.get_queryset(), request.GET.get('q', '').strip())
+        inicio = (pagina - 1) * self.por_pagina
+        filas = list(queryset[inicio:inicio + self.por_pagina + 1])
+        return JsonResponse({
+            'resultados': [{'id': obj.pk, 'texto': self.etiqueta(obj)} for obj in filas[:self.por_pagina]],
+            'pagina': pagina,
+            'hay_mas': len(filas) > self.por_pagina,
+        })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
     
     # Aplicaciones propias
+    'fisioterapia',
     'pacientes',
     'citas',
     'historiaclinica',
@@ -63,6 +65,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero para medir el ciclo completo (ver fisioterapia.instrumentacion)
+    'fisioterapia.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,12 +78,24 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'fisioterapia.urls'
 
+# Cargadores explícitos y en caché sin depender de DEBUG: cada plantilla se
+# compila una vez por proceso (fisioterapia.plantillas las precompila al arrancar
+# gunicorn). runserver vacía la caché al editar una plantilla; con
+# PLANTILLAS_CACHE=False se leen y compilan en cada uso.
+CARGADORES_PLANTILLAS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if config('PLANTILLAS_CACHE', default=True, cast=bool):
+    CARGADORES_PLANTILLAS = [('django.template.loaders.cached.Loader', CARGADORES_PLANTILLAS)]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render por petición
+        'BACKEND': 'fisioterapia.instrumentacion.PlantillasInstrumentadas',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': CARGADORES_PLANTILLAS,
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -103,9 +119,41 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Segundos que se reutiliza la conexión de cada hilo entre peticiones (0: una por petición;
+        # fisioterapia.asgi siempre usa 0)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        # Verifica al inicio de cada petición que la conexión reutilizada siga viva
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# PostgreSQL: con DB_POOL=True y psycopg 3 + psycopg_pool instalados, cada
+# proceso mantiene un pool de conexiones (ver fisioterapia.conexiones); con
+# psycopg2 se queda en las conexiones persistentes de CONN_MAX_AGE.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['OPTIONS'] = {'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int)}
+    if config('DB_POOL', default=False, cast=bool) and find_spec('psycopg') and find_spec('psycopg_pool'):
+        from psycopg_pool import ConnectionPool
+
+        # El pool decide cuánto vive cada conexión; Django exige CONN_MAX_AGE = 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+            # Segundos que una petición espera una conexión libre antes de fallar
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+        }
+        if DATABASES['default']['CONN_HEALTH_CHECKS']:
+            # Comprueba cada conexión al entregarla
+            DATABASES['default']['OPTIONS']['pool']['check'] = ConnectionPool.check_connection
+
+# En SQLite las transacciones toman el bloqueo de escritura desde el inicio,
+# así la validación de traslapes de citas y su inserción no se intercalan.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -153,6 +201,92 @@ MEDIA_ROOT = BASE_DIR / 'media'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 
+# Caché: memoria local por defecto (un solo proceso: runserver, pruebas). Con varios
+# workers gunicorn.conf.py usa la de archivos si no se define y rechaza LocMemCache;
+# defínela en .env para que los comandos compartan la caché del servidor
+# (CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=/var/tmp/fisio_cache)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='fisioterapia'),
+    }
+}
+
+# Contadores cacheados (fisioterapia.contadores): segundos hasta volver a contar
+# en la base de datos y tamaño del intervalo del conteo de citas próximas
+CONTADORES_RECONCILIACION = config('CONTADORES_RECONCILIACION', default=600, cast=int)
+CONTADORES_INTERVALO_PROXIMAS = config('CONTADORES_INTERVALO_PROXIMAS', default=300, cast=int)
+
+# Instrumentación por petición (fisioterapia.instrumentacion)
+INSTRUMENTACION_MUESTRAS = config('INSTRUMENTACION_MUESTRAS', default=500, cast=int)
+# Máximo de consultas SQL por nombre de ruta (o {'GET': n, 'POST': m} por método);
+# con PRESUPUESTOS_ESTRICTOS se lanza una excepción en lugar de solo registrar una
+# advertencia (las pruebas lo activan)
+PRESUPUESTOS_CONSULTAS = {
+    'dashboard': 6,
+    'pacientes:lista': 6,
+    'pacientes:detalle': 12,
+    'pacientes:antecedentes-patologicos-lista': 6,
+    'pacientes:antecedentes-no-patologicos-lista': 6,
+    'pacientes:autocompletar': 4,
+    'citas:lista': 7,
+    'citas:detalle': 5,
+    'citas:proximas': 5,
+    # POST: sesión, usuario, terapeuta (campo y validación), unicidad, traslape, bloqueo
+    # del terapeuta y revisión con bloqueo, INSERT; en las pruebas cuentan también los SAVEPOINT
+    'citas:crear': {'GET': 4, 'POST': 11},
+    'citas:editar': {'GET': 5, 'POST': 12},
+    'citas:disponibilidad': 5,
+    'historiaclinica:lista': 6,
+    'historiaclinica:detalle': 8,
+    'tratamientos:lista': 7,
+    'tratamientos:detalle': 6,
+    'tratamientos:cuentas_por_cobrar': 8,
+}
+PRESUPUESTOS_ESTRICTOS = config('PRESUPUESTOS_ESTRICTOS', default=False, cast=bool)
+
+# Con INSTRUMENTACION_LOG_NIVEL=INFO se emite una línea JSON por petición
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'fisioterapia.instrumentacion': {
+            'handlers': ['console'],
+            'level': config('INSTRUMENTACION_LOG_NIVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Segundos entre reconstrucciones del índice de nombres del autocompletado (pacientes.indice)
+INDICE_PACIENTES_TTL = config('INDICE_PACIENTES_TTL', default=300, cast=int)
+
+# PDF de ejercicios (historiaclinica.pdf): carpeta de los documentos ya generados,
+# hilos del pool por proceso y ejercicios a partir de los cuales se generan en segundo plano
+PDF_CACHE_DIR = config('PDF_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'pdf'))
+PDF_WORKERS = config('PDF_WORKERS', default=2, cast=int)
+PDF_EJERCICIOS_ASINCRONO = config('PDF_EJERCICIOS_ASINCRONO', default=30, cast=int)
+# Procesos para la exportación en lote de hojas de ejercicios (historiaclinica.lote_pdf)
+PDF_PROCESOS = config('PDF_PROCESOS', default=2, cast=int)
+
+# Filas por bloque del cursor del servidor en las exportaciones (fisioterapia.exportacion)
+EXPORTACION_FILAS_POR_CONSULTA = config('EXPORTACION_FILAS_POR_CONSULTA', default=2000, cast=int)
+
+# Segundos que vive en caché el JSON de los listados AJAX (fisioterapia.fragmentos);
+# las versiones por modelo lo invalidan antes si cambian los datos
+FRAGMENTOS_TTL = config('FRAGMENTOS_TTL', default=60, cast=int)
+
+# Filas por bulk_create en la importación de pacientes (pacientes.importacion)
+IMPORTACION_LOTE = config('IMPORTACION_LOTE', default=1000, cast=int)
+
+# Detección de pacientes duplicados (pacientes.duplicados): puntaje mínimo de
+# similitud y bloques más grandes que esto se ignoran (p. ej. un teléfono comodín)
+DUPLICADOS_UMBRAL = config('DUPLICADOS_UMBRAL', default=0.85, cast=float)
+DUPLICADOS_BLOQUE_MAXIMO = config('DUPLICADOS_BLOQUE_MAXIMO', default=200, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
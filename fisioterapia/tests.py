@@ -0,0 +1,352 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import quote
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from citas.models import Cita
+from citas.tests import crear_cita, crear_terapeuta, hora
+from fisioterapia import conexiones, contadores, exportacion, fragmentos, indices, plantillas
+from fisioterapia.instrumentacion import PresupuestoExcedido, histograma
+from historiaclinica.models import HistoriaClinica
+from pacientes.models import Paciente
+from pacientes.tests import crear_pacientes
+from tratamientos.models import TratamientoEstetico
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('recepcion', password='x')
+        self.client.force_login(self.usuario)
+        histograma.limpiar()
+
+    def test_cabeceras_de_medicion(self):
+        respuesta = self.client.get(reverse('pacientes:lista'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(int(respuesta['X-Consultas-SQL']), 0)
+        self.assertIn('conn;dur=', respuesta['Server-Timing'])
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        self.assertIn('total;dur=', respuesta['Server-Timing'])
+
+    def test_conexion_medida_solo_al_abrirse(self):
+        conexion = connections['default']
+        medidos = []
+        with mock.patch.object(type(conexion), 'ensure_connection') as abrir:
+            # Ya abierta: no se mide
+            with conexiones.medir(medidos.append):
+                conexion.ensure_connection()
+            self.assertEqual(medidos, [])
+            # Cerrada: la primera consulta la abre y se mide una vez
+            with mock.patch.object(conexion, 'connection', None), conexiones.medir(medidos.append):
+                conexion.ensure_connection()
+            self.assertEqual(len(medidos), 1)
+            self.assertEqual(abrir.call_count, 2)
+        # Fuera del bloque queda el método original
+        self.assertNotIn('ensure_connection', vars(conexion))
+
+    def test_lista_dentro_del_presupuesto(self):
+        crear_pacientes(30)
+        respuesta = self.client.get(reverse('pacientes:lista'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    @override_settings(PRESUPUESTOS_CONSULTAS={'pacientes:lista': 1})
+    def test_presupuesto_excedido_falla(self):
+        with self.assertRaises(PresupuestoExcedido):
+            self.client.get(reverse('pacientes:lista'))
+
+    def test_histograma_solo_staff(self):
+        self.client.get(reverse('pacientes:lista'))
+        respuesta = self.client.get(reverse('instrumentacion'))
+        self.assertEqual(respuesta.status_code, 302)
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        respuesta = self.client.get(reverse('instrumentacion'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['vistas']['pacientes:lista']['peticiones'], 1)
+        self.assertIn(respuesta.json()['conexiones']['default']['modo'], ('persistente', 'por_peticion'))
+
+
+class IndicesTests(TestCase):
+    def test_consultas_frecuentes_usan_su_indice(self):
+        for indice, usado, plan in indices.revisar(sin_secuencial=True):
+            with self.subTest(indice=indice):
+                if usado is None:
+                    self.skipTest(plan)
+                self.assertTrue(usado, plan)
+
+    def test_indices_parciales_de_citas_activas(self):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            self.skipTest('En PostgreSQL los revisa test_consultas_frecuentes_usan_su_indice.')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND name LIKE %s", ['cita_activas_%'])
+            definiciones = dict(cursor.fetchall())
+        self.assertEqual(set(definiciones), {'cita_activas_fecha_idx', 'cita_activas_fin_idx'})
+        for nombre, sql in definiciones.items():
+            with self.subTest(indice=nombre):
+                self.assertIn('WHERE "estado" IN (\'disponible\', \'ocupada\')', sql)
+
+
+class PlantillasTests(TestCase):
+    def test_todas_las_plantillas_compilan_y_quedan_en_cache(self):
+        compiladas, errores = plantillas.precompilar()
+        self.assertGreater(compiladas, 0)
+        self.assertEqual(errores, {})
+        cargador = engines.all()[0].engine.template_loaders[0]
+        self.assertIn('pacientes/paciente_list.html', cargador.get_template_cache)
+
+
+class FragmentosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin', password='x'))
+
+    def pedir(self, **parametros):
+        respuesta = self.client.get(reverse('pacientes:lista'), parametros, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_acierto_sin_cambios_y_version_nueva_al_guardar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_pacientes(3)
+        antes = fragmentos.estadisticas().get('pacientes:lista', {'aciertos': 0, 'fallos': 0})
+
+        primera = self.pedir(busqueda='nombre', tipo='patologia')
+        segunda = self.pedir(tipo='patologia', busqueda='nombre')
+        self.assertEqual(primera, segunda)
+        self.assertEqual(primera['resultados'], 3)
+        despues = fragmentos.estadisticas()['pacientes:lista']
+        self.assertEqual(despues['fallos'] - antes['fallos'], 1)
+        self.assertEqual(despues['aciertos'] - antes['aciertos'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Paciente.objects.create(
+                nombres='Nombre9', apellidos='Nuevo', edad=40, genero='M',
+                telefono='5550009999', domicilio='Calle 2', tipo_paciente='patologia',
+            )
+        self.assertEqual(self.pedir(busqueda='nombre', tipo='patologia')['resultados'], 4)
+        self.assertEqual(fragmentos.estadisticas()['pacientes:lista']['fallos'] - antes['fallos'], 2)
+
+    def test_version_compartida_entre_procesos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_pacientes(2)
+        # Dos workers: cada uno con su instancia de la caché de archivos en el mismo directorio
+        with tempfile.TemporaryDirectory() as directorio:
+            worker_a, worker_b = FileBasedCache(directorio, {}), FileBasedCache(directorio, {})
+            with mock.patch.object(fragmentos, 'cache', worker_a):
+                self.assertEqual(self.pedir()['resultados'], 2)
+                self.assertEqual(self.pedir()['resultados'], 2)
+            with mock.patch.object(fragmentos, 'cache', worker_b):
+                self.assertEqual(self.pedir()['resultados'], 2)
+                with self.captureOnCommitCallbacks(execute=True):
+                    crear_pacientes(1)
+            with mock.patch.object(fragmentos, 'cache', worker_a):
+                self.assertEqual(self.pedir()['resultados'], 3)
+
+    def test_version_perdida_no_reutiliza_claves(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            fragmentos.invalidar('pacientes')
+        version = cache.get('fragmentos:version:pacientes')
+        cache.delete('fragmentos:version:pacientes')
+        with self.captureOnCommitCallbacks(execute=True):
+            fragmentos.invalidar('pacientes')
+        self.assertGreater(cache.get('fragmentos:version:pacientes'), version)
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('admin', password='x'))
+        crear_pacientes(45)
+        # Todos con la misma fecha: el orden y los cursores dependen solo del desempate por pk
+        Paciente.objects.update(fecha_registro=Paciente.objects.first().fecha_registro)
+
+    def pagina(self, **parametros):
+        respuesta = self.client.get(reverse('pacientes:lista'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_siguiente_y_anterior_con_fechas_empatadas(self):
+        vistos, paginas, cursor = [], [], ''
+        while cursor is not None:
+            pagina = self.pagina(cursor=cursor).context['page_obj']
+            paginas.append(pagina)
+            vistos += [paciente.pk for paciente in pagina]
+            cursor = pagina.cursor_siguiente
+        self.assertEqual([len(pagina) for pagina in paginas], [20, 20, 5])
+        self.assertEqual(vistos, sorted(Paciente.objects.values_list('pk', flat=True), reverse=True))
+        self.assertFalse(paginas[0].has_previous())
+
+        anterior = self.pagina(cursor=paginas[2].cursor_anterior).context['page_obj']
+        self.assertEqual(list(anterior), list(paginas[1]))
+        primera = self.pagina(cursor=anterior.cursor_anterior).context['page_obj']
+        self.assertEqual(list(primera), list(paginas[0]))
+        self.assertFalse(primera.has_previous())
+
+    def test_los_enlaces_conservan_los_filtros(self):
+        respuesta = self.pagina(cursor='', tipo='patologia', page='3')
+        self.assertEqual(respuesta.context['filtros_querystring'], 'tipo=patologia')
+        siguiente = respuesta.context['page_obj'].cursor_siguiente
+        self.assertContains(respuesta, f'?cursor={quote(siguiente)}&tipo=patologia')
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        primera = self.pagina(cursor='').context['page_obj']
+        token = primera.cursor_siguiente
+        for alterado in (token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB'), 'basura', '1:2:3'):
+            with self.subTest(cursor=alterado):
+                pagina = self.pagina(cursor=alterado).context['page_obj']
+                self.assertEqual(list(pagina), list(primera))
+                self.assertFalse(pagina.has_previous())
+
+    def test_con_busqueda_pagina_por_numero_conservando_la_relevancia(self):
+        primero = Paciente.objects.get(nombres='Nombre30')
+        primero.nombres = 'Apellido10z'
+        primero.save()
+        respuesta = self.pagina(cursor='', busqueda='apellido1')
+        self.assertFalse(respuesta.context['modo_cursor'])
+        pacientes = list(respuesta.context['page_obj'])
+        self.assertEqual(len(pacientes), 12)
+        self.assertEqual(pacientes[0], primero)
+        # Búsqueda vacía: sigue el cursor
+        self.assertTrue(self.pagina(cursor='', busqueda=' ').context['modo_cursor'])
+
+
+class ExportacionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        crear_pacientes(5)
+
+    def descargar(self, nombre, formato):
+        respuesta = self.client.get(reverse('exportar', args=[nombre]), {'formato': formato})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content).decode('utf-8-sig')
+
+    def test_csv_y_jsonl_con_todas_las_filas(self):
+        filas = list(csv.reader(io.StringIO(self.descargar('pacientes', 'csv'))))
+        self.assertEqual(filas[0][:3], ['ID', 'Nombres', 'Apellidos'])
+        self.assertEqual(len(filas), 6)
+        lineas = [json.loads(linea) for linea in self.descargar('pacientes', 'jsonl').splitlines()]
+        self.assertEqual([linea['apellidos'] for linea in lineas], [f'Apellido{i}' for i in range(5)])
+
+    def test_cada_conjunto_se_exporta_en_una_consulta(self):
+        for nombre in self.client.get(reverse('exportaciones')).context['conjuntos']:
+            # Sesión, usuario y la consulta con los JOIN del conjunto
+            with self.subTest(nombre=nombre), self.assertNumQueries(3):
+                self.descargar(nombre, 'jsonl')
+
+    def test_csv_neutraliza_formulas(self):
+        Paciente.objects.filter(nombres='Nombre0').update(nombres='=HYPERLINK("http://x","y")', domicilio='@SUM(A1)')
+        Paciente.objects.filter(nombres='Nombre1').update(nombres='+52 55', domicilio='-2+3')
+        filas = list(csv.reader(io.StringIO(self.descargar('pacientes', 'csv'))))
+        self.assertEqual(filas[1][1], '\'=HYPERLINK("http://x","y")')
+        self.assertIn("'@SUM(A1)", filas[1])
+        self.assertEqual(filas[2][1], "'+52 55")
+        self.assertIn("'-2+3", filas[2])
+        # Los números negativos y el resto del texto no cambian
+        lineas = list(exportacion.filas_csv(['a', 'b', 'c'], [[Decimal('-3.50'), 'Ana = Ana', -1]]))
+        self.assertEqual(lineas[1], '-3.50,Ana = Ana,-1\r\n')
+
+    def test_comando_exportar(self):
+        salida = StringIO()
+        call_command('exportar', stdout=salida)
+        self.assertIn('pacientes: Pacientes', salida.getvalue())
+
+        salida = StringIO()
+        call_command('exportar', 'pacientes', stdout=salida)
+        filas = list(csv.reader(io.StringIO(salida.getvalue().lstrip('\ufeff'))))
+        self.assertEqual((filas[0][1], len(filas)), ('Nombres', 6))
+        with self.assertRaises(CommandError):
+            call_command('exportar', 'otro', stdout=StringIO())
+
+    def test_solo_staff_y_conjuntos_conocidos(self):
+        self.assertEqual(self.client.get(reverse('exportar', args=['otro'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('exportar', args=['pacientes']), {'formato': 'xml'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+        self.assertEqual(self.client.get(reverse('exportar', args=['pacientes'])).status_code, 302)
+
+
+class ContadoresTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pacientes = crear_pacientes(2)
+
+    def crear_tratamiento(self, paciente, activo=True):
+        historia = HistoriaClinica.objects.create(
+            paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+        )
+        return TratamientoEstetico.objects.create(
+            paciente=paciente, historia_clinica=historia, objetivo_principal='Reducir medidas', activo=activo
+        )
+
+    def test_altas_y_bajas_al_confirmar(self):
+        self.assertEqual(contadores.valor('pacientes'), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = crear_pacientes(1)[0]
+            # Sin confirmar todavía no cambia
+            self.assertEqual(contadores.valor('pacientes'), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.valor('pacientes'), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.valor('pacientes'), 2)
+
+    def test_editar_un_campo_del_filtro_invalida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tratamiento = self.crear_tratamiento(self.pacientes[0])
+        self.assertEqual(contadores.valor('tratamientos_activos'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_tratamiento(self.pacientes[1], activo=False)
+            tratamiento.objetivo_principal = 'Tonificar'
+            tratamiento.save(update_fields=['objetivo_principal'])
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.valor('tratamientos_activos'), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tratamiento.activo = False
+            tratamiento.save()
+        self.assertIsNone(cache.get('contadores:tratamientos_activos'))
+        self.assertEqual(contadores.valor('tratamientos_activos'), 0)
+
+    @override_settings(CONTADORES_INTERVALO_PROXIMAS=300)
+    def test_citas_proximas_por_intervalo_y_version(self):
+        terapeuta = crear_terapeuta()
+        ahora = hora(8)
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_cita(terapeuta, hora(10))
+        self.assertEqual(contadores.citas_proximas(ahora), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.citas_proximas(ahora + timedelta(seconds=299)), 1)
+
+        # Una cita nueva cambia la versión: el mismo intervalo se vuelve a contar
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_cita(terapeuta, hora(11))
+        self.assertEqual(contadores.citas_proximas(ahora), 2)
+
+        # Un update() no dispara señales: se nota hasta el siguiente intervalo
+        Cita.objects.update(estado='cancelada')
+        self.assertEqual(contadores.citas_proximas(ahora), 2)
+        self.assertEqual(contadores.citas_proximas(ahora + timedelta(seconds=300)), 0)
+
+    def test_reconciliar_contadores(self):
+        cache.set('contadores:pacientes', 99)
+        salida = StringIO()
+        call_command('reconciliar_contadores', 'pacientes', 'historias', stdout=salida)
+        self.assertIn('pacientes: 99 -> 2', salida.getvalue())
+        self.assertIn('historias: 0', salida.getvalue())
+        self.assertEqual(contadores.valor('pacientes'), 2)
@@ -19,7 +19,8 @@ from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from fisioterapia.views import dashboard_view
+from fisioterapia.views import dashboard_view, exportaciones_view, exportar_view
+from fisioterapia.instrumentacion import instrumentacion_view
 
 urlpatterns = [
     # Autenticación
@@ -37,6 +38,11 @@ urlpatterns = [
 
     # Admin
     path('admin/', admin.site.urls),
+    path('instrumentacion/', instrumentacion_view, name='instrumentacion'),
+
+    # Exportación de datos (solo staff)
+    path('exportar/', exportaciones_view, name='exportaciones'),
+    path('exportar/<slug:nombre>/', exportar_view, name='exportar'),
 ]
 
 # Media in development
@@ -1,18 +1,41 @@
 from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from pacientes.models import Paciente
-from citas.models import Cita, CitasProximas
-from historiaclinica.models import HistoriaClinica
-from tratamientos.models import TratamientoEstetico
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from fisioterapia import contadores, exportacion
 
 
 @login_required
 def dashboard_view(request):
     """Vista del dashboard con estadísticas."""
+    totales = contadores.obtener('pacientes', 'historias', 'tratamientos_activos')
     context = {
-        'total_pacientes': Paciente.objects.count(),
-        'total_citas': CitasProximas.objects.count(),
-        'total_historias': HistoriaClinica.objects.count(),
-        'total_tratamientos': TratamientoEstetico.objects.filter(activo=True).count(),
+        'total_pacientes': totales['pacientes'],
+        'total_citas': contadores.citas_proximas(),
+        'total_historias': totales['historias'],
+        'total_tratamientos': totales['tratamientos_activos'],
     }
     return render(request, 'dashboard.html', context)
+
+
+@staff_member_required
+def exportaciones_view(request):
+    """Lista de conjuntos de datos exportables."""
+    return render(request, 'exportaciones.html', {'conjuntos': exportacion.conjuntos()})
+
+
+@staff_member_required
+def exportar_view(request, nombre):
+    """Exporta un conjunto completo en streaming (``?formato=csv`` o ``jsonl``)."""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'jsonl'):
+        return JsonResponse({'error': 'Formato inválido (csv o jsonl).'}, status=400)
+    try:
+        encabezados, campos, filas = exportacion.conjunto(nombre)
+    except KeyError:
+        raise Http404('Conjunto de datos desconocido')
+    nombre_archivo = f'{nombre}_{timezone.localdate().strftime("%Y%m%d")}.{formato}'
+    if formato == 'jsonl':
+        return exportacion.respuesta_jsonl(nombre_archivo, campos, filas)
+    return exportacion.respuesta_csv(nombre_archivo, encabezados, filas)
@@ -0,0 +1,125 @@
+"""
+Perfil de servicio de gunicorn: ``gunicorn -c gunicorn.conf.py``.
+
+Dos perfiles, elegidos con ``GUNICORN_PERFIL``:
+
+* ``wsgi`` (por defecto): workers ``gthread``. Las vistas pasan casi todo el
+  tiempo esperando a la base de datos, así que cada proceso atiende varias
+  peticiones con hilos (``GUNICORN_THREADS``).
+* ``asgi``: ``fisioterapia.asgi`` con workers de uvicorn (paquete
+  ``uvicorn-worker``). Las descargas largas (exportaciones, ZIP y PDF en lote)
+  y el sondeo del PDF pendiente no ocupan un hilo de worker mientras el cliente
+  lee. Django ejecuta las vistas síncronas de un worker ASGI en un solo hilo,
+  por eso este perfil usa más procesos.
+
+Los workers se calculan con los CPU disponibles para el proceso (respeta los
+límites del contenedor) y se pueden fijar con ``GUNICORN_WORKERS``. La app se
+carga en el proceso maestro antes de crear los workers (``preload_app``):
+Django, las plantillas ya compiladas (``fisioterapia.plantillas``), ReportLab
+y sus fuentes quedan en memoria compartida copy-on-write.
+Cada worker se recicla tras ``GUNICORN_MAX_REQUESTS`` peticiones (con
+variación aleatoria para que no se reinicien todos a la vez), lo que acota el
+crecimiento de memoria de ReportLab al generar PDF.
+
+Con más de un worker la caché tiene que ser compartida: sin ``CACHE_BACKEND``
+se usa ``FileBasedCache`` en ``CACHE_LOCATION`` (``/var/tmp/fisio_cache`` por
+defecto) y con ``LocMemCache`` explícita el servidor no arranca.
+
+``python manage.py prueba_carga`` levanta cada perfil y compara sus latencias.
+"""
+import os
+
+# "config" es un ajuste de gunicorn: el nombre del módulo no puede ocuparlo
+from decouple import config as _config
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+perfil = _config('GUNICORN_PERFIL', default='wsgi')
+cpus = _cpus()
+
+bind = _config('GUNICORN_BIND', default='127.0.0.1:8000')
+backlog = _config('GUNICORN_BACKLOG', default=2048, cast=int)
+
+if perfil == 'asgi':
+    wsgi_app = 'fisioterapia.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    workers = _config('GUNICORN_WORKERS', default=cpus * 2 + 1, cast=int)
+    threads = 1
+else:
+    wsgi_app = 'fisioterapia.wsgi:application'
+    worker_class = 'gthread'
+    # Con hilos alcanzan menos procesos que la regla clásica 2 * CPU + 1
+    workers = _config('GUNICORN_WORKERS', default=cpus + 1, cast=int)
+    threads = _config('GUNICORN_THREADS', default=4, cast=int)
+
+# La caché en memoria local es de cada proceso: con varios workers los contadores,
+# las versiones de los fragmentos y los reportes cacheados se desfasan entre ellos.
+# Sin CACHE_BACKEND se usa la de archivos (settings lo lee del entorno); con
+# LocMemCache explícita y más de un worker no se arranca.
+_CACHE_LOCAL = 'django.core.cache.backends.locmem.LocMemCache'
+if workers > 1:
+    _cache = _config('CACHE_BACKEND', default='')
+    if not _cache:
+        os.environ['CACHE_BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+        os.environ['CACHE_LOCATION'] = _config('CACHE_LOCATION', default='/var/tmp/fisio_cache')
+    elif _cache == _CACHE_LOCAL:
+        raise RuntimeError(
+            f'CACHE_BACKEND={_CACHE_LOCAL} no se comparte entre los {workers} workers: '
+            'usa FileBasedCache o Redis, o GUNICORN_WORKERS=1.'
+        )
+
+# Detrás de nginx: las conexiones ociosas se cierran pronto
+keepalive = _config('GUNICORN_KEEPALIVE', default=5, cast=int)
+# Un PDF síncrono grande o una exportación lenta no debe matar al worker
+timeout = _config('GUNICORN_TIMEOUT', default=60, cast=int)
+graceful_timeout = _config('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+max_requests = _config('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = _config('GUNICORN_MAX_REQUESTS_JITTER', default=max_requests // 10, cast=int)
+
+preload_app = _config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+# Latido de los workers en memoria: evita bloqueos con /tmp en disco lento (Docker)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = _config('GUNICORN_ACCESSLOG', default='-') or None
+errorlog = '-'
+loglevel = _config('GUNICORN_LOGLEVEL', default='info')
+forwarded_allow_ips = _config('GUNICORN_FORWARDED_ALLOW_IPS', default='127.0.0.1')
+proc_name = 'fisioterapia'
+
+
+def when_ready(server):
+    """En el maestro, con la app ya cargada: deja construidos los recursos que comparten los workers."""
+    server.log.info('Perfil %s: %s workers %s x %s hilos', perfil, workers, worker_class, threads)
+    server.log.info('Caché: %s', os.environ.get('CACHE_BACKEND', _CACHE_LOCAL))
+    if preload_app:
+        from fisioterapia import plantillas
+        from historiaclinica import pdf
+
+        server.log.info('Plantillas precompiladas: %s', plantillas.precompilar()[0])
+        pdf._estilos()
+        pdf._logo()
+
+
+def post_worker_init(worker):
+    # Sin precarga cada worker carga la app por su cuenta: compila las plantillas antes de atender
+    if not preload_app:
+        from fisioterapia import plantillas
+
+        worker.log.info('Plantillas precompiladas: %s', plantillas.precompilar()[0])
+
+
+def pre_fork(server, worker):
+    # Una conexión abierta en el maestro no se puede compartir entre procesos
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
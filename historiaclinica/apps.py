@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class HistoriaclinicaConfig(AppConfig):
     name = 'historiaclinica'
+
+    def ready(self):
+        from historiaclinica import exportacion, indices, signals  # noqa: F401
@@ -0,0 +1,53 @@
+"""
+Carga del expediente clínico: una ``HistoriaClinica`` con su paciente y las
+colecciones hijas que necesite la vista, en un número fijo de consultas.
+
+La historia y el paciente salen en una consulta (``select_related``) y cada
+colección pedida en una más (``prefetch_related``), sin importar cuántas filas
+tenga. La usan el detalle, la exportación PDF de ejercicios y las vistas que
+cuelgan de ``historia_pk`` (listas y altas de ejercicios, evoluciones,
+estudios y escala de Daniels), que antes consultaban la historia dos veces.
+"""
+from django.shortcuts import get_object_or_404
+
+from historiaclinica.models import HistoriaClinica
+
+# Nombre de la colección -> related_name en HistoriaClinica
+COLECCIONES = {
+    'ejercicios': 'ejercicios_terapeuticos',
+    'evoluciones': 'evoluciones',
+    'estudios': 'estudios_clinicos',
+    'daniels': 'escala_daniels',
+}
+
+
+def cargar_historia(pk, colecciones=tuple(COLECCIONES)):
+    """Historia ``pk`` con paciente y las ``colecciones`` indicadas (por defecto todas); 404 si no existe."""
+    relaciones = [COLECCIONES[nombre] for nombre in colecciones]
+    return get_object_or_404(
+        HistoriaClinica.objects.select_related('paciente').prefetch_related(*relaciones),
+        pk=pk,
+    )
+
+
+class HistoriaClinicaMixin:
+    """Para vistas con ``historia_pk`` en la URL: carga la historia una sola vez por petición.
+
+    ``coleccion`` (una clave de ``COLECCIONES``) se prefetchea junto con la
+    historia y es el queryset de las vistas de lista.
+    """
+    coleccion = None
+
+    def get_historia(self):
+        if not hasattr(self, '_historia'):
+            colecciones = (self.coleccion,) if self.coleccion else ()
+            self._historia = cargar_historia(self.kwargs['historia_pk'], colecciones)
+        return self._historia
+
+    def get_queryset(self):
+        return getattr(self.get_historia(), COLECCIONES[self.coleccion]).all()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['historia'] = self.get_historia()
+        return context
@@ -0,0 +1,72 @@
+"""Conjuntos exportables del expediente clínico (ver ``fisioterapia.exportacion``)."""
+from fisioterapia import exportacion
+from historiaclinica.models import (
+    EjercioTerapeutico, EscalaDaniels, EstudioClinico, EvolucionTratamiento, HistoriaClinica,
+)
+
+HISTORIA = (
+    ('Historia ID', 'historia_id'),
+    ('Paciente ID', 'historia__paciente_id'),
+    ('Paciente', 'historia__paciente__apellidos'),
+    ('Nombres', 'historia__paciente__nombres'),
+)
+
+exportacion.registrar('historias', 'Historias clínicas', lambda: HistoriaClinica.objects.order_by('pk'), (
+    ('ID', 'id'),
+    ('Paciente ID', 'paciente_id'),
+    ('Paciente', 'paciente__apellidos'),
+    ('Nombres', 'paciente__nombres'),
+    ('Fecha de evaluación', 'fecha_evaluacion'),
+    ('Diagnóstico', 'diagnostico'),
+    ('Pronóstico', 'pronostico'),
+    ('Tratamiento planificado', 'tratamiento_planificado'),
+    ('Arcos de movimiento', 'notas_arcos_movimiento'),
+    ('Escala EVA', 'escala_eva'),
+    ('Activa', 'activo'),
+    ('Fecha de actualización', 'fecha_actualizacion'),
+))
+
+exportacion.registrar('ejercicios', 'Ejercicios terapéuticos', lambda: EjercioTerapeutico.objects.order_by('pk'), (
+    ('ID', 'id'),
+    *HISTORIA,
+    ('Ejercicio', 'nombre_ejercicio'),
+    ('Descripción', 'descripcion'),
+    ('Series', 'series'),
+    ('Repeticiones', 'repeticiones'),
+    ('Duración (s)', 'duracion_segundos'),
+    ('Frecuencia', 'frecuencia'),
+    ('En casa', 'es_ejercicio_casa'),
+    ('Días', 'dias_semana'),
+    ('Notas', 'notas'),
+    ('Fecha de prescripción', 'fecha_prescripcion'),
+))
+
+exportacion.registrar('evoluciones', 'Evoluciones', lambda: EvolucionTratamiento.objects.order_by('pk'), (
+    ('ID', 'id'),
+    *HISTORIA,
+    ('Fecha de sesión', 'fecha_sesion'),
+    ('Sesión', 'numero_sesion'),
+    ('Escala EVA', 'escala_eva_sesion'),
+    ('Notas', 'notas_sesion'),
+    ('Progreso', 'progreso'),
+    ('Cambios detectados', 'cambios_detectados'),
+    ('Arcos de movimiento', 'notas_arcos_actual'),
+    ('Recomendaciones', 'recomendaciones'),
+))
+
+exportacion.registrar('estudios', 'Estudios clínicos', lambda: EstudioClinico.objects.order_by('pk'), (
+    ('ID', 'id'),
+    *HISTORIA,
+    ('Tipo', 'tipo'),
+    ('Fecha del estudio', 'fecha_estudio'),
+    ('Descripción', 'descripcion'),
+    ('Resultado', 'resultado'),
+))
+
+exportacion.registrar('daniels', 'Escala de Daniels', lambda: EscalaDaniels.objects.order_by('pk'), (
+    ('ID', 'id'),
+    *HISTORIA,
+    ('Músculo', 'musculo'),
+    ('Grado', 'grado'),
+    ('Notas', 'notas'),
+))
@@ -1,5 +1,6 @@
 from django import forms
 from historiaclinica.models import HistoriaClinica, EjercioTerapeutico, EvolucionTratamiento, EstudioClinico, EscalaDaniels
+from pacientes.widgets import PacienteAutocompleteWidget
 
 
 class HistoriaClinicaForm(forms.ModelForm):
@@ -8,8 +9,8 @@ class HistoriaClinicaForm(forms.ModelForm):
         fields = ['paciente', 'diagnostico', 'pronostico', 'tratamiento_planificado',
                   'notas_arcos_movimiento', 'escala_eva', 'activo']
         widgets = {
-            'paciente': forms.Select(attrs={
-                'class': 'form-select',
+            'paciente': PacienteAutocompleteWidget(attrs={
+                'class': 'form-control',
                 'required': True
             }),
             'diagnostico': forms.Textarea(attrs={
@@ -0,0 +1,13 @@
+from fisioterapia import indices
+from historiaclinica.models import EstudioClinico, HistoriaClinica
+
+# Primera página de los listados por cursor: orden descendente + pk
+PAGINA = 21
+
+indices.registrar('historia_paciente_fecha_idx', lambda: HistoriaClinica.objects.filter(paciente_id=1))
+indices.registrar('historia_fecha_idx', lambda: HistoriaClinica.objects.order_by('-fecha_evaluacion', '-pk')[:PAGINA])
+indices.registrar('estudio_fecha_idx', lambda: EstudioClinico.objects.order_by('-fecha_estudio', '-pk')[:PAGINA])
+indices.registrar(
+    'estudio_tipo_fecha_idx',
+    lambda: EstudioClinico.objects.filter(tipo='radiografia').order_by('-fecha_estudio', '-pk')[:PAGINA],
+)
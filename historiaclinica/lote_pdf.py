@@ -0,0 +1,137 @@
+"""
+Exportación en lote de las hojas de ejercicios (varias historias a la vez).
+
+Las hojas usan el mismo diseño que ``historiaclinica.pdf`` y se generan en
+paralelo en un ``ProcessPoolExecutor``: ReportLab ocupa el GIL, así que con
+hilos no se reparten entre núcleos. El pool es uno por proceso, se crea en el
+primer uso y sus procesos salen de ``forkserver`` (o ``spawn``), no de un
+``fork`` del worker: un fork de un worker con hilos puede heredar candados
+tomados (logging, caché, índices) y bloquearse. Los procesos del pool solo
+renderizan y escriben en la ruta que se les pasa; no leen ajustes ni la base. Cada proceso escribe su PDF en la caché de
+disco del exportador individual y el ZIP se arma leyendo esos archivos por
+bloques a medida que terminan, de modo que la memoria no crece con el número
+de pacientes; las hojas que ya estaban en caché no se vuelven a generar.
+
+El PDF combinado es un solo documento (cada hoja empieza en página nueva)
+que un proceso del pool escribe en un archivo temporal; se envía por bloques
+y se borra al terminar.
+"""
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time, timedelta
+
+import django
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.text import slugify
+
+from citas.models import Cita
+from fisioterapia.exportacion import BYTES_POR_BLOQUE
+from historiaclinica import pdf
+from historiaclinica.models import HistoriaClinica
+
+
+def historias_con_cita(dia):
+    """Historias activas de los pacientes con una cita (no cancelada) en ``dia``."""
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    citas = Cita.objects.filter(
+        paciente=OuterRef('paciente'),
+        fecha_hora__gte=inicio,
+        fecha_hora__lt=inicio + timedelta(days=1),
+    ).exclude(estado='cancelada')
+    return HistoriaClinica.objects.filter(Exists(citas), activo=True)
+
+
+def documentos(historias):
+    """``(historia_pk, nombre del archivo, datos, huella)`` por historia, en dos consultas."""
+    historias = (
+        historias.select_related('paciente')
+        .prefetch_related('ejercicios_terapeuticos')
+        .order_by('paciente__apellidos', 'paciente__nombres', 'pk')
+    )
+    resultado = []
+    for historia in historias:
+        datos = pdf.datos_documento(historia)
+        nombre = f'ejercicios_{slugify(historia.paciente.nombre_completo)}_{historia.pk}.pdf'
+        resultado.append((historia.pk, nombre, datos, pdf.huella(datos)))
+    return resultado
+
+
+_candado = threading.Lock()
+_ejecutor = None
+
+
+def _pool():
+    global _ejecutor
+    with _candado:
+        if _ejecutor is None:
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _ejecutor = ProcessPoolExecutor(
+                max_workers=settings.PDF_PROCESOS,
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=django.setup,
+            )
+        return _ejecutor
+
+
+def _cerrar():
+    global _ejecutor
+    with _candado:
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor is not None:
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_cerrar)
+
+
+def _enviar(funcion, *args):
+    """Envía la tarea al pool; si un proceso murió (pool roto) se crea uno nuevo y se reintenta."""
+    try:
+        return _pool().submit(funcion, *args)
+    except BrokenProcessPool:
+        _cerrar()
+        return _pool().submit(funcion, *args)
+
+
+def archivos(documentos):
+    """``(nombre, ruta)`` de cada hoja: primero las que ya estaban en caché y luego según terminan."""
+    faltantes = []
+    for historia_pk, nombre, datos, huella in documentos:
+        destino = pdf.ruta(historia_pk, huella)
+        if destino.exists():
+            yield nombre, destino
+        else:
+            faltantes.append((historia_pk, nombre, datos, huella))
+    if not faltantes:
+        return
+
+    futuros = {
+        _enviar(pdf.generar_en, pdf.ruta(historia_pk, huella), datos): nombre
+        for historia_pk, nombre, datos, huella in faltantes
+    }
+    try:
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
+    finally:
+        # Si el cliente corta la descarga no se generan las hojas pendientes (el pool sigue vivo)
+        for futuro in futuros:
+            futuro.cancel()
+
+
+def combinado(documentos):
+    """Bytes (por bloques) de un solo PDF con la hoja de cada documento."""
+    descriptor, ruta = tempfile.mkstemp(suffix='.pdf')
+    os.close(descriptor)
+    try:
+        _enviar(pdf.renderizar, [datos for _, _, datos, _ in documentos], ruta).result()
+        with open(ruta, 'rb') as archivo:
+            yield from iter(lambda: archivo.read(BYTES_POR_BLOQUE), b'')
+    finally:
+        os.unlink(ruta)
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiaclinica', '0002_estudioclinico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historiaclinica',
+            index=models.Index(fields=['paciente', 'fecha_evaluacion'], name='historia_paciente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historiaclinica',
+            index=models.Index(fields=['fecha_evaluacion', 'id'], name='historia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estudioclinico',
+            index=models.Index(fields=['fecha_estudio', 'id'], name='estudio_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estudioclinico',
+            index=models.Index(fields=['tipo', 'fecha_estudio', 'id'], name='estudio_tipo_fecha_idx'),
+        ),
+    ]
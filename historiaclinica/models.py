@@ -35,6 +35,11 @@ class HistoriaClinica(models.Model):
         ordering = ['-fecha_evaluacion']
         verbose_name = 'Historia Clínica'
         verbose_name_plural = 'Historias Clínicas'
+        indexes = [
+            # Historias de un paciente en su orden por defecto y listado por cursor
+            models.Index(fields=['paciente', 'fecha_evaluacion'], name='historia_paciente_fecha_idx'),
+            models.Index(fields=['fecha_evaluacion', 'id'], name='historia_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Historia - {self.paciente} ({self.fecha_evaluacion.date()})"
@@ -213,6 +218,11 @@ class EstudioClinico(models.Model):
         ordering = ['-fecha_estudio']
         verbose_name = 'Estudio clínico'
         verbose_name_plural = 'Estudios clínicos'
+        indexes = [
+            # Exploración global de estudios (cursor: fecha_estudio + pk), con y sin filtro de tipo
+            models.Index(fields=['fecha_estudio', 'id'], name='estudio_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha_estudio', 'id'], name='estudio_tipo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.historia.paciente} - {self.get_tipo_display()} ({self.fecha_estudio})"
@@ -0,0 +1,267 @@
+"""
+PDF de ejercicios terapéuticos de una historia clínica.
+
+Los estilos y el logo se construyen una vez por proceso. Cada documento se
+guarda en ``PDF_CACHE_DIR`` con la huella (SHA-256) de su contenido en el
+nombre: si los ejercicios, el paciente o la fecha no cambiaron, la exportación
+es un envío de archivo; cualquier cambio produce otra huella y el archivo
+anterior se borra al escribir el nuevo (y con las señales de ``EjercioTerapeutico``).
+
+Los documentos con más de ``PDF_EJERCICIOS_ASINCRONO`` ejercicios se generan en
+un pool de hilos fuera de la petición. Al pool solo se pasan datos simples
+(``datos_documento``), nunca instancias de modelos ni conexiones.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+# Subir al cambiar el diseño del documento: invalida todos los PDF guardados
+VERSION = 1
+
+CAMPOS = (
+    'nombre_ejercicio', 'descripcion', 'series', 'repeticiones', 'frecuencia',
+    'duracion_segundos', 'es_ejercicio_casa', 'dias_semana', 'notas',
+)
+
+_pool = None
+_pendientes = {}  # ruta del PDF -> Future de su generación
+_errores = {}  # ruta del PDF -> excepción de su última generación fallida
+_candado = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    styles = getSampleStyleSheet()
+    return {
+        'titulo': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#1a73e8'),
+            spaceAfter=12,
+            alignment=TA_CENTER
+        ),
+        'subtitulo': ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.grey,
+            spaceAfter=20,
+            alignment=TA_CENTER
+        ),
+        'encabezado': styles['Heading2'],
+        'normal': styles['Normal'],
+        'tabla': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f0fe')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1a73e8')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#1a73e8')),
+        ]),
+    }
+
+
+@lru_cache(maxsize=None)
+def _logo():
+    """Bytes del logo (None si no existe); el ``Image`` se arma por documento."""
+    ruta = Path(settings.BASE_DIR) / 'static' / 'img' / 'fisio.png'
+    return ruta.read_bytes() if ruta.exists() else None
+
+
+def datos_documento(historia):
+    """Contenido del PDF como datos simples; ``historia`` debe traer los ejercicios prefetcheados."""
+    return {
+        'paciente': historia.paciente.nombre_completo,
+        'fecha': datetime.date.today().strftime('%d/%m/%Y'),
+        'ejercicios': [
+            {campo: getattr(ejercicio, campo) for campo in CAMPOS}
+            for ejercicio in historia.ejercicios_terapeuticos.all()
+        ],
+    }
+
+
+def huella(datos):
+    contenido = json.dumps([VERSION, datos], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _directorio(historia_pk):
+    return Path(settings.PDF_CACHE_DIR) / 'ejercicios' / str(historia_pk)
+
+
+def ruta(historia_pk, huella):
+    return _directorio(historia_pk) / f'{huella}.pdf'
+
+
+def _elementos(datos):
+    """Flowables de la hoja de ejercicios de un paciente."""
+    estilos = _estilos()
+    normal = estilos['normal']
+    elements = []
+    logo = _logo()
+    if logo:
+        elements.append(Image(BytesIO(logo), width=1*inch, height=1*inch))
+        elements.append(Spacer(1, 0.1*inch))
+
+    elements.append(Paragraph('Ejercicios Terapéuticos', estilos['titulo']))
+    elements.append(Paragraph(f'Paciente: {datos["paciente"]}', estilos['subtitulo']))
+    elements.append(Paragraph(f'Fecha: {datos["fecha"]}', estilos['subtitulo']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    for idx, ejercicio in enumerate(datos['ejercicios'], 1):
+        data = [
+            [Paragraph(f'<b>Ejercicio {idx}: {ejercicio["nombre_ejercicio"]}</b>', estilos['encabezado'])],
+            [Paragraph(f'<b>Descripción:</b> {ejercicio["descripcion"]}', normal)],
+            [Paragraph(f'<b>Series:</b> {ejercicio["series"]} | <b>Repeticiones:</b> {ejercicio["repeticiones"]}', normal)],
+            [Paragraph(f'<b>Frecuencia:</b> {ejercicio["frecuencia"]}', normal)],
+        ]
+        if ejercicio['duracion_segundos']:
+            data.append([Paragraph(f'<b>Duración:</b> {ejercicio["duracion_segundos"]} segundos', normal)])
+        data.append([Paragraph(f'<b>Lugar:</b> {"En casa" if ejercicio["es_ejercicio_casa"] else "En clínica"}', normal)])
+        if ejercicio['dias_semana']:
+            data.append([Paragraph(f'<b>Días:</b> {ejercicio["dias_semana"]}', normal)])
+        if ejercicio['notas']:
+            data.append([Paragraph(f'<b>Notas:</b> {ejercicio["notas"]}', normal)])
+
+        table = Table(data, colWidths=[6.5*inch])
+        table.setStyle(estilos['tabla'])
+        elements.append(table)
+        elements.append(Spacer(1, 0.15*inch))
+
+    if not datos['ejercicios']:
+        elements.append(Paragraph('No hay ejercicios terapéuticos registrados.', normal))
+    return elements
+
+
+def renderizar(datos, destino=None):
+    """Bytes del PDF; con ``destino`` (archivo) se escribe ahí y devuelve None.
+
+    ``datos`` puede ser una lista de documentos: se genera un solo PDF con una
+    hoja (que empieza en página nueva) por documento.
+    """
+    documentos = datos if isinstance(datos, list) else [datos]
+    buffer = destino or BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+    for documento in documentos:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(_elementos(documento))
+    doc.build(elements)
+    return None if destino else buffer.getvalue()
+
+
+def escribir(historia_pk, huella, contenido):
+    """Guarda el PDF (escritura atómica) y borra las versiones anteriores de la historia."""
+    return escribir_en(ruta(historia_pk, huella), contenido)
+
+
+def escribir_en(destino, contenido):
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=destino.parent, suffix='.tmp', delete=False) as temporal:
+        temporal.write(contenido)
+    os.replace(temporal.name, destino)
+    for anterior in destino.parent.glob('*.pdf'):
+        if anterior != destino:
+            anterior.unlink(missing_ok=True)
+    return destino
+
+
+def generar(historia_pk, huella, datos):
+    return escribir(historia_pk, huella, renderizar(datos))
+
+
+def generar_en(destino, datos):
+    """Como ``generar`` pero con la ruta ya resuelta: para procesos que no comparten los ajustes del padre."""
+    return escribir_en(destino, renderizar(datos))
+
+
+def abrir(historia_pk, huella):
+    """Archivo del PDF ya generado, o None."""
+    try:
+        return ruta(historia_pk, huella).open('rb')
+    except FileNotFoundError:
+        return None
+
+
+def invalidar(historia_pk):
+    for archivo in _directorio(historia_pk).glob('*.pdf'):
+        archivo.unlink(missing_ok=True)
+
+
+def _executor():
+    global _pool
+    with _candado:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.PDF_WORKERS, thread_name_prefix='pdf')
+        return _pool
+
+
+def _terminado(destino, futuro):
+    error = None if futuro.cancelled() else futuro.exception()
+    if error is not None:
+        logger.error('Error al generar %s', destino, exc_info=error)
+    with _candado:
+        if _pendientes.get(destino) is futuro:
+            del _pendientes[destino]
+        if error is not None:
+            _errores[destino] = error
+
+
+def encolar(historia_pk, huella, datos):
+    """Programa la generación en el pool, una sola vez por documento, y devuelve el ``Future``."""
+    destino = ruta(historia_pk, huella)
+    executor = _executor()
+    with _candado:
+        futuro = _pendientes.get(destino)
+        nuevo = futuro is None
+        if nuevo:
+            _errores.pop(destino, None)
+            futuro = executor.submit(generar, historia_pk, huella, datos)
+            _pendientes[destino] = futuro
+    if nuevo:
+        # Fuera del candado: si el Future ya terminó, el callback corre aquí mismo
+        futuro.add_done_callback(lambda f: _terminado(destino, f))
+    return futuro
+
+
+def estado(historia_pk, huella, datos):
+    """True si el PDF ya está en disco; si no, se asegura de que se esté generando.
+
+    Un error de la generación se relanza una vez y la siguiente consulta la
+    reintenta. Cada proceso tiene su propio pool: si la consulta llega a otro
+    worker, este encola el documento (o lo encuentra ya escrito en disco).
+    """
+    destino = ruta(historia_pk, huella)
+    if destino.exists():
+        return True
+    with _candado:
+        error = _errores.pop(destino, None)
+    if error is not None:
+        raise error
+    encolar(historia_pk, huella, datos)
+    return False
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fisioterapia import contadores
+from historiaclinica import pdf
+from historiaclinica.models import EjercioTerapeutico, HistoriaClinica
+
+contadores.registrar('historias', HistoriaClinica)
+
+
+@receiver([post_save, post_delete], sender=EjercioTerapeutico)
+def invalidar_pdf_ejercicios(sender, instance, **kwargs):
+    """Borra los PDF guardados de la historia; el siguiente se genera con otra huella."""
+    pdf.invalidar(instance.historia_id)
+
+
+@receiver(post_delete, sender=HistoriaClinica)
+def borrar_pdf_ejercicios(sender, instance, **kwargs):
+    pdf.invalidar(instance.pk)
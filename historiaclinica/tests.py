@@ -1,3 +1,202 @@
-from django.test import TestCase
+import io
+import re
+import tempfile
+import time
+import zipfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.models import Cita
+from historiaclinica import pdf
+from historiaclinica.models import EjercioTerapeutico, EscalaDaniels, EvolucionTratamiento, HistoriaClinica
+from pacientes.tests import crear_pacientes
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class PresupuestoConsultasTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        for paciente in crear_pacientes(25):
+            HistoriaClinica.objects.create(paciente=paciente, diagnostico='Lumbalgia', tratamiento_planificado='Terapia')
+
+    def test_lista_no_crece_con_las_filas(self):
+        respuesta = self.client.get(reverse('historiaclinica:lista'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_detalle_y_colecciones_no_crecen_con_las_filas(self):
+        historia = HistoriaClinica.objects.first()
+        for n in range(1, 16):
+            EjercioTerapeutico.objects.create(
+                historia=historia, nombre_ejercicio=f'Ejercicio {n}', descripcion='-', repeticiones='10', frecuencia='Diario')
+            EvolucionTratamiento.objects.create(
+                historia=historia, fecha_sesion=date(2024, 1, n), numero_sesion=n, notas_sesion='-')
+            EscalaDaniels.objects.create(historia=historia, musculo=f'Músculo {n}', grado='4')
+        respuesta = self.client.get(reverse('historiaclinica:detalle', args=[historia.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        for ruta in ('historiaclinica:ejercios', 'historiaclinica:evoluciones', 'historiaclinica:daniels-lista'):
+            with self.assertNumQueries(4):
+                respuesta = self.client.get(reverse(ruta, args=[historia.pk]))
+            self.assertEqual(respuesta.status_code, 200)
+
+
+class HistoriaClinicaOpcionesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        self.pacientes = crear_pacientes(3)
+        self.pacientes[1].apellidos = 'Muñoz'
+        self.pacientes[1].save()
+        for numero in range(22):
+            HistoriaClinica.objects.create(
+                paciente=self.pacientes[0], diagnostico=f'Lumbalgia {numero}', tratamiento_planificado='Terapia manual'
+            )
+        self.historia = HistoriaClinica.objects.create(
+            paciente=self.pacientes[1], diagnostico='Cervicalgia', tratamiento_planificado='Terapia manual'
+        )
+
+    def pedir(self, **parametros):
+        respuesta = self.client.get(reverse('historiaclinica:opciones'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_paginas(self):
+        primera, segunda = self.pedir(), self.pedir(pagina=2)
+        self.assertEqual((len(primera['resultados']), primera['hay_mas']), (20, True))
+        self.assertEqual((len(segunda['resultados']), segunda['hay_mas']), (3, False))
+        self.assertFalse({r['id'] for r in primera['resultados']} & {r['id'] for r in segunda['resultados']})
+
+    def test_busqueda_por_paciente_sin_acentos_y_por_diagnostico(self):
+        self.assertEqual([r['id'] for r in self.pedir(q='munoz')['resultados']], [self.historia.pk])
+        self.assertEqual([r['id'] for r in self.pedir(q='nombre1 cervical')['resultados']], [self.historia.pk])
+        lumbalgias = self.pedir(q='lumbalgia')
+        self.assertEqual((len(lumbalgias['resultados']), lumbalgias['hay_mas']), (20, True))
+        self.assertEqual(self.pedir(q='nombre2')['resultados'], [])
+
+    def test_filtro_por_paciente(self):
+        resultados = self.pedir(paciente=self.pacientes[1].pk)['resultados']
+        self.assertEqual(resultados, [{'id': self.historia.pk, 'texto': str(self.historia)}])
+        self.assertEqual(self.pedir(paciente=self.pacientes[2].pk)['resultados'], [])
+        # Un valor no numérico se ignora
+        self.assertTrue(self.pedir(paciente='abc')['hay_mas'])
+
+
+class PDFEjerciciosTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(PDF_CACHE_DIR=carpeta.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        paciente = crear_pacientes(1)[0]
+        self.historia = HistoriaClinica.objects.create(paciente=paciente, diagnostico='Lumbalgia', tratamiento_planificado='Terapia')
+        self.agregar_ejercicio('Puente de glúteo')
+        self.url = reverse('historiaclinica:ejercicios-pdf', args=[self.historia.pk])
+
+    def agregar_ejercicio(self, nombre):
+        EjercioTerapeutico.objects.create(
+            historia=self.historia, nombre_ejercicio=nombre, descripcion='-', repeticiones='10', frecuencia='Diario')
+
+    def descargar(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = respuesta.getvalue() if not respuesta.streaming else b''.join(respuesta.streaming_content)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        return contenido
+
+    def test_repetir_la_exportacion_envia_el_archivo_guardado(self):
+        with mock.patch('historiaclinica.pdf.renderizar', wraps=pdf.renderizar) as renderizar:
+            primero = self.descargar()
+            self.assertEqual(self.descargar(), primero)
+            self.assertEqual(renderizar.call_count, 1)
+
+            self.agregar_ejercicio('Plancha')
+            self.descargar()
+            self.assertEqual(renderizar.call_count, 2)
+        self.assertEqual(len(list(pdf._directorio(self.historia.pk).glob('*.pdf'))), 1)
+
+    @override_settings(PDF_EJERCICIOS_ASINCRONO=0)
+    def test_documento_grande_se_genera_en_segundo_plano(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertContains(respuesta, 'Generando el PDF', status_code=202)
+        for futuro in list(pdf._pendientes.values()):
+            futuro.result(timeout=30)
+
+        estado = self.client.get(reverse('historiaclinica:ejercicios-pdf-estado', args=[self.historia.pk])).json()
+        self.assertEqual(estado, {'listo': True, 'url': self.url})
+        self.descargar()
+
+
+    @override_settings(PDF_EJERCICIOS_ASINCRONO=0)
+    def test_error_en_segundo_plano_se_informa_una_vez_y_se_reintenta(self):
+        url_estado = reverse('historiaclinica:ejercicios-pdf-estado', args=[self.historia.pk])
+        with mock.patch('historiaclinica.pdf.renderizar', side_effect=RuntimeError('sin memoria')), \
+                self.assertLogs('historiaclinica.pdf', 'ERROR'):
+            self.assertEqual(self.client.get(self.url).status_code, 202)
+            futuros = list(pdf._pendientes.values())
+            for futuro in futuros:
+                with self.assertRaises(RuntimeError):
+                    futuro.result(timeout=30)
+        # El Future fallido no se queda en _pendientes bloqueando los reintentos
+        # (_terminado corre en el hilo del pool justo después de fijar el resultado)
+        for _ in range(300):
+            if not any(futuro in pdf._pendientes.values() for futuro in futuros):
+                break
+            time.sleep(0.01)
+        else:
+            self.fail('El Future fallido sigue en _pendientes')
+        self.assertEqual(self.client.get(url_estado).status_code, 500)
+
+        respuesta = self.client.get(url_estado)
+        self.assertEqual(respuesta.json()['listo'], False)
+        for futuro in list(pdf._pendientes.values()):
+            futuro.result(timeout=30)
+        self.assertEqual(self.client.get(url_estado).json()['listo'], True)
+
+
+class ExportacionLoteTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(PDF_CACHE_DIR=carpeta.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        self.historias = []
+        for n, paciente in enumerate(crear_pacientes(3)):
+            historia = HistoriaClinica.objects.create(paciente=paciente, diagnostico='Lumbalgia', tratamiento_planificado='Terapia')
+            EjercioTerapeutico.objects.create(
+                historia=historia, nombre_ejercicio=f'Ejercicio {n}', descripcion='-', repeticiones='10', frecuencia='Diario')
+            self.historias.append(historia)
+        self.url = reverse('historiaclinica:ejercicios-pdf-lote')
+
+    def test_zip_con_una_hoja_por_historia_seleccionada(self):
+        elegidas = self.historias[:2]
+        respuesta = self.client.get(self.url, {'historia': [h.pk for h in elegidas]})
+        self.assertEqual(respuesta.status_code, 200)
+        paquete = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(len(paquete.namelist()), 2)
+        for nombre in paquete.namelist():
+            self.assertTrue(paquete.read(nombre).startswith(b'%PDF'))
+        # Las hojas quedan en la caché del exportador individual
+        for historia in elegidas:
+            self.assertEqual(len(list(pdf._directorio(historia.pk).glob('*.pdf'))), 1)
+
+    def test_pdf_combinado_de_los_pacientes_con_cita_hoy(self):
+        ahora = timezone.now()
+        for historia, estado in zip(self.historias, ('ocupada', 'completada', 'cancelada')):
+            Cita.objects.create(paciente=historia.paciente, fecha_hora=ahora, estado=estado, tipo_sesion='sesion_regular')
+        respuesta = self.client.get(self.url, {'citas': 'hoy', 'formato': 'pdf'})
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = b''.join(respuesta.streaming_content)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page(?!s)', contenido)), 2)
+
+    def test_sin_historias_regresa_a_la_lista(self):
+        respuesta = self.client.get(self.url, {'citas': 'hoy'})
+        self.assertRedirects(respuesta, reverse('historiaclinica:lista'))
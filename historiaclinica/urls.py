@@ -6,6 +6,7 @@ app_name = 'historiaclinica'
 urlpatterns = [
     # Historias clínicas
     path('', views.HistoriaClinicaListView.as_view(), name='lista'),
+    path('opciones/', views.HistoriaClinicaOpcionesView.as_view(), name='opciones'),
     path('crear/', views.HistoriaClinicaCreateGlobalView.as_view(), name='crear-global'),
     path('crear/<int:paciente_pk>/', views.HistoriaClinicaCreateView.as_view(), name='crear'),
     path('<int:pk>/', views.HistoriaClinicaDetailView.as_view(), name='detalle'),
@@ -39,4 +40,6 @@ urlpatterns = [
     
     # Exportar PDF
     path('<int:historia_pk>/ejercicios/pdf/', views.ExportarEjerciciosPDFView.as_view(), name='ejercicios-pdf'),
+    path('<int:historia_pk>/ejercicios/pdf/estado/', views.EstadoEjerciciosPDFView.as_view(), name='ejercicios-pdf-estado'),
+    path('ejercicios/pdf/lote/', views.ExportarEjerciciosLoteView.as_view(), name='ejercicios-pdf-lote'),
 ]
@@ -1,36 +1,40 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from fisioterapia.paginacion import CursorPaginationMixin
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.forms import inlineformset_factory
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views import View
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from io import BytesIO
 import datetime
-import os
 from django.conf import settings
+from django.utils import timezone
+from fisioterapia.exportacion import respuesta_zip
+from historiaclinica import lote_pdf, pdf
 from historiaclinica.models import HistoriaClinica, EjercioTerapeutico, EvolucionTratamiento, EstudioClinico, EscalaDaniels
 from historiaclinica.forms import HistoriaClinicaForm, EjercioTerapeuticoForm, EvolucionTratamientoForm, EstudioClinicoForm, EscalaDanielsForm
 from pacientes.models import Paciente
-from django.db.models import Q
+from pacientes.busqueda import normalizar
+from fisioterapia.seleccion_remota import OpcionesRemotasView
+from historiaclinica.expediente import HistoriaClinicaMixin, cargar_historia
+from django.db.models import Count, Q
 
 
-class HistoriaClinicaListView(LoginRequiredMixin, ListView):
+class HistoriaClinicaListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """Lista historias clínicas."""
     model = HistoriaClinica
     template_name = 'historiaclinica/historiaclinica_list.html'
     context_object_name = 'historias'
     paginate_by = 20
+    cursor_campo = 'fecha_evaluacion'
 
     def get_queryset(self):
-        return HistoriaClinica.objects.all().order_by('-fecha_evaluacion')
+        return (
+            HistoriaClinica.objects.select_related('paciente')
+            .annotate(num_evoluciones=Count('evoluciones'))
+            .order_by('-fecha_evaluacion')
+        )
 
 
 class HistoriaClinicaDetailView(LoginRequiredMixin, DetailView):
@@ -39,9 +43,12 @@ class HistoriaClinicaDetailView(LoginRequiredMixin, DetailView):
     template_name = 'historiaclinica/historiaclinica_detail.html'
     context_object_name = 'historia'
 
+    def get_object(self, queryset=None):
+        return cargar_historia(self.kwargs['pk'])
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        historia = self.get_object()
+        historia = self.object
         context['ejercicios'] = historia.ejercicios_terapeuticos.all()
         context['evoluciones'] = historia.evoluciones.all()
         context['estudios'] = historia.estudios_clinicos.all()
@@ -165,30 +172,41 @@ class HistoriaClinicaCreateGlobalView(LoginRequiredMixin, CreateView):
         return redirect('historiaclinica:detalle', pk=historia.pk)
 
 
-class EjercioListView(LoginRequiredMixin, ListView):
+class HistoriaClinicaOpcionesView(OpcionesRemotasView):
+    """Opciones paginadas de historias clínicas, opcionalmente de un solo paciente."""
+
+    def get_queryset(self):
+        queryset = HistoriaClinica.objects.select_related('paciente').order_by('-fecha_evaluacion')
+        paciente = self.request.GET.get('paciente')
+        if paciente and paciente.isdigit():
+            queryset = queryset.filter(paciente_id=paciente)
+        return queryset
+
+    def filtrar(self, queryset, termino):
+        for palabra in termino.split():
+            queryset = queryset.filter(
+                Q(paciente__texto_busqueda__contains=normalizar(palabra))
+                | Q(diagnostico__icontains=palabra)
+            )
+        return queryset
+
+
+class EjercioListView(LoginRequiredMixin, HistoriaClinicaMixin, ListView):
     """Lista ejercicios de una historia clínica."""
     model = EjercioTerapeutico
     template_name = 'historiaclinica/ejercio_list.html'
     context_object_name = 'ejercicios'
-
-    def get_queryset(self):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return historia.ejercicios_terapeuticos.all()
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return context
+    coleccion = 'ejercicios'
 
 
-class EjercioCreateView(LoginRequiredMixin, CreateView):
+class EjercioCreateView(LoginRequiredMixin, HistoriaClinicaMixin, CreateView):
     """Agregar ejercicio terapéutico."""
     model = EjercioTerapeutico
     form_class = EjercioTerapeuticoForm
     template_name = 'historiaclinica/ejercio_form.html'
 
     def form_valid(self, form):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
+        historia = self.get_historia()
         ejercio = form.save(commit=False)
         ejercio.historia = historia
         ejercio.save()
@@ -197,7 +215,6 @@ class EjercioCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
         context['titulo'] = 'Agregar Ejercicio Terapéutico'
         return context
 
@@ -230,30 +247,22 @@ class EjercioDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy('historiaclinica:detalle', kwargs={'pk': self.object.historia.pk})
 
 
-class EvolucionListView(LoginRequiredMixin, ListView):
+class EvolucionListView(LoginRequiredMixin, HistoriaClinicaMixin, ListView):
     """Lista evoluciones de un tratamiento."""
     model = EvolucionTratamiento
     template_name = 'historiaclinica/evolucion_list.html'
     context_object_name = 'evoluciones'
+    coleccion = 'evoluciones'
 
-    def get_queryset(self):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return historia.evoluciones.all().order_by('-fecha_sesion')
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return context
-
-
-class EvolucionCreateView(LoginRequiredMixin, CreateView):
+class EvolucionCreateView(LoginRequiredMixin, HistoriaClinicaMixin, CreateView):
     """Registrar evolución del tratamiento."""
     model = EvolucionTratamiento
     form_class = EvolucionTratamientoForm
     template_name = 'historiaclinica/evolucion_form.html'
 
     def form_valid(self, form):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
+        historia = self.get_historia()
         evolucion = form.save(commit=False)
         evolucion.historia = historia
         evolucion.save()
@@ -262,7 +271,6 @@ class EvolucionCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
         context['titulo'] = 'Registrar Evolución'
         return context
 
@@ -295,30 +303,22 @@ class EvolucionDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy('historiaclinica:detalle', kwargs={'pk': self.object.historia.pk})
 
 
-class EstudioListView(LoginRequiredMixin, ListView):
+class EstudioListView(LoginRequiredMixin, HistoriaClinicaMixin, ListView):
     """Lista de estudios clínicos de una historia clínica."""
     model = EstudioClinico
     template_name = 'historiaclinica/estudio_list.html'
     context_object_name = 'estudios'
+    coleccion = 'estudios'
 
-    def get_queryset(self):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return historia.estudios_clinicos.all().order_by('-fecha_estudio')
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return context
-
-
-class EstudioCreateView(LoginRequiredMixin, CreateView):
+class EstudioCreateView(LoginRequiredMixin, HistoriaClinicaMixin, CreateView):
     """Registrar un estudio clínico."""
     model = EstudioClinico
     form_class = EstudioClinicoForm
     template_name = 'historiaclinica/estudio_form.html'
 
     def form_valid(self, form):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
+        historia = self.get_historia()
         estudio = form.save(commit=False)
         estudio.historia = historia
         estudio.save()
@@ -327,7 +327,6 @@ class EstudioCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
         context['titulo'] = 'Registrar Estudio Clínico'
         return context
 
@@ -360,12 +359,13 @@ class EstudioDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy('historiaclinica:detalle', kwargs={'pk': self.object.historia.pk})
 
 
-class EstudioGlobalListView(LoginRequiredMixin, ListView):
+class EstudioGlobalListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """Exploración global de estudios clínicos con filtros."""
     model = EstudioClinico
     template_name = 'historiaclinica/estudios_global.html'
     context_object_name = 'estudios'
     paginate_by = 25
+    cursor_campo = 'fecha_estudio'
 
     def get_queryset(self):
         qs = EstudioClinico.objects.select_related('historia__paciente').all()
@@ -400,30 +400,22 @@ class EstudioGlobalListView(LoginRequiredMixin, ListView):
         return context
 
 
-class EscalaDanielsListView(LoginRequiredMixin, ListView):
+class EscalaDanielsListView(LoginRequiredMixin, HistoriaClinicaMixin, ListView):
     """Lista de evaluaciones musculares (Escala Daniels)."""
     model = EscalaDaniels
     template_name = 'historiaclinica/daniels_list.html'
     context_object_name = 'evaluaciones'
+    coleccion = 'daniels'
 
-    def get_queryset(self):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return historia.escala_daniels.all()
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
-        return context
 
-
-class EscalaDanielsCreateView(LoginRequiredMixin, CreateView):
+class EscalaDanielsCreateView(LoginRequiredMixin, HistoriaClinicaMixin, CreateView):
     """Registrar evaluación muscular (Escala Daniels)."""
     model = EscalaDaniels
     form_class = EscalaDanielsForm
     template_name = 'historiaclinica/daniels_form.html'
 
     def form_valid(self, form):
-        historia = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
+        historia = self.get_historia()
         evaluacion = form.save(commit=False)
         evaluacion.historia = historia
         evaluacion.save()
@@ -432,7 +424,6 @@ class EscalaDanielsCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['historia'] = get_object_or_404(HistoriaClinica, pk=self.kwargs['historia_pk'])
         context['titulo'] = 'Registrar Escala Daniels'
         return context
 
@@ -466,103 +457,71 @@ class EscalaDanielsDeleteView(LoginRequiredMixin, DeleteView):
 
 
 class ExportarEjerciciosPDFView(LoginRequiredMixin, View):
-    """Exportar ejercicios terapéuticos a PDF."""
-    
+    """Exportar ejercicios terapéuticos a PDF.
+
+    Si ya existe un PDF con el mismo contenido se envía desde el disco; los
+    documentos grandes se generan en segundo plano y se responde con una
+    página que consulta ``ejercicios-pdf-estado`` hasta que estén listos.
+    """
+
     def get(self, request, historia_pk):
-        historia = get_object_or_404(HistoriaClinica, pk=historia_pk)
-        ejercicios = historia.ejercicios_terapeuticos.all()
-        
-        # Crear el objeto PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        
-        # Contenedor de elementos
-        elements = []
-        
-        # Agregar logo si existe
-        logo_path = os.path.join(settings.BASE_DIR, 'static', 'img', 'fisio.png')
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=1*inch, height=1*inch)
-            elements.append(logo)
-            elements.append(Spacer(1, 0.1*inch))
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#1a73e8'),
-            spaceAfter=12,
-            alignment=TA_CENTER
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Normal'],
-            fontSize=12,
-            textColor=colors.grey,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        
-        # Título
-        elements.append(Paragraph('Ejercicios Terapéuticos', title_style))
-        elements.append(Paragraph(f'Paciente: {historia.paciente.nombre_completo}', subtitle_style))
-        elements.append(Paragraph(f'Fecha: {datetime.datetime.now().strftime("%d/%m/%Y")}', subtitle_style))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        if ejercicios:
-            for idx, ejercicio in enumerate(ejercicios, 1):
-                # Tabla para cada ejercicio
-                data = [
-                    [Paragraph(f'<b>Ejercicio {idx}: {ejercicio.nombre_ejercicio}</b>', styles['Heading2'])],
-                    [Paragraph(f'<b>Descripción:</b> {ejercicio.descripcion}', styles['Normal'])],
-                    [Paragraph(f'<b>Series:</b> {ejercicio.series} | <b>Repeticiones:</b> {ejercicio.repeticiones}', styles['Normal'])],
-                    [Paragraph(f'<b>Frecuencia:</b> {ejercicio.frecuencia}', styles['Normal'])],
-                ]
-                
-                if ejercicio.duracion_segundos:
-                    data.append([Paragraph(f'<b>Duración:</b> {ejercicio.duracion_segundos} segundos', styles['Normal'])])
-                
-                data.append([Paragraph(f'<b>Lugar:</b> {"En casa" if ejercicio.es_ejercicio_casa else "En clínica"}', styles['Normal'])])
-                
-                if ejercicio.dias_semana:
-                    data.append([Paragraph(f'<b>Días:</b> {ejercicio.dias_semana}', styles['Normal'])])
-                
-                if ejercicio.notas:
-                    data.append([Paragraph(f'<b>Notas:</b> {ejercicio.notas}', styles['Normal'])])
-                
-                table = Table(data, colWidths=[6.5*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f0fe')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1a73e8')),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 6),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#1a73e8')),
-                ]))
-                
-                elements.append(table)
-                elements.append(Spacer(1, 0.15*inch))
-        else:
-            elements.append(Paragraph('No hay ejercicios terapéuticos registrados.', styles['Normal']))
-        
-        # Construir PDF
-        doc.build(elements)
-        
-        # Obtener el valor del buffer y preparar respuesta
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="ejercicios_{historia.paciente.apellidos}_{datetime.datetime.now().strftime("%Y%m%d")}.pdf"'
-        response.write(pdf)
-        
+        historia = cargar_historia(historia_pk, ('ejercicios',))
+        datos = pdf.datos_documento(historia)
+        huella = pdf.huella(datos)
+        nombre = f'ejercicios_{historia.paciente.apellidos}_{datetime.date.today().strftime("%Y%m%d")}.pdf'
+
+        archivo = pdf.abrir(historia.pk, huella)
+        if archivo is not None:
+            return FileResponse(archivo, as_attachment=True, filename=nombre, content_type='application/pdf')
+
+        if len(datos['ejercicios']) > settings.PDF_EJERCICIOS_ASINCRONO:
+            pdf.encolar(historia.pk, huella, datos)
+            return render(request, 'historiaclinica/pdf_pendiente.html', {'historia': historia}, status=202)
+
+        contenido = pdf.renderizar(datos)
+        pdf.escribir(historia.pk, huella, contenido)
+        response = HttpResponse(contenido, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
         return response
 
+
+class EstadoEjerciciosPDFView(LoginRequiredMixin, View):
+    """Estado (JSON) de la generación en segundo plano del PDF de ejercicios."""
+
+    def get(self, request, historia_pk):
+        historia = cargar_historia(historia_pk, ('ejercicios',))
+        datos = pdf.datos_documento(historia)
+        try:
+            listo = pdf.estado(historia.pk, pdf.huella(datos), datos)
+        except Exception:
+            return JsonResponse({'error': 'No se pudo generar el PDF'}, status=500)
+        return JsonResponse({
+            'listo': listo,
+            'url': reverse('historiaclinica:ejercicios-pdf', args=[historia.pk]),
+        })
+
+
+class ExportarEjerciciosLoteView(LoginRequiredMixin, View):
+    """Hojas de ejercicios de varias historias en un ZIP, o en un PDF combinado con ``?formato=pdf``.
+
+    Las historias se eligen con ``?historia=<pk>`` (repetido) o con
+    ``?citas=hoy`` (pacientes con cita hoy).
+    """
+
+    def get(self, request):
+        if request.GET.get('citas') == 'hoy':
+            historias = lote_pdf.historias_con_cita(timezone.localdate())
+        else:
+            pks = [pk for pk in request.GET.getlist('historia') if pk.isdigit()]
+            historias = HistoriaClinica.objects.filter(pk__in=pks)
+        documentos = lote_pdf.documentos(historias)
+        if not documentos:
+            messages.warning(request, 'No hay historias clínicas para exportar.')
+            return redirect('historiaclinica:lista')
+
+        fecha = datetime.date.today().strftime('%Y%m%d')
+        if request.GET.get('formato') == 'pdf':
+            response = StreamingHttpResponse(lote_pdf.combinado(documentos), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="ejercicios_{fecha}.pdf"'
+            return response
+        return respuesta_zip(f'ejercicios_{fecha}.zip', lote_pdf.archivos(documentos))
@@ -1,4 +1,12 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from fisioterapia import importacion as lectura
+from .duplicados import fusionar
+from .importacion import importar
 from .models import (
     Paciente, EstudiosClinico, AntecedentePatologico,
     AntecedentesNoPatologicos, DatosNutricion
@@ -54,6 +62,64 @@ class PacienteAdmin(admin.ModelAdmin):
     ]
     
     readonly_fields = ('fecha_registro', 'ultima_actualizacion')
+    actions = ['fusionar_duplicados']
+
+    @admin.action(description='Fusionar los 2 pacientes seleccionados (se conserva el más antiguo)')
+    def fusionar_duplicados(self, request, queryset):
+        if queryset.count() != 2:
+            self.message_user(request, 'Seleccione exactamente dos pacientes.', messages.WARNING)
+            return
+        conservar, duplicado = queryset.order_by('fecha_registro', 'pk')
+        fusion = fusionar(conservar, duplicado)
+        detalle = ', '.join(f'{relacion}: {cantidad}' for relacion, cantidad in fusion.movidos.items() if cantidad)
+        self.message_user(request, f'{duplicado} se fusionó en {conservar}. Movidos: {detalle or "nada"}.')
+        if fusion.descartados:
+            self.message_user(
+                request,
+                f'{conservar} ya tenía {", ".join(fusion.descartados)}; los de {duplicado} se descartaron.',
+                messages.WARNING,
+            )
+
+    # Errores que se muestran en la página de importación
+    max_errores_importacion = 50
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='pacientes_paciente_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:pacientes_paciente_changelist')
+        form = ImportarPacientesForm(request.POST or None, request.FILES or None)
+        resultado = None
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                filas = lectura.filas(archivo, archivo.name, form.cleaned_data['codificacion'])
+                resultado = importar(filas, simular=form.cleaned_data['simular'])
+            except lectura.ArchivoInvalido as error:
+                form.add_error('archivo', str(error))
+            else:
+                if resultado.importados:
+                    messages.success(request, f'{resultado.importados} paciente(s) importado(s).')
+                    if not resultado.errores:
+                        return redirect('admin:pacientes_paciente_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar pacientes',
+            'form': form,
+            'resultado': resultado,
+            'errores': resultado.errores[:self.max_errores_importacion] if resultado else [],
+        }
+        return TemplateResponse(request, 'admin/pacientes/paciente/importar.html', context)
+
+
+class ImportarPacientesForm(forms.Form):
+    archivo = forms.FileField(help_text='CSV o XLSX; la primera fila son los encabezados.')
+    codificacion = forms.CharField(initial='utf-8-sig', label='Codificación del CSV', help_text='Por ejemplo cp1252 si viene de Excel en Windows.')
+    simular = forms.BooleanField(required=False, initial=True, label='Solo validar (no guardar nada)')
 
 
 @admin.register(EstudiosClinico)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PacientesConfig(AppConfig):
     name = 'pacientes'
+
+    def ready(self):
+        from pacientes import exportacion, indices, signals  # noqa: F401
@@ -0,0 +1,103 @@
+"""
+Búsqueda de pacientes compartida por los listados.
+
+Cada paciente guarda en ``texto_busqueda`` su nombre, apellidos y teléfono ya
+normalizados (minúsculas, sin acentos, teléfono solo con dígitos). Las
+búsquedas filtran con ``LIKE '%término%'`` sobre esa columna: en PostgreSQL la
+atiende el índice GIN ``pg_trgm`` y los resultados se ordenan por similitud;
+en SQLite se usa el mismo filtro con un orden por coincidencia de prefijo.
+
+``telefono_clave`` y ``clave_fonetica`` dan las claves de bloque que usa la
+detección de duplicados (``pacientes.duplicados``).
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Func, IntegerField, Q, Value, When
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con espacios colapsados."""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+
+def texto_busqueda(nombres, apellidos, telefono):
+    """Valor de la columna ``texto_busqueda`` para un paciente."""
+    digitos = re.sub(r'\D', '', telefono or '')
+    return ' '.join(filter(None, [normalizar(nombres), normalizar(apellidos), digitos]))
+
+
+# Partículas que no cuentan como primer apellido ("De la Cruz" -> "cruz")
+_PARTICULAS = {'de', 'del', 'la', 'las', 'los', 'y', 'da', 'di', 'van', 'von', 'san'}
+_FONETICA = (
+    ('ll', 'y'), ('ch', 'x'), ('qu', 'k'), ('ge', 'je'), ('gi', 'ji'), ('gue', 'ge'), ('gui', 'gi'),
+    ('ce', 'se'), ('ci', 'si'), ('z', 's'), ('c', 'k'), ('v', 'b'), ('w', 'b'), ('h', ''),
+)
+# Largo de la clave fonética del apellido
+LONGITUD_FONETICA = 8
+
+
+def telefono_clave(telefono):
+    """Últimos 10 dígitos del teléfono: ignora prefijos de país, espacios y guiones."""
+    return re.sub(r'\D', '', telefono or '')[-10:]
+
+
+def clave_fonetica(apellidos):
+    """Clave fonética (español) del primer apellido: "Vázquez" y "Basques" dan "bsks".
+
+    Se unifican las letras que suenan igual (b/v, c/k/q/s/z, g/j ante e-i,
+    ll/y, h muda), se quitan las vocales salvo la inicial y las letras repetidas.
+    """
+    palabras = [p for p in re.sub(r'[^a-z ]', '', normalizar(apellidos)).split() if p not in _PARTICULAS]
+    if not palabras:
+        return ''
+    palabra = palabras[0]
+    for origen, destino in _FONETICA:
+        palabra = palabra.replace(origen, destino)
+    if palabra.startswith('y') and palabra[1:2] not in 'aeiou':
+        palabra = 'i' + palabra[1:]
+    if not palabra:
+        return ''
+    clave = palabra[0]
+    for letra in palabra[1:]:
+        if letra in 'aeiouy' or letra == clave[-1]:
+            continue
+        clave += letra
+    return clave[:LONGITUD_FONETICA]
+
+
+class Similitud(Func):
+    """similarity() de pg_trgm."""
+    function = 'similarity'
+    output_field = FloatField()
+
+
+def buscar_pacientes(queryset, termino):
+    """Filtra y ordena por relevancia un queryset de Paciente con el término escrito por el usuario."""
+    termino = normalizar(termino)
+    if not termino:
+        return queryset
+
+    condicion = Q()
+    for token in termino.split():
+        if token.replace('-', '').isdigit():
+            token = token.replace('-', '')
+        condicion &= Q(texto_busqueda__contains=token)
+    queryset = queryset.filter(condicion)
+
+    orden_actual = list(queryset.query.order_by) or ['-fecha_registro']
+    if connections[queryset.db].vendor == 'postgresql':
+        relevancia = Similitud(F('texto_busqueda'), Value(termino))
+    else:
+        relevancia = Case(
+            When(texto_busqueda__startswith=termino, then=Value(2)),
+            When(texto_busqueda__contains=f' {termino}', then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    return queryset.annotate(relevancia=relevancia).order_by('-relevancia', *orden_actual)
@@ -0,0 +1,179 @@
+"""
+Detección y fusión de pacientes duplicados.
+
+Comparar cada par de pacientes es cuadrático, así que solo se comparan los
+que comparten un bloque:
+
+* el teléfono normalizado (``Paciente.telefono_clave``), o
+* la clave fonética del primer apellido (``Paciente.apellido_fonetico``) junto
+  con el año de nacimiento (de ``fecha_nacimiento`` o, si falta, de ``edad``).
+
+Dentro de cada bloque ``similitud`` compara nombres y apellidos normalizados;
+los bloques con más de ``DUPLICADOS_BLOQUE_MAXIMO`` pacientes (un teléfono de
+la clínica usado como comodín, por ejemplo) se descartan porque no distinguen
+a nadie. ``fusionar`` pasa citas, historias, tratamientos y demás relaciones
+del duplicado al paciente que se conserva y borra el duplicado, todo en una
+transacción; los registros uno a uno que ambos tienen se quedan con el del
+paciente conservado y se reportan.
+"""
+from collections import defaultdict, namedtuple
+from datetime import date
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from fisioterapia import contadores
+from pacientes.busqueda import normalizar
+from pacientes.models import Paciente
+
+CAMPOS = ('nombres', 'apellidos', 'telefono', 'telefono_clave', 'apellido_fonetico',
+          'fecha_nacimiento', 'edad', 'fecha_registro')
+
+# Teléfonos más cortos que esto no forman bloque
+LONGITUD_MINIMA_TELEFONO = 7
+
+
+Par = namedtuple('Par', 'paciente otro puntaje')
+# movidos: {relación: filas movidas}; descartados: relaciones uno a uno del duplicado que se borraron
+Fusion = namedtuple('Fusion', 'movidos descartados')
+
+
+def anios_nacimiento(paciente, hoy=None):
+    """Años de nacimiento posibles: el de la fecha o, con solo la edad, los dos compatibles."""
+    if paciente.fecha_nacimiento:
+        return {paciente.fecha_nacimiento.year}
+    if paciente.edad is None:
+        return set()
+    anio = (hoy or date.today()).year - paciente.edad
+    return {anio - 1, anio}
+
+
+def claves_bloqueo(paciente, hoy=None):
+    claves = set()
+    if len(paciente.telefono_clave) >= LONGITUD_MINIMA_TELEFONO:
+        claves.add(('telefono', paciente.telefono_clave))
+    if paciente.apellido_fonetico:
+        for anio in anios_nacimiento(paciente, hoy):
+            claves.add(('apellido', paciente.apellido_fonetico, anio))
+    return claves
+
+
+def _parecido(a, b):
+    """Parecido de dos textos normalizados; uno contenido en el otro ("Juan" / "Juan Carlos") cuenta como 0.9."""
+    a, b = normalizar(a), normalizar(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    parecido = SequenceMatcher(None, a, b).ratio()
+    palabras_a, palabras_b = set(a.split()), set(b.split())
+    if palabras_a <= palabras_b or palabras_b <= palabras_a:
+        parecido = max(parecido, 0.9)
+    return parecido
+
+
+def similitud(paciente, otro, hoy=None):
+    """Puntaje de 0 a 1 de que dos pacientes sean la misma persona."""
+    apellidos = _parecido(paciente.apellidos, otro.apellidos)
+    if paciente.apellido_fonetico and paciente.apellido_fonetico == otro.apellido_fonetico:
+        # Suenan igual aunque se escriban distinto ("Vázquez" / "Basques")
+        apellidos = max(apellidos, 0.85)
+    puntaje = (_parecido(paciente.nombres, otro.nombres) + apellidos) / 2
+    if paciente.telefono_clave and paciente.telefono_clave == otro.telefono_clave:
+        puntaje += 0.1
+    if paciente.fecha_nacimiento and otro.fecha_nacimiento:
+        puntaje += 0.05 if paciente.fecha_nacimiento == otro.fecha_nacimiento else -0.2
+    elif not anios_nacimiento(paciente, hoy) & anios_nacimiento(otro, hoy):
+        puntaje -= 0.1
+    return max(0.0, min(puntaje, 1.0))
+
+
+def buscar(queryset=None, umbral=None, hoy=None):
+    """Pares de posibles duplicados en ``queryset`` (todos los pacientes), de mayor a menor puntaje."""
+    umbral = settings.DUPLICADOS_UMBRAL if umbral is None else umbral
+    queryset = Paciente.objects.all() if queryset is None else queryset
+    bloques = defaultdict(list)
+    for paciente in queryset.only(*CAMPOS).order_by('pk').iterator(chunk_size=2000):
+        for clave in claves_bloqueo(paciente, hoy):
+            bloques[clave].append(paciente)
+
+    comparados = set()
+    pares = []
+    for miembros in bloques.values():
+        if len(miembros) > settings.DUPLICADOS_BLOQUE_MAXIMO:
+            continue
+        for i, paciente in enumerate(miembros):
+            for otro in miembros[i + 1:]:
+                if (paciente.pk, otro.pk) in comparados:
+                    continue
+                comparados.add((paciente.pk, otro.pk))
+                puntaje = similitud(paciente, otro, hoy)
+                if puntaje >= umbral:
+                    pares.append(Par(paciente, otro, puntaje))
+    pares.sort(key=lambda par: -par.puntaje)
+    return pares
+
+
+def posibles_duplicados(paciente, limite=5, hoy=None):
+    """Otros pacientes que comparten bloque con ``paciente`` (guardado o no) y se le parecen."""
+    paciente.calcular_claves()
+    condicion = Q()
+    if len(paciente.telefono_clave) >= LONGITUD_MINIMA_TELEFONO:
+        condicion |= Q(telefono_clave=paciente.telefono_clave)
+    anios = anios_nacimiento(paciente, hoy)
+    if paciente.apellido_fonetico and anios:
+        # Con solo la edad, el año del otro también puede salir de su edad
+        hoy = hoy or date.today()
+        edades = {hoy.year - anio for anio in anios} | {hoy.year - anio + 1 for anio in anios}
+        condicion |= Q(apellido_fonetico=paciente.apellido_fonetico) & (
+            Q(fecha_nacimiento__year__in=anios) | Q(fecha_nacimiento__isnull=True, edad__in=edades)
+        )
+    if not condicion:
+        return []
+
+    candidatos = Paciente.objects.filter(condicion).only(*CAMPOS)
+    if paciente.pk:
+        candidatos = candidatos.exclude(pk=paciente.pk)
+    pares = [
+        Par(paciente, otro, similitud(paciente, otro, hoy))
+        for otro in candidatos[:settings.DUPLICADOS_BLOQUE_MAXIMO]
+    ]
+    pares = sorted((par for par in pares if par.puntaje >= settings.DUPLICADOS_UMBRAL), key=lambda par: -par.puntaje)
+    return [par.otro for par in pares[:limite]]
+
+
+@transaction.atomic
+def fusionar(conservar, duplicado):
+    """Pasa todo lo del ``duplicado`` a ``conservar`` y borra el duplicado.
+
+    Las relaciones uno a uno (antecedentes, estudios, nutrición) se mueven solo
+    si ``conservar`` no tiene la suya; si la tiene, la del duplicado se borra con
+    él y se reporta en ``descartados`` para avisar a quien fusiona. Los datos
+    personales vacíos de ``conservar`` se completan con los del duplicado.
+    Devuelve un ``Fusion``.
+    """
+    if conservar.pk == duplicado.pk:
+        raise ValueError('No se puede fusionar un paciente consigo mismo.')
+    bloqueados = Paciente.objects.select_for_update().order_by('pk').in_bulk([conservar.pk, duplicado.pk])
+    conservar, duplicado = bloqueados[conservar.pk], bloqueados[duplicado.pk]
+
+    movidos = {}
+    descartados = []
+    for relacion in Paciente._meta.related_objects:
+        filas = relacion.related_model._base_manager.filter(**{relacion.field.name: duplicado})
+        if relacion.one_to_one and relacion.related_model._base_manager.filter(**{relacion.field.name: conservar}).exists():
+            if filas.exists():
+                descartados.append(relacion.get_accessor_name())
+            continue
+        movidos[relacion.get_accessor_name()] = filas.update(**{relacion.field.name: conservar})
+
+    for campo in Paciente._meta.concrete_fields:
+        if campo.editable and not campo.primary_key and getattr(conservar, campo.attname) in (None, ''):
+            setattr(conservar, campo.attname, getattr(duplicado, campo.attname))
+    duplicado.delete()
+    conservar.save()
+    # update() no dispara las señales de Cita
+    contadores.invalidar_citas_proximas()
+    return Fusion(movidos, descartados)
@@ -0,0 +1,81 @@
+"""Conjuntos exportables de pacientes (ver ``fisioterapia.exportacion``)."""
+from fisioterapia import exportacion
+from pacientes.models import AntecedentePatologico, AntecedentesNoPatologicos, Paciente
+
+PACIENTE = (
+    ('Paciente ID', 'paciente_id'),
+    ('Paciente', 'paciente__apellidos'),
+    ('Nombres', 'paciente__nombres'),
+)
+
+exportacion.registrar('pacientes', 'Pacientes', lambda: Paciente.objects.order_by('pk'), (
+    ('ID', 'id'),
+    ('Nombres', 'nombres'),
+    ('Apellidos', 'apellidos'),
+    ('Fecha de nacimiento', 'fecha_nacimiento'),
+    ('Edad', 'edad'),
+    ('Género', 'genero'),
+    ('Teléfono', 'telefono'),
+    ('Teléfono de emergencia', 'telefono_emergencia'),
+    ('Domicilio', 'domicilio'),
+    ('Ocupación', 'ocupacion'),
+    ('Alergias', 'alergias'),
+    ('Grupo sanguíneo', 'grupo_sanguineo'),
+    ('RH', 'rh'),
+    ('Religión', 'religion'),
+    ('Tipo de paciente', 'tipo_paciente'),
+    ('Frecuente', 'es_frecuente'),
+    ('Fecha de registro', 'fecha_registro'),
+    ('Última actualización', 'ultima_actualizacion'),
+))
+
+exportacion.registrar(
+    'antecedentes_patologicos', 'Antecedentes patológicos',
+    lambda: AntecedentePatologico.objects.order_by('paciente_id'),
+    PACIENTE + (
+        ('Hipertensión', 'hipertension'),
+        ('Diabetes', 'diabetes'),
+        ('Cáncer', 'cancer'),
+        ('Triglicéridos', 'trigliceridos'),
+        ('Obesidad', 'obesidad'),
+        ('Tiroides', 'tiroides'),
+        ('SOP', 'sop'),
+        ('Menopausia', 'menopausia'),
+        ('Fecha última menstruación', 'fecha_ultima_menstruacion'),
+        ('Probabilidad de embarazo', 'probabilidad_embarazo'),
+        ('Número de partos', 'numero_partos'),
+        ('Cirugías', 'cirugias'),
+        ('Notas', 'notas'),
+        ('Fecha de actualización', 'fecha_actualizacion'),
+    ),
+)
+
+exportacion.registrar(
+    'antecedentes_no_patologicos', 'Antecedentes no patológicos',
+    lambda: AntecedentesNoPatologicos.objects.order_by('paciente_id'),
+    PACIENTE + (
+        ('Diagnóstico', 'diagnostico'),
+        ('Pronóstico', 'pronostico'),
+        ('Actividad física', 'realiza_actividad_fisica'),
+        ('Frecuencia de ejercicio', 'frecuencia_ejercicio'),
+        ('Tipo de ejercicio', 'tipo_ejercicio'),
+        ('Tipo de alimentación', 'tipo_alimentacion'),
+        ('Régimen alimenticio', 'regimen_alimenticio'),
+        ('Tabaco', 'tabaco'),
+        ('Alcohol', 'alcohol_frecuencia'),
+        ('Azúcar', 'azucar_descripcion'),
+        ('Carnes', 'carnes'),
+        ('Legumbres', 'legumbres'),
+        ('Hidratos de carbono', 'hidratos_carbono'),
+        ('Lípidos', 'lipidos'),
+        ('Proteínas', 'proteinas'),
+        ('Dieta', 'dieta'),
+        ('Notas de dieta', 'notas_dieta'),
+        ('Hidratación', 'hidratacion'),
+        ('Litros de agua diarios', 'litros_agua_diarios'),
+        ('Horas de sueño', 'horas_sueno'),
+        ('Calidad de sueño', 'calidad_sueno'),
+        ('Suplementación', 'suplementacion'),
+        ('Fecha de actualización', 'fecha_actualizacion'),
+    ),
+)
@@ -1,9 +1,21 @@
 from django import forms
 from datetime import date
+from pacientes import duplicados
 from pacientes.models import Paciente, AntecedentesNoPatologicos, DatosNutricion, AntecedentePatologico
 
 
 class PacienteForm(forms.ModelForm):
+    # Campos que, si cambian, vuelven a buscar pacientes parecidos
+    CAMPOS_DUPLICADOS = ('nombres', 'apellidos', 'telefono', 'fecha_nacimiento', 'edad')
+    # La importación masiva lo desactiva: valida miles de filas contra una base vacía
+    avisar_duplicados = True
+
+    confirmar_duplicado = forms.BooleanField(
+        required=False,
+        label='Registrar de todas formas',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Asegurar formato compatible con input type="date" al editar
@@ -118,6 +130,17 @@ class PacienteForm(forms.ModelForm):
             calc_age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
             if calc_age < 0 or calc_age > 120:
                 self.add_error('fecha_nacimiento', 'Fecha de nacimiento inválida.')
+        self.duplicados = []
+        if self.avisar_duplicados and not self.errors and not cleaned.get('confirmar_duplicado') \
+                and (self.instance.pk is None or set(self.CAMPOS_DUPLICADOS) & set(self.changed_data)):
+            candidato = Paciente(pk=self.instance.pk, **{campo: cleaned.get(campo) for campo in self.CAMPOS_DUPLICADOS})
+            self.duplicados = duplicados.posibles_duplicados(candidato)
+            if self.duplicados:
+                raise forms.ValidationError(
+                    'Hay pacientes registrados muy parecidos. Revise que no sea la misma persona '
+                    'o marque «Registrar de todas formas».',
+                    code='duplicado',
+                )
         return cleaned
 
 
@@ -0,0 +1,255 @@
+"""
+Importación masiva de pacientes desde CSV o XLSX.
+
+La primera fila son los encabezados: el nombre del campo (``nombres``,
+``fecha_nacimiento``, ``hipertension``...) o su etiqueta en el formulario
+(``Fecha de Nacimiento``), sin importar mayúsculas ni acentos. Cada fila se
+valida con ``PacienteForm`` y, si trae columnas de antecedentes, con
+``AntecedentePatologicoForm`` y ``AntecedentesNoPatologicosForm`` (los campos
+que falten toman el valor por defecto del modelo).
+
+Las filas válidas se guardan por lotes de ``IMPORTACION_LOTE``: un
+``bulk_create`` de pacientes y uno por cada tabla de antecedentes. Todo el
+archivo va en una sola transacción: si la lectura falla a la mitad (un byte
+fuera de la codificación, un XLSX dañado) no queda guardado ningún lote y el
+archivo corregido se puede volver a subir sin duplicar pacientes.
+``bulk_create`` no llama a ``save()`` ni a las señales,
+así que ``texto_busqueda`` y las claves de duplicados se calculan aquí y al
+final se reconcilia el contador de pacientes y se invalidan el índice del
+autocompletado y los listados cacheados (``fisioterapia.fragmentos``).
+"""
+import re
+from datetime import date, timedelta
+
+from django import forms
+from django.conf import settings
+from django.db import transaction
+
+from fisioterapia import contadores, fragmentos
+from fisioterapia.importacion import ArchivoInvalido
+from pacientes import indice
+from pacientes.busqueda import normalizar
+from pacientes.forms import AntecedentePatologicoForm, AntecedentesNoPatologicosForm, PacienteForm
+from pacientes.models import AntecedentePatologico, AntecedentesNoPatologicos, Paciente
+
+FORMULARIOS = (PacienteForm, AntecedentePatologicoForm, AntecedentesNoPatologicosForm)
+
+VERDADEROS = {'si', 'true', 'verdadero', '1', 'x'}
+FALSOS = {'no', 'false', 'falso', '0', ''}
+
+# Día 0 de las fechas seriales de Excel
+_EPOCA_EXCEL = date(1899, 12, 30)
+_FECHA_DMA = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+
+
+class Resultado:
+    """Resumen de una importación; ``errores`` es una lista de ``(fila, {campo: [mensajes]})``."""
+
+    def __init__(self, ignoradas):
+        self.ignoradas = ignoradas
+        self.filas = 0
+        self.validas = 0
+        self.importados = 0
+        self.errores = []
+
+
+def _booleano(valor):
+    valor = normalizar(valor)
+    if valor in VERDADEROS:
+        return 'true'
+    if valor in FALSOS:
+        return 'false'
+    raise ValueError('Use sí/no.')
+
+
+def _fecha(valor):
+    """Acepta AAAA-MM-DD, DD/MM/AAAA o el número de serie de una celda de fecha de Excel."""
+    if _FECHA_DMA.match(valor):
+        dia, mes, anio = _FECHA_DMA.match(valor).groups()
+        return f'{anio}-{int(mes):02d}-{int(dia):02d}'
+    try:
+        serial = float(valor)
+    except ValueError:
+        return valor
+    return (_EPOCA_EXCEL + timedelta(days=int(serial))).isoformat()
+
+
+def _entero(valor):
+    # Excel guarda los números como 30.0
+    return valor[:-2] if valor.endswith('.0') else valor
+
+
+def _convertidor(nombre, campo):
+    if isinstance(campo, forms.BooleanField):
+        return _booleano
+    if isinstance(campo, forms.DateField):
+        return _fecha
+    if isinstance(campo, forms.IntegerField):
+        return _entero
+    if isinstance(campo, forms.ChoiceField):
+        # Se acepta el código o la etiqueta de la opción
+        opciones = {normalizar(str(etiqueta)): codigo for codigo, etiqueta in campo.choices if codigo}
+        return lambda valor: opciones.get(normalizar(valor), valor)
+    if nombre.startswith('telefono'):
+        # Teléfonos leídos de celdas numéricas
+        return _entero
+    return lambda valor: valor
+
+
+class _Plan:
+    """Columnas de cada formulario resueltas a partir de los encabezados."""
+
+    def __init__(self, encabezados):
+        nombres = {}
+        for formulario in FORMULARIOS:
+            for nombre, campo in formulario.base_fields.items():
+                nombres[normalizar(nombre.replace('_', ' '))] = (formulario, nombre)
+                nombres[normalizar(str(campo.label or ''))] = (formulario, nombre)
+
+        self.columnas = {formulario: [] for formulario in FORMULARIOS}
+        self.ignoradas = []
+        for indice_columna, encabezado in enumerate(encabezados):
+            clave = normalizar(encabezado.replace('_', ' '))
+            if clave not in nombres:
+                if clave:
+                    self.ignoradas.append(encabezado)
+                continue
+            formulario, nombre = nombres[clave]
+            campo = formulario.base_fields[nombre]
+            self.columnas[formulario].append((nombre, indice_columna, _convertidor(nombre, campo)))
+
+        presentes = {nombre for nombre, _, _ in self.columnas[PacienteForm]}
+        faltantes = [
+            str(campo.label) for nombre, campo in PacienteForm.base_fields.items()
+            if campo.required and nombre not in presentes
+        ]
+        if faltantes:
+            raise ArchivoInvalido(f'Faltan columnas obligatorias: {", ".join(faltantes)}.')
+
+        self.validadores = {formulario: _Validador(formulario) for formulario in FORMULARIOS}
+
+        # Valores por defecto de los antecedentes para los campos sin columna
+        self.iniciales = {}
+        for formulario in FORMULARIOS[1:]:
+            modelo = formulario._meta.model
+            self.iniciales[formulario] = {
+                nombre: _inicial(modelo._meta.get_field(nombre).get_default())
+                for nombre in formulario.base_fields
+            }
+
+    def datos(self, formulario, fila, errores):
+        """Datos del formulario para la fila, o None si la fila no trae ningún valor para él."""
+        datos = {}
+        for nombre, indice_columna, convertir in self.columnas[formulario]:
+            valor = fila[indice_columna].strip() if indice_columna < len(fila) else ''
+            if not valor and formulario is not PacienteForm:
+                continue
+            try:
+                datos[nombre] = convertir(valor)
+            except ValueError as error:
+                errores.setdefault(nombre, []).append(str(error))
+        if formulario is PacienteForm:
+            return datos
+        if not datos:
+            return None
+        return {**self.iniciales[formulario], **datos}
+
+
+def _inicial(valor):
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    return '' if valor is None else str(valor)
+
+
+class _Validador:
+    """Un formulario ligado por clase, reutilizado en todas las filas.
+
+    Construir un formulario copia (``deepcopy``) todos sus campos y widgets, y
+    eso era la mitad del tiempo de validación de cada fila. Aquí se construye
+    una vez y por fila solo se cambian los datos y la instancia; al poner
+    ``_errors`` en None, ``is_valid()`` vuelve a ejecutar ``full_clean()`` con
+    las mismas reglas de ``clean()`` y del modelo que en las vistas.
+    """
+
+    def __init__(self, formulario):
+        self.form = formulario(data={})
+        # Una consulta por fila; los duplicados se revisan después con ``duplicados.buscar``
+        self.form.avisar_duplicados = False
+        self.modelo = formulario._meta.model
+
+    def __call__(self, datos):
+        form = self.form
+        form.data = datos
+        form.instance = self.modelo()
+        form._errors = None
+        return form
+
+
+def validar_fila(plan, fila):
+    """``(paciente, patologico, no_patologico)`` sin guardar, o ``(None, errores)``."""
+    errores = {}
+    objetos = []
+    for formulario in FORMULARIOS:
+        datos = plan.datos(formulario, fila, errores)
+        if datos is None:
+            objetos.append(formulario._meta.model())
+            continue
+        form = plan.validadores[formulario](datos)
+        if form.is_valid():
+            objetos.append(form.save(commit=False))
+        else:
+            for campo, mensajes in form.errors.items():
+                errores.setdefault('general' if campo == '__all__' else campo, []).extend(mensajes)
+    if errores:
+        return None, errores
+    # bulk_create no llama a save()
+    objetos[0].calcular_claves()
+    return tuple(objetos), None
+
+
+def _guardar(lote):
+    Paciente.objects.bulk_create([paciente for paciente, _, _ in lote])
+    for paciente, patologico, no_patologico in lote:
+        patologico.paciente = paciente
+        no_patologico.paciente = paciente
+    AntecedentePatologico.objects.bulk_create([patologico for _, patologico, _ in lote])
+    AntecedentesNoPatologicos.objects.bulk_create([no_patologico for _, _, no_patologico in lote])
+
+
+def importar(filas, simular=False, tamano_lote=None):
+    """Valida e importa las filas (la primera son los encabezados); con ``simular`` no se guarda nada."""
+    tamano_lote = tamano_lote or settings.IMPORTACION_LOTE
+    filas = iter(filas)
+    encabezados = next(filas, None)
+    if not encabezados:
+        raise ArchivoInvalido('El archivo está vacío.')
+    plan = _Plan(encabezados)
+    resultado = Resultado(plan.ignoradas)
+
+    # Un error de lectura a mitad del archivo deshace los lotes ya insertados
+    with transaction.atomic():
+        lote = []
+        for numero, fila in enumerate(filas, start=2):
+            if not any(valor.strip() for valor in fila):
+                continue
+            resultado.filas += 1
+            objetos, errores = validar_fila(plan, fila)
+            if errores:
+                resultado.errores.append((numero, errores))
+                continue
+            resultado.validas += 1
+            lote.append(objetos)
+            if len(lote) >= tamano_lote:
+                if not simular:
+                    _guardar(lote)
+                    resultado.importados += len(lote)
+                lote = []
+        if lote and not simular:
+            _guardar(lote)
+            resultado.importados += len(lote)
+
+    if resultado.importados:
+        contadores.reconciliar(['pacientes'])
+        indice.invalidar()
+        fragmentos.invalidar('pacientes')
+    return resultado
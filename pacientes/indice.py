@@ -0,0 +1,204 @@
+"""
+Índice en memoria de nombres de pacientes para el autocompletado.
+
+Cada palabra normalizada de nombres y apellidos (ver ``pacientes.busqueda``)
+se guarda en un trie cuyos nodos conocen los pacientes de todo su subárbol.
+Una palabra escrita coincide con el prefijo de un nodo si empieza con la misma
+letra y está a distancia de edición ≤1 (recorrido de Levenshtein acotado sobre
+el trie), así "Jose Maria" encuentra "José María" y "gomes" encuentra "Gómez".
+
+Hay un índice por proceso. Se construye en la primera consulta, se mantiene
+con las señales post_save/post_delete de Paciente y se reconstruye cada
+``INDICE_PACIENTES_TTL`` segundos para recoger los cambios hechos por otros
+procesos o con ``bulk_create``/``update``. La reconstrucción lee la base de
+datos sin bloquear el índice: las búsquedas siguen con el anterior hasta que el
+nuevo (con los cambios llegados entretanto) lo reemplaza de una vez.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from pacientes.busqueda import normalizar
+
+# Palabras más cortas que esto solo se buscan sin errores de escritura
+LONGITUD_MINIMA_TOLERANCIA = 3
+
+
+class _Nodo:
+    __slots__ = ('hijos', 'pacientes')
+
+    def __init__(self):
+        self.hijos = {}
+        self.pacientes = set()
+
+
+class IndiceNombres:
+    """Trie de palabras de nombres con búsqueda por prefijo tolerante a un error."""
+
+    def __init__(self):
+        self.raiz = _Nodo()
+        self.palabras = {}
+        self.etiquetas = {}
+
+    def __len__(self):
+        return len(self.etiquetas)
+
+    def agregar(self, pk, nombres, apellidos):
+        self.quitar(pk)
+        palabras = set(normalizar(f'{nombres} {apellidos}').split())
+        for palabra in palabras:
+            nodo = self.raiz
+            for letra in palabra:
+                nodo = nodo.hijos.setdefault(letra, _Nodo())
+                nodo.pacientes.add(pk)
+        self.palabras[pk] = palabras
+        self.etiquetas[pk] = f'{nombres} {apellidos}'
+
+    def quitar(self, pk):
+        for palabra in self.palabras.pop(pk, ()):
+            nodo = self.raiz
+            for letra in palabra:
+                hijo = nodo.hijos.get(letra)
+                if hijo is None:
+                    break
+                hijo.pacientes.discard(pk)
+                if not hijo.pacientes:
+                    del nodo.hijos[letra]
+                    break
+                nodo = hijo
+        self.etiquetas.pop(pk, None)
+
+    def _coincidencias(self, palabra):
+        """{pk: costo} de pacientes con alguna palabra cuyo prefijo está a distancia ≤1."""
+        maximo = 1 if len(palabra) >= LONGITUD_MINIMA_TOLERANCIA else 0
+        resultado = {}
+        fila_inicial = list(range(len(palabra) + 1))
+        # cubierto: menor costo ya asignado a todo el subárbol por un ancestro
+        pendientes = [(self.raiz, fila_inicial, maximo + 1)]
+        while pendientes:
+            nodo, fila, cubierto = pendientes.pop()
+            for letra, hijo in nodo.hijos.items():
+                if nodo is self.raiz and letra != palabra[0]:
+                    # Como en casi todo autocompletado, la primera letra debe coincidir
+                    continue
+                nueva = [fila[0] + 1]
+                for i in range(1, len(palabra) + 1):
+                    nueva.append(min(
+                        nueva[i - 1] + 1,
+                        fila[i] + 1,
+                        fila[i - 1] + (palabra[i - 1] != letra),
+                    ))
+                costo = nueva[-1]
+                hijo_cubierto = cubierto
+                if costo < cubierto:
+                    # Todo el subárbol comparte este prefijo
+                    for pk in hijo.pacientes:
+                        if resultado.get(pk, cubierto) > costo:
+                            resultado[pk] = costo
+                    hijo_cubierto = costo
+                if hijo_cubierto > 0 and min(nueva) < hijo_cubierto:
+                    pendientes.append((hijo, nueva, hijo_cubierto))
+        return resultado
+
+    def buscar(self, termino, limite=10):
+        """Lista de (pk, etiqueta) que contienen todas las palabras del término."""
+        palabras = normalizar(termino).split()
+        if not palabras:
+            return []
+        costos = None
+        for palabra in palabras:
+            encontrados = self._coincidencias(palabra)
+            if costos is None:
+                costos = encontrados
+            else:
+                costos = {pk: costo + encontrados[pk] for pk, costo in costos.items() if pk in encontrados}
+            if not costos:
+                return []
+        ordenados = sorted(costos, key=lambda pk: (costos[pk], self.etiquetas[pk]))
+        return [(pk, self.etiquetas[pk]) for pk in ordenados[:limite]]
+
+
+_indice = None
+_construido_en = 0.0
+_candado = threading.Lock()
+# Solo un hilo reconstruye; mientras tanto los demás siguen con el índice anterior
+_candado_construccion = threading.Lock()
+# Altas y bajas recibidas durante la reconstrucción, para repetirlas en el índice nuevo
+_cambios = None
+# Sube con cada invalidar(): un índice empezado antes nace vencido
+_generacion = 0
+
+
+def _construir():
+    """Arma el índice desde la base de datos sin tener ``_candado`` y lo instala de una vez."""
+    global _indice, _construido_en, _cambios
+    from pacientes.models import Paciente
+    with _candado:
+        _cambios = []
+        generacion = _generacion
+    try:
+        indice = IndiceNombres()
+        for pk, nombres, apellidos in Paciente.objects.order_by().values_list('pk', 'nombres', 'apellidos').iterator():
+            indice.agregar(pk, nombres, apellidos)
+    except BaseException:
+        with _candado:
+            _cambios = None
+        raise
+    with _candado:
+        for cambio in _cambios:
+            cambio(indice)
+        _cambios = None
+        _indice = indice
+        _construido_en = time.monotonic() if generacion == _generacion else float('-inf')
+    return indice
+
+
+def obtener_indice():
+    """Índice del proceso, construyéndolo desde la base de datos si hace falta."""
+    ttl = getattr(settings, 'INDICE_PACIENTES_TTL', 300)
+    with _candado:
+        indice = _indice
+        if indice is not None and time.monotonic() - _construido_en <= ttl:
+            return indice
+    # Sin índice se espera al hilo que lo construye; con uno vencido se responde con él
+    if not _candado_construccion.acquire(blocking=indice is None):
+        return indice
+    try:
+        with _candado:
+            if _indice is not None and time.monotonic() - _construido_en <= ttl:
+                return _indice
+        return _construir()
+    finally:
+        _candado_construccion.release()
+
+
+def buscar(termino, limite=10):
+    indice = obtener_indice()
+    with _candado:
+        return indice.buscar(termino, limite)
+
+
+def _aplicar(cambio):
+    with _candado:
+        if _indice is not None:
+            cambio(_indice)
+        if _cambios is not None:
+            _cambios.append(cambio)
+
+
+def actualizar_paciente(paciente):
+    pk, nombres, apellidos = paciente.pk, paciente.nombres, paciente.apellidos
+    _aplicar(lambda indice: indice.agregar(pk, nombres, apellidos))
+
+
+def quitar_paciente(pk):
+    _aplicar(lambda indice: indice.quitar(pk))
+
+
+def invalidar():
+    """Descarta el índice del proceso; la siguiente búsqueda lo reconstruye (p. ej. tras un ``bulk_create``)."""
+    global _indice, _generacion
+    with _candado:
+        _indice = None
+        _generacion += 1
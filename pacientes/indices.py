@@ -0,0 +1,11 @@
+from fisioterapia import indices
+from pacientes.models import Paciente
+
+# Primera página de los listados por cursor: orden descendente + pk
+PAGINA = 21
+
+indices.registrar('paciente_registro_idx', lambda: Paciente.objects.order_by('-fecha_registro', '-pk')[:PAGINA])
+indices.registrar(
+    'paciente_tipo_registro_idx',
+    lambda: Paciente.objects.filter(tipo_paciente='patologia').order_by('-fecha_registro', '-pk')[:PAGINA],
+)
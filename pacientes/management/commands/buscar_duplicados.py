@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from pacientes import duplicados
+
+
+class Command(BaseCommand):
+    help = 'Lista los pares de pacientes que parecen la misma persona (fusionarlos desde el admin).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=float, help='Puntaje mínimo (por defecto DUPLICADOS_UMBRAL).')
+        parser.add_argument('--limite', type=int, default=100, help='Pares a mostrar.')
+
+    def handle(self, *args, **options):
+        pares = duplicados.buscar(umbral=options['umbral'])
+        for par in pares[:options['limite']]:
+            self.stdout.write(
+                f'{par.puntaje:.2f}  #{par.paciente.pk} {par.paciente.nombre_completo} ({par.paciente.telefono})'
+                f'  <->  #{par.otro.pk} {par.otro.nombre_completo} ({par.otro.telefono})'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(pares)} posible(s) duplicado(s).'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fisioterapia import importacion
+from pacientes.importacion import importar
+
+# Errores que se muestran antes de resumir el resto
+MAX_ERRORES = 50
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes (con sus antecedentes) desde un archivo CSV o XLSX; con --simular solo valida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--simular', action='store_true', help='Valida y reporta errores sin guardar nada.')
+        parser.add_argument('--codificacion', default='utf-8-sig', help='Codificación del CSV (p. ej. cp1252).')
+        parser.add_argument('--lote', type=int, help='Filas por bulk_create (por defecto IMPORTACION_LOTE).')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                filas = importacion.filas(archivo, options['archivo'], options['codificacion'])
+                resultado = importar(filas, simular=options['simular'], tamano_lote=options['lote'])
+        except (OSError, importacion.ArchivoInvalido) as error:
+            raise CommandError(error)
+
+        if resultado.ignoradas:
+            self.stdout.write(self.style.WARNING(f'Columnas ignoradas: {", ".join(resultado.ignoradas)}'))
+        for numero, errores in resultado.errores[:MAX_ERRORES]:
+            detalle = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in errores.items())
+            self.stdout.write(self.style.ERROR(f'Fila {numero}: {detalle}'))
+        if len(resultado.errores) > MAX_ERRORES:
+            self.stdout.write(self.style.ERROR(f'... y {len(resultado.errores) - MAX_ERRORES} fila(s) más con errores.'))
+
+        resumen = f'{resultado.filas} fila(s), {resultado.validas} válida(s), {len(resultado.errores)} con errores'
+        if options['simular']:
+            self.stdout.write(self.style.SUCCESS(f'Simulación: {resumen}; no se guardó nada.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumen}; {resultado.importados} paciente(s) importado(s).'))
@@ -0,0 +1,59 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copia congelada de pacientes.busqueda tal como estaba al crear esta migración:
+# si la normalización cambia después, esta migración debe seguir calculando lo mismo.
+def _normalizar(texto):
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+
+def texto_busqueda(nombres, apellidos, telefono):
+    digitos = re.sub(r'\D', '', telefono or '')
+    return ' '.join(filter(None, [_normalizar(nombres), _normalizar(apellidos), digitos]))
+
+
+def calcular_texto_busqueda(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    pacientes = list(Paciente.objects.only('nombres', 'apellidos', 'telefono'))
+    for paciente in pacientes:
+        paciente.texto_busqueda = texto_busqueda(paciente.nombres, paciente.apellidos, paciente.telefono)
+    Paciente.objects.bulk_update(pacientes, ['texto_busqueda'], batch_size=1000)
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    # Índice GIN de trigramas: acelera LIKE '%...%' y similarity() en PostgreSQL
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS pacientes_paciente_busqueda_trgm '
+            'ON pacientes_paciente USING gin (texto_busqueda gin_trgm_ops);'
+        )
+
+
+def eliminar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS pacientes_paciente_busqueda_trgm;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0006_antecedentes_no_pat_habitos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='texto_busqueda',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(calcular_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigramas, eliminar_indice_trigramas),
+    ]
@@ -0,0 +1,74 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia congelada de pacientes.busqueda tal como estaba al crear esta migración:
+# si las reglas cambian después, esta migración debe seguir calculando lo mismo.
+_PARTICULAS = {'de', 'del', 'la', 'las', 'los', 'y', 'da', 'di', 'van', 'von', 'san'}
+_FONETICA = (
+    ('ll', 'y'), ('ch', 'x'), ('qu', 'k'), ('ge', 'je'), ('gi', 'ji'), ('gue', 'ge'), ('gui', 'gi'),
+    ('ce', 'se'), ('ci', 'si'), ('z', 's'), ('c', 'k'), ('v', 'b'), ('w', 'b'), ('h', ''),
+)
+_LONGITUD_FONETICA = 8
+
+
+def _normalizar(texto):
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+
+def telefono_clave(telefono):
+    return re.sub(r'\D', '', telefono or '')[-10:]
+
+
+def clave_fonetica(apellidos):
+    palabras = [p for p in re.sub(r'[^a-z ]', '', _normalizar(apellidos)).split() if p not in _PARTICULAS]
+    if not palabras:
+        return ''
+    palabra = palabras[0]
+    for origen, destino in _FONETICA:
+        palabra = palabra.replace(origen, destino)
+    if palabra.startswith('y') and palabra[1:2] not in 'aeiou':
+        palabra = 'i' + palabra[1:]
+    if not palabra:
+        return ''
+    clave = palabra[0]
+    for letra in palabra[1:]:
+        if letra in 'aeiouy' or letra == clave[-1]:
+            continue
+        clave += letra
+    return clave[:_LONGITUD_FONETICA]
+
+
+def calcular_claves(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    pacientes = list(Paciente.objects.only('apellidos', 'telefono'))
+    for paciente in pacientes:
+        paciente.telefono_clave = telefono_clave(paciente.telefono)
+        paciente.apellido_fonetico = clave_fonetica(paciente.apellidos)
+    Paciente.objects.bulk_update(pacientes, ['telefono_clave', 'apellido_fonetico'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0007_paciente_texto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='telefono_clave',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='apellido_fonetico',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(calcular_claves, migrations.RunPython.noop),
+    ]
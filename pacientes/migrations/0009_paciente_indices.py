@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_paciente_claves_duplicados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['fecha_registro', 'id'], name='paciente_registro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['tipo_paciente', 'fecha_registro', 'id'], name='paciente_tipo_registro_idx'),
+        ),
+    ]
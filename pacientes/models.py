@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from pacientes.busqueda import clave_fonetica, telefono_clave, texto_busqueda
 
 # Choices para selecciones
 GENERO_CHOICES = [
@@ -84,13 +85,37 @@ class Paciente(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True)
     ultima_actualizacion = models.DateTimeField(auto_now=True)
     
+    # Nombre, apellidos y teléfono normalizados para la búsqueda (ver pacientes.busqueda)
+    texto_busqueda = models.TextField(default='', editable=False)
+    # Claves de bloque para detectar duplicados (ver pacientes.duplicados)
+    telefono_clave = models.CharField(max_length=20, default='', editable=False, db_index=True)
+    apellido_fonetico = models.CharField(max_length=20, default='', editable=False, db_index=True)
+    
     class Meta:
         ordering = ['-fecha_registro']
         verbose_name = 'Paciente'
         verbose_name_plural = 'Pacientes'
+        indexes = [
+            # Listado (paginación por cursor: fecha_registro + pk), con y sin filtro de tipo
+            models.Index(fields=['fecha_registro', 'id'], name='paciente_registro_idx'),
+            models.Index(fields=['tipo_paciente', 'fecha_registro', 'id'], name='paciente_tipo_registro_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombres} {self.apellidos}"
+    
+    def calcular_claves(self):
+        """Campos derivados de nombre y teléfono; ``bulk_create`` no llama a ``save()``."""
+        self.texto_busqueda = texto_busqueda(self.nombres, self.apellidos, self.telefono)
+        self.telefono_clave = telefono_clave(self.telefono)
+        self.apellido_fonetico = clave_fonetica(self.apellidos)
+
+    def save(self, *args, **kwargs):
+        self.calcular_claves()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombres', 'apellidos', 'telefono'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'texto_busqueda', 'telefono_clave', 'apellido_fonetico'}
+        super().save(*args, **kwargs)
 
     @property
     def nombre_completo(self):
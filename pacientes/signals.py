@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fisioterapia import contadores, fragmentos
+from pacientes import indice
+from pacientes.models import Paciente
+
+
+@receiver(post_save, sender=Paciente)
+def indexar_paciente(sender, instance, **kwargs):
+    """Mantiene al día el índice de nombres del autocompletado."""
+    indice.actualizar_paciente(instance)
+
+
+@receiver(post_delete, sender=Paciente)
+def desindexar_paciente(sender, instance, **kwargs):
+    indice.quitar_paciente(instance.pk)
+
+
+contadores.registrar('pacientes', Paciente)
+fragmentos.registrar('pacientes', Paciente)
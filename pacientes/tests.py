@@ -1,3 +1,315 @@
+import csv
+import io
+import threading
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+
+from fisioterapia import contadores, exportacion, importacion
+from pacientes import duplicados, indice
+from pacientes.busqueda import buscar_pacientes, clave_fonetica
+from pacientes.importacion import importar
+from pacientes.indice import IndiceNombres
+from pacientes.models import AntecedentePatologico, AntecedentesNoPatologicos, Paciente
+
+
+def crear_pacientes(cantidad):
+    return [
+        Paciente.objects.create(
+            nombres=f'Nombre{i}', apellidos=f'Apellido{i}', edad=30, genero='F',
+            telefono=f'55500{i:04d}', domicilio='Calle 1', tipo_paciente='patologia',
+        )
+        for i in range(cantidad)
+    ]
+
+
+class IndiceNombresTests(TestCase):
+    def setUp(self):
+        self.indice = IndiceNombres()
+        self.indice.agregar(1, 'José María', 'Gómez Núñez')
+        self.indice.agregar(2, 'Ana', 'López')
+        self.indice.agregar(3, 'Andrés', 'Gutiérrez')
+
+    def encontrados(self, termino):
+        return [pk for pk, _ in self.indice.buscar(termino)]
+
+    def test_sin_acentos_y_con_un_error(self):
+        self.assertEqual(self.encontrados('Jose Maria'), [1])
+        self.assertEqual(self.encontrados('gomes'), [1])
+        self.assertEqual(self.encontrados('NUNEZ jose'), [1])
+        self.assertEqual(self.encontrados('gutierres andres'), [3])
+        self.assertEqual(self.encontrados('gomaz nuñes'), [1])
+        # Dos errores en la misma palabra ya no coinciden
+        self.assertEqual(self.encontrados('gonnes'), [])
+
+    def test_primera_letra_y_palabras_cortas(self):
+        self.assertEqual(self.encontrados('homez'), [])
+        # Palabras de menos de tres letras: solo prefijo exacto
+        self.assertEqual(self.encontrados('an'), [2, 3])
+        self.assertEqual(self.encontrados('ab'), [])
+        self.assertEqual(self.encontrados('anq'), [2, 3])
+        # El prefijo exacto va antes que el que tiene un error
+        self.assertEqual(self.encontrados('and'), [3, 2])
+
+    def test_quitar(self):
+        self.indice.quitar(1)
+        self.assertEqual(self.encontrados('jose'), [])
+        self.assertEqual(len(self.indice), 2)
+        self.assertEqual(self.encontrados('gutierrez'), [3])
+
+
+class AutocompletarTests(TestCase):
+    def setUp(self):
+        indice.invalidar()
+        self.client.force_login(User.objects.create_user('recepcion', password='x'))
+
+    def pedir(self, **parametros):
+        respuesta = self.client.get(reverse('pacientes:autocompletar'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_las_senales_agregan_y_quitan_del_indice(self):
+        crear_pacientes(1)
+        self.assertEqual(self.pedir(q='nombre0')['resultados'][0]['texto'], 'Nombre0 Apellido0')
+        # Ya construido: el alta y la baja llegan por post_save/post_delete
+        paciente = Paciente.objects.create(
+            nombres='Íñigo', apellidos='Sánchez', edad=40, genero='M',
+            telefono='5551234567', domicilio='Calle 2', tipo_paciente='patologia',
+        )
+        self.assertEqual(self.pedir(q='inigo sanches')['resultados'], [{'id': paciente.pk, 'texto': 'Íñigo Sánchez'}])
+        paciente.apellidos = 'Ruiz'
+        paciente.save()
+        self.assertEqual(self.pedir(q='sanchez')['resultados'], [])
+        self.assertEqual(len(self.pedir(q='inigo ruiz')['resultados']), 1)
+        paciente.delete()
+        self.assertEqual(self.pedir(q='inigo')['resultados'], [])
+
+    def test_paginas_y_parametros_invalidos(self):
+        crear_pacientes(12)
+        primera = self.pedir(q='apellido')
+        segunda = self.pedir(q='apellido', pagina=2)
+        self.assertEqual((len(primera['resultados']), primera['hay_mas']), (10, True))
+        self.assertEqual((len(segunda['resultados']), segunda['hay_mas']), (2, False))
+        self.assertFalse({r['id'] for r in primera['resultados']} & {r['id'] for r in segunda['resultados']})
+        self.assertEqual(len(self.pedir()['resultados']), 10)
+        respuesta = self.client.get(reverse('pacientes:autocompletar'), {'pagina': 'dos'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_reconstruccion_no_bloquea_las_busquedas(self):
+        crear_pacientes(2)
+        anterior = indice.obtener_indice()
+        indice._construido_en = float('-inf')
+        respuestas = []
+
+        def consultar():
+            respuestas.append(indice.obtener_indice())
+            indice.actualizar_paciente(SimpleNamespace(pk=999, nombres='Zoe', apellidos='Zamora'))
+            respuestas.append(indice.buscar('zamora'))
+
+        class IndiceLento(IndiceNombres):
+            def __init__(self):
+                super().__init__()
+                # Otro hilo consulta mientras este construye
+                hilo = threading.Thread(target=consultar)
+                hilo.start()
+                hilo.join(5)
+                respuestas.append(hilo.is_alive())
+
+        with mock.patch.object(indice, 'IndiceNombres', IndiceLento):
+            nuevo = indice.obtener_indice()
+        self.assertEqual(respuestas, [anterior, [(999, 'Zoe Zamora')], False])
+        self.assertIsNot(nuevo, anterior)
+        self.assertIs(indice.obtener_indice(), nuevo)
+        # El cambio recibido durante la reconstrucción también queda en el índice nuevo
+        self.assertEqual(nuevo.buscar('zamora'), [(999, 'Zoe Zamora')])
+        self.assertEqual(len(nuevo), 3)
+
+
+class BusquedaTests(TestCase):
+    def crear(self, nombres, apellidos, telefono='5550000000'):
+        return Paciente.objects.create(
+            nombres=nombres, apellidos=apellidos, edad=30, genero='F',
+            telefono=telefono, domicilio='Calle 1', tipo_paciente='patologia',
+        )
+
+    def buscar(self, termino):
+        return list(buscar_pacientes(Paciente.objects.order_by('pk'), termino))
+
+    def test_sin_acentos_ni_mayusculas(self):
+        jose = self.crear('José', 'Pérez Núñez')
+        self.crear('Ana', 'Pera')
+        for termino in ('JOSÉ PÉREZ', 'jose perez', 'nunez', 'Núñez'):
+            with self.subTest(termino=termino):
+                self.assertEqual(self.buscar(termino), [jose])
+
+    def test_orden_por_relevancia(self):
+        dentro = self.crear('Ana', 'Sanjose')
+        palabra = self.crear('María José', 'López')
+        inicio = self.crear('José', 'Ruiz')
+        # Empieza con el término, luego palabra que empieza con él y al final el resto
+        self.assertEqual(self.buscar('jose'), [inicio, palabra, dentro])
+        self.assertEqual(self.buscar(''), [dentro, palabra, inicio])
+
+    def test_telefono_por_digitos(self):
+        paciente = self.crear('Luis', 'Mora', telefono='+52 (55) 5012-3456')
+        self.crear('Eva', 'Sol', telefono='5550000000')
+        for termino in ('5012-3456', '55 5012 3456', '525550123456', '3456'):
+            with self.subTest(termino=termino):
+                self.assertEqual(self.buscar(termino), [paciente])
+        self.assertEqual(self.buscar('5012-9999'), [])
+
+
+class ImportacionTests(TestCase):
+    ENCABEZADOS = ['Nombres', 'Apellidos', 'Fecha de Nacimiento', 'edad', 'Género', 'Teléfono',
+                   'Domicilio', 'Tipo de Paciente', 'hipertension', 'horas_sueno']
+    FILAS = [
+        ['Ana', 'Ruiz', '05/03/1990', '35', 'Femenino', '5550001', 'Calle 1', 'patologia', 'sí', '7'],
+        ['Luis', 'Mora', '', '40', 'M', '5550002', 'Calle 2', 'estetico', '', ''],
+        ['Malo', 'X', '', '200', 'Z', '', 'Calle 3', 'otro', 'quizá', ''],
+    ]
+
+    def csv(self):
+        salida = io.StringIO()
+        csv.writer(salida, delimiter=';').writerows([self.ENCABEZADOS, *self.FILAS])
+        return io.BytesIO(salida.getvalue().encode('utf-8'))
+
+    def test_csv_crea_pacientes_con_antecedentes(self):
+        resultado = importar(importacion.filas(self.csv(), 'pacientes.csv'), tamano_lote=1)
+        self.assertEqual((resultado.filas, resultado.importados), (3, 2))
+        self.assertEqual(resultado.errores[0][0], 4)
+        self.assertEqual(set(resultado.errores[0][1]), {'edad', 'genero', 'telefono', 'tipo_paciente', 'hipertension'})
+
+        ana = Paciente.objects.get(nombres='Ana')
+        self.assertEqual((ana.genero, str(ana.fecha_nacimiento)), ('F', '1990-03-05'))
+        self.assertIn('ruiz', ana.texto_busqueda)
+        self.assertTrue(ana.antecedentes_patologicos.hipertension)
+        self.assertEqual(ana.antecedentes_no_patologicos.horas_sueno, 7)
+        luis = Paciente.objects.get(nombres='Luis')
+        self.assertFalse(luis.antecedentes_patologicos.hipertension)
+        self.assertEqual(contadores.valor('pacientes'), 2)
+
+    def test_simular_no_guarda(self):
+        resultado = importar(importacion.filas(self.csv(), 'pacientes.csv'), simular=True)
+        self.assertEqual((resultado.validas, resultado.importados, len(resultado.errores)), (2, 0, 1))
+        self.assertFalse(Paciente.objects.exists())
+
+    def test_xlsx_y_columnas_obligatorias(self):
+        libro = io.BytesIO(b''.join(exportacion.libro_xlsx([('Pacientes', self.ENCABEZADOS, self.FILAS[:2])])))
+        resultado = importar(importacion.filas(libro, 'pacientes.xlsx'))
+        self.assertEqual(resultado.importados, 2)
+        self.assertEqual(Paciente.objects.get(nombres='Luis').genero, 'M')
+
+        with self.assertRaisesMessage(importacion.ArchivoInvalido, 'Teléfono'):
+            importar([['nombres', 'apellidos']])
+
+    def test_xlsx_con_hoja_danada(self):
+        original = io.BytesIO(b''.join(exportacion.libro_xlsx([('Pacientes', self.ENCABEZADOS, self.FILAS[:2])])))
+        danado = io.BytesIO()
+        with zipfile.ZipFile(original) as origen, zipfile.ZipFile(danado, 'w') as destino:
+            for nombre in origen.namelist():
+                contenido = origen.read(nombre)
+                if nombre == 'xl/worksheets/sheet1.xml':
+                    contenido = contenido[:len(contenido) // 2]
+                destino.writestr(nombre, contenido)
+        danado.seek(0)
+        with self.assertRaisesMessage(importacion.ArchivoInvalido, 'dañado'):
+            importar(importacion.filas(danado, 'pacientes.xlsx'))
+        self.assertFalse(Paciente.objects.exists())
+
+    def test_error_de_lectura_a_mitad_no_guarda_ningun_lote(self):
+        contenido = self.csv().getvalue()
+        lineas = contenido.split(b'\r\n')
+        # Más allá de la muestra del separador, para que varios lotes se inserten antes del error
+        correctas = [lineas[1].replace(b'Ana', f'Ana{i}'.encode()) for i in range(500)]
+        archivo = io.BytesIO(b'\r\n'.join([lineas[0], *correctas, b'Mal\xff;Byte']) + b'\r\n')
+        self.assertGreater(len(archivo.getvalue()), importacion.MUESTRA_CSV)
+        with self.assertRaises(importacion.ArchivoInvalido):
+            importar(importacion.filas(archivo, 'pacientes.csv'), tamano_lote=100)
+        self.assertFalse(Paciente.objects.exists())
+        self.assertFalse(AntecedentePatologico.objects.exists())
+
+    def test_subida_desde_el_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        archivo = SimpleUploadedFile('pacientes.csv', self.csv().getvalue())
+        respuesta = self.client.post(reverse('admin:pacientes_paciente_importar'), {
+            'archivo': archivo, 'codificacion': 'utf-8-sig',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context['errores']), 1)
+        self.assertEqual(Paciente.objects.count(), 2)
+
+
+class DuplicadosTests(TestCase):
+    def crear(self, nombres, apellidos, telefono, **extra):
+        datos = dict(edad=40, genero='F', domicilio='Calle 1', tipo_paciente='patologia')
+        datos.update(extra)
+        return Paciente.objects.create(nombres=nombres, apellidos=apellidos, telefono=telefono, **datos)
+
+    def datos_form(self, **extra):
+        datos = {
+            'nombres': 'María José', 'apellidos': 'Vázquez', 'edad': 40, 'genero': 'F',
+            'telefono': '55 1234 5678', 'domicilio': 'Calle 1', 'tipo_paciente': 'patologia',
+        }
+        datos.update(extra)
+        return datos
+
+    def test_clave_fonetica(self):
+        self.assertEqual(clave_fonetica('Vázquez López'), clave_fonetica('Basques'))
+        self.assertEqual(clave_fonetica('Hernández'), clave_fonetica('Ernandez'))
+        self.assertEqual(clave_fonetica('De la Cruz'), clave_fonetica('Cruz'))
+        self.assertNotEqual(clave_fonetica('Pérez'), clave_fonetica('Ramírez'))
+
+    def test_buscar_solo_dentro_de_los_bloques(self):
+        original = self.crear('María José', 'Vázquez', '5512345678')
+        mismo_telefono = self.crear('Maria Jose', 'Vazquez Ruiz', '+52 55 1234 5678', edad=60)
+        mismo_apellido = self.crear('Maria', 'Basques', '5500000000', edad=41)
+        self.crear('María José', 'Vázquez', '5599999999', edad=70)  # otro bloque: mismo nombre, otra edad
+        self.crear('Pedro', 'Vázquez', '5512345678')  # mismo teléfono, otra persona
+
+        pares = {frozenset((par.paciente.pk, par.otro.pk)) for par in duplicados.buscar()}
+        self.assertEqual(pares, {
+            frozenset((original.pk, mismo_telefono.pk)),
+            frozenset((original.pk, mismo_apellido.pk)),
+        })
+
+    def test_aviso_en_el_formulario(self):
+        from pacientes.forms import PacienteForm
+        existente = self.crear('María José', 'Vázquez', '5512345678')
+
+        form = PacienteForm(self.datos_form())
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.duplicados, [existente])
+        self.assertTrue(PacienteForm(self.datos_form(confirmar_duplicado='on')).is_valid())
+        self.assertTrue(PacienteForm(self.datos_form(nombres='Pedro', telefono='5500000000')).is_valid())
+        # Editar al propio paciente no lo marca como duplicado de sí mismo
+        self.assertTrue(PacienteForm(self.datos_form(), instance=existente).is_valid())
+
+    def test_fusionar_mueve_relaciones(self):
+        from citas.models import Cita
+        from historiaclinica.models import HistoriaClinica
+        from django.utils import timezone
+
+        conservar = self.crear('María José', 'Vázquez', '5512345678')
+        duplicado = self.crear('Maria', 'Vazquez', '5512345678', ocupacion='Docente')
+        HistoriaClinica.objects.create(paciente=duplicado, diagnostico='Lumbalgia', tratamiento_planificado='Terapia')
+        Cita.objects.create(paciente=duplicado, fecha_hora=timezone.now(), tipo_sesion='sesion_regular')
+        AntecedentePatologico.objects.create(paciente=duplicado, hipertension=True)
+        # Ambos tienen antecedentes no patológicos: se conserva el de ``conservar``
+        AntecedentesNoPatologicos.objects.create(paciente=conservar, horas_sueno=8)
+        AntecedentesNoPatologicos.objects.create(paciente=duplicado, horas_sueno=5)
 
-# Create your tests here.
+        movidos, descartados = duplicados.fusionar(conservar, duplicado)
+        self.assertEqual((movidos['citas'], movidos['historias_clinicas'], movidos['antecedentes_patologicos']), (1, 1, 1))
+        self.assertEqual(descartados, ['antecedentes_no_patologicos'])
+        self.assertNotIn('antecedentes_no_patologicos', movidos)
+        self.assertEqual(AntecedentesNoPatologicos.objects.get().horas_sueno, 8)
+        self.assertFalse(Paciente.objects.filter(pk=duplicado.pk).exists())
+        conservar.refresh_from_db()
+        self.assertEqual(conservar.ocupacion, 'Docente')
+        self.assertEqual(conservar.citas.count(), 1)
+        self.assertTrue(conservar.antecedentes_patologicos.hipertension)
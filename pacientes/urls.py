@@ -7,6 +7,7 @@ urlpatterns = [
     # Pacientes
     path('', views.PacienteListView.as_view(), name='lista'),
     path('crear/', views.PacienteCreateView.as_view(), name='crear'),
+    path('autocompletar/', views.PacienteAutocompletarView.as_view(), name='autocompletar'),
     path('<int:pk>/', views.PacienteDetailView.as_view(), name='detalle'),
     path('<int:pk>/editar/', views.PacienteUpdateView.as_view(), name='editar'),
     path('<int:pk>/eliminar/', views.PacienteDeleteView.as_view(), name='eliminar'),
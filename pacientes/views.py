@@ -3,11 +3,15 @@ from django.http import JsonResponse
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from fisioterapia.fragmentos import FragmentoCacheMixin
+from fisioterapia.paginacion import CursorPaginationMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.db.models import Q
 from django.template.loader import render_to_string
 from pacientes.models import Paciente, AntecedentePatologico, AntecedentesNoPatologicos
+from pacientes.busqueda import buscar_pacientes
+from pacientes import indice
+from fisioterapia import contadores
 from pacientes.forms import (
     PacienteForm,
     AntecedentePatologicoForm,
@@ -16,22 +20,20 @@ from pacientes.forms import (
 )
 
 
-class PacienteListView(LoginRequiredMixin, ListView):
+class PacienteListView(LoginRequiredMixin, FragmentoCacheMixin, CursorPaginationMixin, ListView):
     """Lista todos los pacientes del sistema."""
     model = Paciente
     template_name = 'pacientes/paciente_list.html'
     context_object_name = 'pacientes'
     paginate_by = 20
+    cursor_campo = 'fecha_registro'
+    # Con búsqueda el orden es por relevancia: se pagina por número
+    cursor_parametros_relevancia = ('busqueda',)
+    fragmento_grupo = 'pacientes'
 
     def get_queryset(self):
         queryset = Paciente.objects.all().order_by('-fecha_registro')
-        busqueda = self.request.GET.get('busqueda')
-        if busqueda:
-            queryset = queryset.filter(
-                Q(nombres__icontains=busqueda)
-                | Q(apellidos__icontains=busqueda)
-                | Q(telefono__icontains=busqueda)
-            )
+        queryset = buscar_pacientes(queryset, self.request.GET.get('busqueda'))
         tipo = self.request.GET.get('tipo')
         if tipo:
             queryset = queryset.filter(tipo_paciente=tipo)
@@ -39,7 +41,7 @@ class PacienteListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_pacientes'] = Paciente.objects.count()
+        context['total_pacientes'] = contadores.valor('pacientes')
         context['tipos_paciente'] = [
             ('consulta_unica', 'Consulta Única'),
             ('patologia', 'Patología'),
@@ -50,25 +52,60 @@ class PacienteListView(LoginRequiredMixin, ListView):
         context['tipo_filtro'] = self.request.GET.get('tipo', '')
         return context
 
+    def datos_fragmento(self, context):
+        table_html = render_to_string('pacientes/partials/_paciente_table.html', context=context, request=self.request)
+        pagination_html = render_to_string('pacientes/partials/_paciente_pagination.html', context=context, request=self.request)
+        resultados = context.get('page_obj').paginator.count if context.get('page_obj') else 0
+        return {
+            'table': table_html,
+            'pagination': pagination_html,
+            'resultados': resultados,
+        }
+
     def render_to_response(self, context, **response_kwargs):
-        is_ajax = self.request.headers.get('x-requested-with') == 'XMLHttpRequest' or self.request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
-        if is_ajax:
-            try:
-                table_html = render_to_string('pacientes/partials/_paciente_table.html', context=context, request=self.request)
-                pagination_html = render_to_string('pacientes/partials/_paciente_pagination.html', context=context, request=self.request)
-                resultados = context.get('page_obj').paginator.count if context.get('page_obj') else 0
-                return JsonResponse({
-                    'table': table_html,
-                    'pagination': pagination_html,
-                    'resultados': resultados,
-                })
-            except Exception as e:
-                import traceback
-                return JsonResponse({
-                    'error': str(e),
-                    'traceback': traceback.format_exc()
-                }, status=500)
-        return super().render_to_response(context, **response_kwargs)
+        try:
+            return super().render_to_response(context, **response_kwargs)
+        except Exception as e:
+            if not self.es_ajax():
+                raise
+            import traceback
+            return JsonResponse({
+                'error': str(e),
+                'traceback': traceback.format_exc()
+            }, status=500)
+
+
+class PacienteAutocompletarView(LoginRequiredMixin, View):
+    """Sugerencias de pacientes por nombre para los campos de selección remota (JSON)."""
+    por_pagina = 10
+
+    def get(self, request):
+        try:
+            pagina = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetro pagina inválido.'}, status=400)
+        inicio = (pagina - 1) * self.por_pagina
+        termino = request.GET.get('q', '').strip()
+        if termino:
+            encontrados = indice.buscar(termino, inicio + self.por_pagina + 1)[inicio:]
+        else:
+            # Sin término: los pacientes registrados más recientemente
+            encontrados = [
+                (paciente.pk, str(paciente))
+                for paciente in Paciente.objects.only('nombres', 'apellidos')[inicio:inicio + self.por_pagina + 1]
+            ]
+        # El índice puede ir atrasado respecto a otros procesos: descartar borrados
+        existentes = set(
+            Paciente.objects.filter(pk__in=[pk for pk, _ in encontrados]).values_list('pk', flat=True)
+        ) if encontrados else set()
+        return JsonResponse({
+            'resultados': [
+                {'id': pk, 'texto': texto}
+                for pk, texto in encontrados[:self.por_pagina] if pk in existentes
+            ],
+            'pagina': pagina,
+            'hay_mas': len(encontrados) > self.por_pagina,
+        })
 
 
 class PacienteDetailView(LoginRequiredMixin, DetailView):
@@ -144,22 +181,17 @@ class PacienteDeleteView(LoginRequiredMixin, DeleteView):
         return response
 
 
-class AntecedentesPatologicosListView(LoginRequiredMixin, ListView):
+class AntecedentesPatologicosListView(LoginRequiredMixin, FragmentoCacheMixin, ListView):
     """Listado de pacientes para gestionar antecedentes patológicos."""
     model = Paciente
     template_name = 'pacientes/antecedentes_pat_list.html'
     context_object_name = 'pacientes'
     paginate_by = 20
+    fragmento_grupo = 'pacientes'
 
     def get_queryset(self):
         queryset = Paciente.objects.all().order_by('-fecha_registro')
-        busqueda = self.request.GET.get('busqueda')
-        if busqueda:
-            queryset = queryset.filter(
-                Q(nombres__icontains=busqueda)
-                | Q(apellidos__icontains=busqueda)
-                | Q(telefono__icontains=busqueda)
-            )
+        queryset = buscar_pacientes(queryset, self.request.GET.get('busqueda'))
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -167,35 +199,27 @@ class AntecedentesPatologicosListView(LoginRequiredMixin, ListView):
         context['busqueda'] = self.request.GET.get('busqueda', '')
         return context
 
-    def render_to_response(self, context, **response_kwargs):
-        is_ajax = self.request.headers.get('x-requested-with') == 'XMLHttpRequest' or self.request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
-        if is_ajax:
-            table_html = render_to_string('pacientes/partials/_antecedentes_pat_table.html', context=context, request=self.request)
-            pagination_html = render_to_string('pacientes/partials/_antecedentes_pat_pagination.html', context=context, request=self.request)
-            return JsonResponse({
-                'tabla': table_html,
-                'paginacion': pagination_html,
-                'total': context['page_obj'].paginator.count,
-            })
-        return super().render_to_response(context, **response_kwargs)
+    def datos_fragmento(self, context):
+        table_html = render_to_string('pacientes/partials/_antecedentes_pat_table.html', context=context, request=self.request)
+        pagination_html = render_to_string('pacientes/partials/_antecedentes_pat_pagination.html', context=context, request=self.request)
+        return {
+            'tabla': table_html,
+            'paginacion': pagination_html,
+            'total': context['page_obj'].paginator.count,
+        }
 
 
-class AntecedentesNoPatologicosListView(LoginRequiredMixin, ListView):
+class AntecedentesNoPatologicosListView(LoginRequiredMixin, FragmentoCacheMixin, ListView):
     """Listado de pacientes para gestionar antecedentes no patológicos."""
     model = Paciente
     template_name = 'pacientes/antecedentes_no_pat_list.html'
     context_object_name = 'pacientes'
     paginate_by = 20
+    fragmento_grupo = 'pacientes'
 
     def get_queryset(self):
         queryset = Paciente.objects.all().order_by('-fecha_registro')
-        busqueda = self.request.GET.get('busqueda')
-        if busqueda:
-            queryset = queryset.filter(
-                Q(nombres__icontains=busqueda)
-                | Q(apellidos__icontains=busqueda)
-                | Q(telefono__icontains=busqueda)
-            )
+        queryset = buscar_pacientes(queryset, self.request.GET.get('busqueda'))
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -203,17 +227,14 @@ class AntecedentesNoPatologicosListView(LoginRequiredMixin, ListView):
         context['busqueda'] = self.request.GET.get('busqueda', '')
         return context
 
-    def render_to_response(self, context, **response_kwargs):
-        is_ajax = self.request.headers.get('x-requested-with') == 'XMLHttpRequest' or self.request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
-        if is_ajax:
-            table_html = render_to_string('pacientes/partials/_antecedentes_no_pat_table.html', context=context, request=self.request)
-            pagination_html = render_to_string('pacientes/partials/_antecedentes_no_pat_pagination.html', context=context, request=self.request)
-            return JsonResponse({
-                'tabla': table_html,
-                'paginacion': pagination_html,
-                'total': context['page_obj'].paginator.count,
-            })
-        return super().render_to_response(context, **response_kwargs)
+    def datos_fragmento(self, context):
+        table_html = render_to_string('pacientes/partials/_antecedentes_no_pat_table.html', context=context, request=self.request)
+        pagination_html = render_to_string('pacientes/partials/_antecedentes_no_pat_pagination.html', context=context, request=self.request)
+        return {
+            'tabla': table_html,
+            'paginacion': pagination_html,
+            'total': context['page_obj'].paginator.count,
+        }
 
 
 class AntecedentesPatologicosDetailView(LoginRequiredMixin, DetailView):
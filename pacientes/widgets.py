@@ -0,0 +1,10 @@
+from django.urls import reverse_lazy
+
+from fisioterapia.seleccion_remota import SeleccionRemotaWidget
+
+
+class PacienteAutocompleteWidget(SeleccionRemotaWidget):
+    """Selección remota de paciente servida por el índice de nombres (``pacientes:autocompletar``)."""
+
+    def __init__(self, attrs=None, placeholder='Buscar paciente por nombre...'):
+        super().__init__(reverse_lazy('pacientes:autocompletar'), attrs=attrs, placeholder=placeholder)
@@ -0,0 +1,96 @@
+// Selección remota (fisioterapia.seleccion_remota.SeleccionRemotaWidget)
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.seleccion-remota').forEach(function(contenedor) {
+        const oculto = contenedor.querySelector('input[type="hidden"]');
+        const texto = contenedor.querySelector('input[type="text"]');
+        const lista = contenedor.querySelector('.list-group');
+        let temporizador = null;
+        let peticion = null;
+
+        function cerrar() {
+            lista.classList.add('d-none');
+            lista.innerHTML = '';
+        }
+
+        function seleccionar(id, etiqueta) {
+            oculto.value = id;
+            texto.value = etiqueta;
+            oculto.dispatchEvent(new Event('change', { bubbles: true }));
+            cerrar();
+        }
+
+        function cargar(pagina) {
+            const parametros = new URLSearchParams({ q: texto.value.trim(), pagina: pagina });
+            if (contenedor.dataset.dependeDe) {
+                const dependencia = document.getElementById(contenedor.dataset.dependeDe);
+                if (dependencia && dependencia.value) {
+                    parametros.set(contenedor.dataset.parametroDependencia, dependencia.value);
+                }
+            }
+            if (peticion) {
+                peticion.abort();
+            }
+            peticion = new AbortController();
+            fetch(contenedor.dataset.url + '?' + parametros.toString(), {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                signal: peticion.signal
+            })
+                .then(function(respuesta) { return respuesta.json(); })
+                .then(function(datos) { mostrar(datos, pagina); })
+                .catch(function() {});
+        }
+
+        function mostrar(datos, pagina) {
+            if (pagina === 1) {
+                lista.innerHTML = '';
+            }
+            const anterior = lista.querySelector('.seleccion-remota-mas');
+            if (anterior) {
+                anterior.remove();
+            }
+            const resultados = datos.resultados || [];
+            if (pagina === 1 && !resultados.length) {
+                lista.innerHTML = '<div class="list-group-item text-muted small">Sin coincidencias</div>';
+            }
+            resultados.forEach(function(opcion) {
+                const boton = document.createElement('button');
+                boton.type = 'button';
+                boton.className = 'list-group-item list-group-item-action';
+                boton.textContent = opcion.texto;
+                boton.addEventListener('mousedown', function(e) {
+                    e.preventDefault();
+                    seleccionar(opcion.id, opcion.texto);
+                });
+                lista.appendChild(boton);
+            });
+            if (datos.hay_mas) {
+                const mas = document.createElement('button');
+                mas.type = 'button';
+                mas.className = 'list-group-item list-group-item-action text-primary small seleccion-remota-mas';
+                mas.textContent = 'Cargar más...';
+                mas.addEventListener('mousedown', function(e) {
+                    e.preventDefault();
+                    cargar(pagina + 1);
+                });
+                lista.appendChild(mas);
+            }
+            lista.classList.remove('d-none');
+        }
+
+        texto.addEventListener('input', function() {
+            // Al escribir se descarta la selección anterior
+            oculto.value = '';
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function() { cargar(1); }, 150);
+        });
+
+        // Con el campo vacío, al enfocarlo se muestra la primera página
+        texto.addEventListener('focus', function() {
+            if (!texto.value.trim()) {
+                cargar(1);
+            }
+        });
+
+        texto.addEventListener('blur', cerrar);
+    });
+});
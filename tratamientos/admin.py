@@ -66,8 +66,9 @@ class ZonaCorporalAdmin(admin.ModelAdmin):
 
 @admin.register(MedidasZona)
 class MedidasZonaAdmin(admin.ModelAdmin):
-    list_display = ('zona_corporal', 'numero_sesion', 'medida_cm', 'fecha_medicion')
+    list_display = ('zona_corporal', 'numero_sesion', 'medida_cm', 'obtener_cambio', 'fecha_medicion')
     list_filter = ('numero_sesion', 'fecha_medicion')
+    list_select_related = ('zona_corporal__tratamiento__paciente',)
     search_fields = ('zona_corporal__tratamiento__paciente__nombres',)
     readonly_fields = ('obtener_cambio',)
     
@@ -87,6 +88,9 @@ class MedidasZonaAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).con_cambio()
+
 
 @admin.register(EvolucionTratamientoEstetico)
 class EvolucionTratamientoEsteticoAdmin(admin.ModelAdmin):
@@ -160,18 +164,41 @@ class AnticipoInline(admin.TabularInline):
     readonly_fields = ('fecha_registro',)
 
 
+class SaldoListFilter(admin.SimpleListFilter):
+    title = 'saldo'
+    parameter_name = 'saldo'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('pendiente', 'Con saldo pendiente'),
+            ('liquidado', 'Liquidado'),
+            ('a_favor', 'Saldo a favor'),
+        )
+
+    def queryset(self, request, queryset):
+        filtros = {'pendiente': {'saldo_pendiente__gt': 0}, 'liquidado': {'saldo_pendiente': 0},
+                   'a_favor': {'saldo_pendiente__lt': 0}}
+        if self.value() in filtros:
+            return queryset.filter(**filtros[self.value()])
+        return queryset
+
+
 @admin.register(EstadoCuenta)
 class EstadoCuentaAdmin(admin.ModelAdmin):
-    list_display = ('tratamiento', 'costo_total', 'obtener_total_pagado', 'obtener_saldo_pendiente')
+    # Columnas desnormalizadas: ordenables y filtrables en la misma consulta del listado
+    list_display = ('tratamiento', 'costo_total', 'total_pagado', 'saldo_pendiente')
+    list_filter = (SaldoListFilter,)
+    list_select_related = ('tratamiento__paciente',)
+    ordering = ('-saldo_pendiente',)
     search_fields = ('tratamiento__paciente__nombres', 'tratamiento__paciente__apellidos')
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'obtener_total_pagado', 'obtener_saldo_pendiente')
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'total_pagado', 'saldo_pendiente')
     
     fieldsets = (
         ('Tratamiento', {
             'fields': ('tratamiento',)
         }),
         ('Costos', {
-            'fields': ('costo_total', 'obtener_total_pagado', 'obtener_saldo_pendiente')
+            'fields': ('costo_total', 'total_pagado', 'saldo_pendiente')
         }),
         ('Fechas', {
             'fields': ('fecha_creacion', 'fecha_actualizacion')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TratamientosConfig(AppConfig):
     name = 'tratamientos'
+
+    def ready(self):
+        from tratamientos import exportacion, indices, signals  # noqa: F401
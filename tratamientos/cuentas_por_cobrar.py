@@ -0,0 +1,183 @@
+"""
+Reporte de cuentas por cobrar sobre todos los estados de cuenta.
+
+Cada sección es una sola consulta con ``GROUP BY`` (``values().annotate()``)
+sobre las columnas desnormalizadas de ``EstadoCuenta`` (``total_pagado``,
+``saldo_pendiente``) y sobre ``Anticipo``; nada se agrega recorriendo modelos.
+El reporte completo se guarda en la caché con la fecha del día en la clave:
+la primera petición del día lo calcula y las demás (y las descargas CSV/XLSX)
+lo reutilizan.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Exists, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from tratamientos.models import Anticipo, EstadoCuenta, EvolucionTratamientoEstetico
+
+PREFIJO = 'cuentas_por_cobrar'
+
+# (días máximos desde el último pago, etiqueta); None = sin límite
+TRAMOS = (
+    (30, '0-30 días'),
+    (60, '31-60 días'),
+    (90, '61-90 días'),
+    (None, 'Más de 90 días'),
+)
+SIN_PAGOS = 'Sin pagos'
+
+# Encabezados de cada sección (mismo orden que las tuplas de filas)
+SECCIONES = {
+    'pacientes': ('Saldo por paciente', (
+        'Paciente ID', 'Paciente', 'Tratamientos', 'Costo total', 'Total pagado', 'Saldo pendiente', 'Último pago',
+    )),
+    'antiguedad': ('Antigüedad de saldos', ('Tramo', 'Cuentas', 'Saldo pendiente')),
+    'mensual': ('Cobranza mensual', ('Mes', 'Pagos', 'Total cobrado')),
+    'tecnicas': ('Por técnica', (
+        'Técnica', 'Tratamientos', 'Sesiones', 'Costo total', 'Total pagado', 'Saldo pendiente',
+    )),
+}
+
+
+def _ultimo_pago():
+    return Subquery(
+        Anticipo.objects.filter(estado_cuenta=OuterRef('pk')).order_by().values('estado_cuenta')
+        .annotate(ultimo=Max('fecha_pago')).values('ultimo')
+    )
+
+
+def totales():
+    return EstadoCuenta.objects.aggregate(
+        cuentas=Count('pk'),
+        costo_total=Sum('costo_total'),
+        total_pagado=Sum('total_pagado'),
+        por_cobrar=Sum('saldo_pendiente', filter=Q(saldo_pendiente__gt=0)),
+        cuentas_con_saldo=Count('pk', filter=Q(saldo_pendiente__gt=0)),
+        a_favor=Sum('saldo_pendiente', filter=Q(saldo_pendiente__lt=0)),
+    )
+
+
+def saldos_por_paciente():
+    """Pacientes con saldo pendiente, de mayor a menor saldo."""
+    filas = (
+        EstadoCuenta.objects.filter(saldo_pendiente__gt=0)
+        .annotate(ultimo_pago_cuenta=_ultimo_pago())
+        .values('tratamiento__paciente_id')
+        .annotate(
+            tratamientos=Count('pk'),
+            costo=Sum('costo_total'),
+            pagado=Sum('total_pagado'),
+            saldo=Sum('saldo_pendiente'),
+            ultimo_pago=Max('ultimo_pago_cuenta'),
+        )
+        .values_list(
+            'tratamiento__paciente_id', 'tratamiento__paciente__nombres', 'tratamiento__paciente__apellidos',
+            'tratamientos', 'costo', 'pagado', 'saldo', 'ultimo_pago',
+        )
+        .order_by('-saldo', 'tratamiento__paciente_id')
+    )
+    return [(pk, f'{nombres} {apellidos}', *resto) for pk, nombres, apellidos, *resto in filas]
+
+
+def antiguedad(hoy):
+    """Saldo pendiente agrupado por días desde el último anticipo de cada cuenta."""
+    condiciones = [
+        When(ultimo_pago__gte=hoy - timedelta(days=dias), then=Value(etiqueta))
+        for dias, etiqueta in TRAMOS if dias is not None
+    ]
+    filas = dict(
+        (tramo, (cuentas, saldo)) for tramo, cuentas, saldo in
+        EstadoCuenta.objects.filter(saldo_pendiente__gt=0)
+        .annotate(ultimo_pago=_ultimo_pago())
+        .annotate(tramo=Case(
+            When(ultimo_pago__isnull=True, then=Value(SIN_PAGOS)),
+            *condiciones,
+            default=Value(TRAMOS[-1][1]),
+            output_field=CharField(),
+        ))
+        .values('tramo')
+        .annotate(cuentas=Count('pk'), saldo=Sum('saldo_pendiente'))
+        .values_list('tramo', 'cuentas', 'saldo')
+        .order_by()
+    )
+    etiquetas = [etiqueta for _, etiqueta in TRAMOS] + [SIN_PAGOS]
+    return [(etiqueta, *filas.get(etiqueta, (0, 0))) for etiqueta in etiquetas]
+
+
+def cobranza_mensual():
+    return list(
+        Anticipo.objects.annotate(mes=TruncMonth('fecha_pago'))
+        .values('mes')
+        .annotate(pagos=Count('pk'), total=Sum('monto'))
+        .values_list('mes', 'pagos', 'total')
+        .order_by('mes')
+    )
+
+
+def por_tecnica():
+    """Totales de las cuentas agrupados por la técnica registrada en las sesiones.
+
+    ``TecnicaTratamiento`` no está ligado a los tratamientos; la técnica de cada
+    sesión (``tecnica_utilizada``) sí. Un tratamiento cuenta una vez por cada
+    técnica distinta que se le aplicó: se toma solo la primera sesión de cada
+    par tratamiento/técnica para no sumar su estado de cuenta varias veces.
+    """
+    repetida = EvolucionTratamientoEstetico.objects.filter(
+        tratamiento=OuterRef('tratamiento'),
+        tecnica_utilizada=OuterRef('tecnica_utilizada'),
+        numero_sesion__lt=OuterRef('numero_sesion'),
+    )
+    montos = {
+        tecnica: resto for tecnica, *resto in
+        EvolucionTratamientoEstetico.objects.exclude(Exists(repetida))
+        .values('tecnica_utilizada')
+        .annotate(
+            tratamientos=Count('tratamiento'),
+            costo=Sum('tratamiento__estado_cuenta__costo_total'),
+            pagado=Sum('tratamiento__estado_cuenta__total_pagado'),
+            saldo=Sum('tratamiento__estado_cuenta__saldo_pendiente'),
+        )
+        .values_list('tecnica_utilizada', 'tratamientos', 'costo', 'pagado', 'saldo')
+        .order_by()
+    }
+    sesiones = (
+        EvolucionTratamientoEstetico.objects.values('tecnica_utilizada')
+        .annotate(sesiones=Count('pk'))
+        .values_list('tecnica_utilizada', 'sesiones')
+        .order_by('-sesiones', 'tecnica_utilizada')
+    )
+    return [
+        (tecnica, montos[tecnica][0], total_sesiones, *montos[tecnica][1:])
+        for tecnica, total_sesiones in sesiones
+    ]
+
+
+def generar(hoy=None):
+    hoy = hoy or timezone.localdate()
+    return {
+        'fecha': hoy,
+        'generado': timezone.now(),
+        'totales': totales(),
+        'pacientes': saldos_por_paciente(),
+        'antiguedad': antiguedad(hoy),
+        'mensual': cobranza_mensual(),
+        'tecnicas': por_tecnica(),
+    }
+
+
+def obtener(hoy=None, actualizar=False):
+    """Reporte del día desde la caché; se calcula en la primera petición del día."""
+    hoy = hoy or timezone.localdate()
+    clave = f'{PREFIJO}:{hoy.isoformat()}'
+    reporte = None if actualizar else cache.get(clave)
+    if reporte is None:
+        reporte = generar(hoy)
+        cache.set(clave, reporte, 60 * 60 * 24)
+    return reporte
+
+
+def hojas(reporte):
+    """Secciones del reporte como ``(nombre, encabezados, filas)`` para la exportación."""
+    return [(titulo, encabezados, reporte[seccion]) for seccion, (titulo, encabezados) in SECCIONES.items()]
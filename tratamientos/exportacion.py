@@ -0,0 +1,69 @@
+"""Conjuntos exportables de tratamientos estéticos (ver ``fisioterapia.exportacion``)."""
+from fisioterapia import exportacion
+from tratamientos.models import Anticipo, EvolucionTratamientoEstetico, MedidasZona, TratamientoEstetico
+
+TRATAMIENTO = (
+    ('Tratamiento ID', 'tratamiento_id'),
+    ('Paciente ID', 'tratamiento__paciente_id'),
+    ('Paciente', 'tratamiento__paciente__apellidos'),
+    ('Nombres', 'tratamiento__paciente__nombres'),
+)
+
+exportacion.registrar('tratamientos', 'Tratamientos estéticos', lambda: TratamientoEstetico.objects.order_by('pk'), (
+    ('ID', 'id'),
+    ('Paciente ID', 'paciente_id'),
+    ('Paciente', 'paciente__apellidos'),
+    ('Nombres', 'paciente__nombres'),
+    ('Historia ID', 'historia_clinica_id'),
+    ('Fecha de inicio', 'fecha_inicio'),
+    ('Fin planificado', 'fecha_fin_planificada'),
+    ('Objetivo', 'objetivo_principal'),
+    ('Zona de trabajo', 'zona_trabajo'),
+    ('Técnicas', 'tecnicas_descripcion'),
+    ('Facial', 'es_tratamiento_facial'),
+    ('Radiofrecuencia', 'usa_radiofrecuencia'),
+    ('Activo', 'activo'),
+    ('Costo total', 'estado_cuenta__costo_total'),
+    ('Total pagado', 'estado_cuenta__total_pagado'),
+    ('Saldo pendiente', 'estado_cuenta__saldo_pendiente'),
+))
+
+exportacion.registrar(
+    'sesiones_tratamiento', 'Sesiones de tratamiento',
+    lambda: EvolucionTratamientoEstetico.objects.order_by('pk'),
+    (
+        ('ID', 'id'),
+        *TRATAMIENTO,
+        ('Sesión', 'numero_sesion'),
+        ('Fecha de sesión', 'fecha_sesion'),
+        ('Técnica', 'tecnica_utilizada'),
+        ('Duración (min)', 'duracion_minutos'),
+        ('Cambios visibles', 'cambios_visibles'),
+        ('Satisfacción', 'satisfaccion_paciente'),
+        ('Notas', 'notas'),
+        ('Recomendaciones', 'recomendaciones'),
+    ),
+)
+
+exportacion.registrar('medidas', 'Medidas por zona', lambda: MedidasZona.objects.order_by('pk'), (
+    ('ID', 'id'),
+    ('Tratamiento ID', 'zona_corporal__tratamiento_id'),
+    ('Paciente ID', 'zona_corporal__tratamiento__paciente_id'),
+    ('Zona', 'zona_corporal__zona'),
+    ('Sesión', 'numero_sesion'),
+    ('Medida (cm)', 'medida_cm'),
+    ('Fecha de medición', 'fecha_medicion'),
+    ('Notas', 'notas'),
+))
+
+exportacion.registrar('anticipos', 'Anticipos', lambda: Anticipo.objects.order_by('pk'), (
+    ('ID', 'id'),
+    ('Tratamiento ID', 'estado_cuenta__tratamiento_id'),
+    ('Paciente ID', 'estado_cuenta__tratamiento__paciente_id'),
+    ('Paciente', 'estado_cuenta__tratamiento__paciente__apellidos'),
+    ('Nombres', 'estado_cuenta__tratamiento__paciente__nombres'),
+    ('Monto', 'monto'),
+    ('Fecha de pago', 'fecha_pago'),
+    ('Concepto', 'concepto'),
+    ('Notas', 'notas'),
+))
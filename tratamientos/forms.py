@@ -1,8 +1,18 @@
 from django import forms
+from django.urls import reverse_lazy
 from tratamientos.models import TratamientoEstetico, MedidasZona, EvolucionTratamientoEstetico, EstadoCuenta, Anticipo
+from historiaclinica.models import HistoriaClinica
+from pacientes.widgets import PacienteAutocompleteWidget
+from fisioterapia.seleccion_remota import SeleccionRemotaWidget
+from tratamientos import medidas
 
 
 class TratamientoEstaticoForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # La etiqueta de la historia incluye al paciente: traerlo en la misma consulta
+        self.fields['historia_clinica'].queryset = HistoriaClinica.objects.select_related('paciente')
+
     def clean(self):
         cleaned_data = super().clean()
         paciente = cleaned_data.get('paciente')
@@ -15,7 +25,20 @@ class TratamientoEstaticoForm(forms.ModelForm):
             existe = TratamientoEstetico.objects.filter(historia_clinica=historia_clinica).exclude(paciente=paciente).exists()
             if existe:
                 self.add_error('historia_clinica', 'Ya existe un Tratamiento Estético con esta Historia clínica para otro paciente.')
+        # Cuadrícula de medidas de la región elegida: lo que no se puede guardar es un error, no se omite
+        self.cuadricula, errores = medidas.leer_cuadricula(self.data, cleaned_data.get('zona_principal'))
+        for campo, mensaje in errores.items():
+            if campo not in self.errors:
+                self.add_error(campo, mensaje)
         return cleaned_data
+
+    def errores_cuadricula(self):
+        """``[(etiqueta, error)]`` de los campos de la cuadrícula; la plantilla no los muestra junto al campo."""
+        return [
+            (f'{self.fields[campo].label}, {sesion}', error)
+            for campo, sesion in medidas.campos()
+            for error in self.errors.get(campo, ())
+        ]
     # Zonas principales
     ZONA_PRINCIPAL_CHOICES = [
         ('', 'Seleccionar zona principal...'),
@@ -430,14 +453,17 @@ class TratamientoEstaticoForm(forms.ModelForm):
                   'zona_trabajo', 'tecnicas_descripcion',
                   'es_tratamiento_facial', 'activo']
         widgets = {
-            'paciente': forms.Select(attrs={
-                'class': 'form-select',
-                'required': True
-            }),
-            'historia_clinica': forms.Select(attrs={
-                'class': 'form-select',
+            'paciente': PacienteAutocompleteWidget(attrs={
+                'class': 'form-control',
                 'required': True
             }),
+            'historia_clinica': SeleccionRemotaWidget(
+                reverse_lazy('historiaclinica:opciones'),
+                attrs={'class': 'form-control', 'required': True},
+                placeholder='Buscar historia clínica...',
+                depende_de='id_paciente',
+                parametro_dependencia='paciente'
+            ),
             'zona_trabajo': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 2,
@@ -0,0 +1,13 @@
+from fisioterapia import indices
+from tratamientos.models import Anticipo, TratamientoEstetico
+
+# Primera página de los listados por cursor: orden descendente + pk
+PAGINA = 21
+
+indices.registrar('tratamiento_inicio_idx', lambda: TratamientoEstetico.objects.order_by('-fecha_inicio', '-pk')[:PAGINA])
+indices.registrar(
+    'tratamiento_activos_idx',
+    lambda: TratamientoEstetico.objects.filter(activo=True).order_by('-fecha_inicio', '-pk')[:PAGINA],
+)
+indices.registrar('anticipo_cuenta_fecha_idx', lambda: Anticipo.objects.filter(estado_cuenta_id=1).order_by('-fecha_pago')[:1])
+indices.registrar('anticipo_fecha_idx', lambda: Anticipo.objects.order_by('fecha_pago')[:PAGINA])
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tratamientos.models import EstadoCuenta
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica total_pagado y saldo_pendiente de cada estado de cuenta contra SUM(monto) '
+        'de sus anticipos; con --corregir actualiza los descuadrados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help='Recalcula los estados de cuenta descuadrados.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            descuadrados = list(
+                EstadoCuenta.objects.descuadrados().select_for_update().order_by('pk')
+                .values_list('pk', 'total_pagado', 'suma_real')
+            )
+            for pk, guardado, real in descuadrados:
+                self.stdout.write(self.style.WARNING(f'Estado de cuenta {pk}: total_pagado {guardado} -> {real}'))
+            if descuadrados and options['corregir']:
+                EstadoCuenta.objects.filter(pk__in=[pk for pk, _, _ in descuadrados]).reconciliar()
+
+        if not descuadrados:
+            self.stdout.write(self.style.SUCCESS('Todos los estados de cuenta cuadran con sus anticipos.'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f'{len(descuadrados)} estado(s) de cuenta corregido(s).'))
+        else:
+            self.stdout.write(f'{len(descuadrados)} estado(s) de cuenta descuadrado(s); use --corregir.')
@@ -0,0 +1,109 @@
+"""
+Cuadrícula de medidas (zona x sesión) del formulario de tratamiento estético.
+
+El formulario envía un campo ``<zona>_s1``, ``<zona>_s34`` y ``<zona>_s67`` por
+cada zona de la región elegida en ``zona_principal``. ``leer_cuadricula`` los
+convierte en ``{zona: {numero_sesion: medida}}`` (y reporta los que no se
+pueden guardar, que el formulario muestra como errores) y ``guardar_cuadricula`` los
+escribe con dos ``bulk_create(update_conflicts=True)`` (zonas y medidas, sobre
+sus ``unique_together``) dentro de una transacción: el número de consultas no
+depende de cuántas medidas se capturen.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from tratamientos.models import MedidasZona, ZonaCorporal
+
+ZONAS_POR_REGION = {
+    'abdomen': ('abdomen_alto', 'cintura', 'abdomen_bajo'),
+    'espalda': ('espalda_alta', 'zona_axilar', 'espalda_baja'),
+    'pierna': ('femur_proximal', 'femur_medial', 'cadera_distal'),
+}
+
+# Sufijo del campo del formulario -> numero_sesion de MedidasZona
+SESIONES = {'_s1': 1, '_s34': 3, '_s67': 6}
+ETIQUETAS_SESION = {'_s1': 'sesión 1', '_s34': 'sesión 3-4', '_s67': 'sesión 6-7'}
+
+_CAMPO_MEDIDA = MedidasZona._meta.get_field('medida_cm')
+_CENTESIMOS = Decimal(1).scaleb(-_CAMPO_MEDIDA.decimal_places)
+# Primer valor que ya no cabe en medida_cm (1000 con max_digits=5, decimal_places=2)
+LIMITE_MEDIDA = Decimal(10) ** (_CAMPO_MEDIDA.max_digits - _CAMPO_MEDIDA.decimal_places)
+
+
+def campos():
+    """``[(campo, etiqueta de la sesión)]`` de todos los campos ``<zona><sufijo>`` de la cuadrícula."""
+    return [
+        (f'{zona}{sufijo}', ETIQUETAS_SESION[sufijo])
+        for zonas in ZONAS_POR_REGION.values() for zona in zonas for sufijo in SESIONES
+    ]
+
+
+def leer_cuadricula(datos, region):
+    """Medidas capturadas de la región como ``(cuadricula, errores)``.
+
+    Los campos vacíos se omiten; los no numéricos o que no caben en ``medida_cm``
+    quedan en ``errores`` (``{campo: mensaje}``) en lugar de descartarse.
+    """
+    cuadricula, errores = {}, {}
+    for zona in ZONAS_POR_REGION.get(region, ()):
+        for sufijo, sesion in SESIONES.items():
+            campo = f'{zona}{sufijo}'
+            valor = (datos.get(campo) or '').strip()
+            if not valor:
+                continue
+            try:
+                medida = Decimal(valor)
+            except InvalidOperation:
+                medida = None
+            if medida is None or not medida.is_finite():
+                errores[campo] = 'Introduce un número.'
+                continue
+            # Se compara antes de redondear (quantize falla con "1e30") y después (999.999 -> 1000.00)
+            if abs(medida) < LIMITE_MEDIDA:
+                medida = medida.quantize(_CENTESIMOS)
+            if abs(medida) >= LIMITE_MEDIDA:
+                errores[campo] = f'La medida debe ser menor que {LIMITE_MEDIDA} cm.'
+                continue
+            cuadricula.setdefault(zona, {})[sesion] = medida
+    return cuadricula, errores
+
+
+def guardar_cuadricula(tratamiento, cuadricula, fecha=None):
+    """Crea o actualiza las zonas y medidas de ``cuadricula`` en una sola transacción."""
+    if not cuadricula:
+        return
+    fecha = fecha or date.today()
+    with transaction.atomic():
+        zonas = ZonaCorporal.objects.bulk_create(
+            [ZonaCorporal(tratamiento=tratamiento, zona=zona) for zona in cuadricula],
+            update_conflicts=True,
+            unique_fields=['tratamiento', 'zona'],
+            # Actualización sin efecto para que RETURNING también devuelva las zonas existentes
+            update_fields=['zona'],
+        )
+        ids = {zona.zona: zona.pk for zona in zonas}
+        if None in ids.values():
+            # Backends sin RETURNING en upserts (MySQL): se leen las llaves en una consulta
+            ids = dict(ZonaCorporal.objects.filter(tratamiento=tratamiento, zona__in=cuadricula)
+                       .values_list('zona', 'pk'))
+        MedidasZona.objects.bulk_create(
+            [
+                MedidasZona(zona_corporal_id=ids[zona], numero_sesion=sesion, medida_cm=medida, fecha_medicion=fecha)
+                for zona, sesiones in cuadricula.items()
+                for sesion, medida in sesiones.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['zona_corporal', 'numero_sesion'],
+            update_fields=['medida_cm', 'fecha_medicion'],
+        )
+
+
+def valores_formulario(tratamiento):
+    """Medidas guardadas como ``{'<zona><sufijo>': float}`` para precargar el formulario."""
+    sufijos = {sesion: sufijo for sufijo, sesion in SESIONES.items()}
+    medidas = MedidasZona.objects.filter(
+        zona_corporal__tratamiento=tratamiento, numero_sesion__in=sufijos
+    ).values_list('zona_corporal__zona', 'numero_sesion', 'medida_cm')
+    return {f'{zona}{sufijos[sesion]}': float(medida) for zona, sesion, medida in medidas}
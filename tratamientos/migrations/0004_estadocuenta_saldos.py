@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_saldos(apps, schema_editor):
+    EstadoCuenta = apps.get_model('tratamientos', 'EstadoCuenta')
+    Anticipo = apps.get_model('tratamientos', 'Anticipo')
+    dinero = DecimalField(max_digits=10, decimal_places=2)
+    suma = Coalesce(
+        Subquery(
+            Anticipo.objects.filter(estado_cuenta=OuterRef('pk')).order_by().values('estado_cuenta')
+            .annotate(total=Sum('monto')).values('total'),
+            output_field=dinero,
+        ),
+        Value(0),
+        output_field=dinero,
+    )
+    EstadoCuenta.objects.update(total_pagado=suma, saldo_pendiente=F('costo_total') - suma)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0003_alter_tratamientoestetico_historia_clinica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadocuenta',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='estadocuenta',
+            name='saldo_pendiente',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(calcular_saldos, migrations.RunPython.noop),
+    ]
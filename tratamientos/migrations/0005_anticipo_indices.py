@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0004_estadocuenta_saldos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anticipo',
+            index=models.Index(fields=['estado_cuenta', 'fecha_pago'], name='anticipo_cuenta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anticipo',
+            index=models.Index(fields=['fecha_pago'], name='anticipo_fecha_idx'),
+        ),
+    ]
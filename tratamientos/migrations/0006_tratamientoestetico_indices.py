@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0005_anticipo_indices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tratamientoestetico',
+            index=models.Index(fields=['fecha_inicio', 'id'], name='tratamiento_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tratamientoestetico',
+            index=models.Index(fields=['fecha_inicio', 'id'], condition=models.Q(('activo', True)), name='tratamiento_activos_idx'),
+        ),
+    ]
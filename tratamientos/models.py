@@ -1,4 +1,9 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Round
 from historiaclinica.models import HistoriaClinica
 from pacientes.models import Paciente
 
@@ -29,6 +34,11 @@ class TratamientoEstetico(models.Model):
     class Meta:
         verbose_name = 'Tratamiento Estético'
         verbose_name_plural = 'Tratamientos Estéticos'
+        indexes = [
+            # Listado (cursor: fecha_inicio + pk); los activos, en un índice parcial más chico
+            models.Index(fields=['fecha_inicio', 'id'], name='tratamiento_inicio_idx'),
+            models.Index(fields=['fecha_inicio', 'id'], condition=Q(activo=True), name='tratamiento_activos_idx'),
+        ]
     
     def __str__(self):
         return f"Tratamiento Estético - {self.paciente}"
@@ -67,6 +77,29 @@ class ZonaCorporal(models.Model):
         return f"{self.tratamiento.paciente} - {self.get_zona_display()}"
 
 
+class MedidasZonaQuerySet(models.QuerySet):
+    """Consultas sobre las medidas de zona"""
+    def con_cambio(self):
+        """Anota ``medida_anterior`` y ``cambio`` respecto a la sesión medida anterior de la misma zona.
+
+        Es una subconsulta correlacionada (índice único zona/sesión), así que el
+        resultado no depende de otros filtros del queryset (admin, ``pk``, sesión).
+        """
+        anterior = MedidasZona.objects.filter(
+            zona_corporal=OuterRef('zona_corporal'),
+            numero_sesion__lt=OuterRef('numero_sesion'),
+        ).order_by('-numero_sesion').values('medida_cm')[:1]
+        return self.annotate(
+            medida_anterior=Subquery(anterior, output_field=DecimalField(max_digits=5, decimal_places=2)),
+        ).annotate(
+            # Round evita el residuo de punto flotante de SQLite
+            cambio=Round(
+                F('medida_cm') - F('medida_anterior'), 2,
+                output_field=DecimalField(max_digits=6, decimal_places=2),
+            ),
+        )
+
+
 class MedidasZona(models.Model):
     """Medidas de la zona corporal en diferentes sesiones"""
     NUMERO_SESION_CHOICES = [
@@ -84,6 +117,8 @@ class MedidasZona(models.Model):
     
     # Observaciones
     notas = models.TextField(blank=True, null=True)
+
+    objects = MedidasZonaQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Medida de Zona'
@@ -95,26 +130,17 @@ class MedidasZona(models.Model):
         return f"{self.zona_corporal.tratamiento.paciente} - {self.zona_corporal.get_zona_display()} - Sesión {self.numero_sesion}"
     
     def obtener_cambio(self):
-        """Calcula el cambio en medidas respecto a la sesión anterior"""
-        if self.numero_sesion == 1:
+        """Cambio en medidas respecto a la sesión medida anterior de la zona.
+
+        Usa la anotación de ``MedidasZona.objects.con_cambio()`` si existe; si no,
+        hace una consulta (útil para instancias sueltas).
+        """
+        if self.pk is None:
             return None
-        
-        numero_anterior = None
-        if self.numero_sesion == 3:
-            numero_anterior = 1
-        elif self.numero_sesion == 6:
-            numero_anterior = 3
-        
-        if numero_anterior:
-            medida_anterior = MedidasZona.objects.filter(
-                zona_corporal=self.zona_corporal,
-                numero_sesion=numero_anterior
-            ).first()
-            
-            if medida_anterior:
-                return self.medida_cm - medida_anterior.medida_cm
-        
-        return None
+        if not hasattr(self, 'cambio'):
+            self.cambio = MedidasZona.objects.con_cambio().values_list('cambio', flat=True).get(pk=self.pk)
+        return self.cambio
+    obtener_cambio.short_description = 'Cambio (cm)'
 
 
 class EvolucionTratamientoEstetico(models.Model):
@@ -217,16 +243,70 @@ class TratamientoFacial(models.Model):
         return f"Tratamiento Facial - {self.tratamiento_estetico.paciente}"
 
 
+class EstadoCuentaQuerySet(models.QuerySet):
+    """Consultas y mantenimiento de los saldos desnormalizados"""
+    def aplicar_pagos(self, ajustes):
+        """Suma cada ``{estado_cuenta_id: delta}`` a ``total_pagado`` y lo resta de ``saldo_pendiente``.
+
+        Las filas se bloquean en orden de llave primaria (sin interbloqueos entre
+        pagos concurrentes) y se actualizan con ``F()``, nunca con valores leídos.
+        """
+        ajustes = {pk: delta for pk, delta in ajustes.items() if pk and delta}
+        if not ajustes:
+            return
+        with transaction.atomic():
+            list(self.select_for_update().filter(pk__in=ajustes).order_by('pk').values_list('pk', flat=True))
+            for pk, delta in sorted(ajustes.items()):
+                self.filter(pk=pk).update(
+                    total_pagado=F('total_pagado') + delta,
+                    saldo_pendiente=F('saldo_pendiente') - delta,
+                )
+
+    def con_suma_real(self):
+        """Anota ``suma_real`` = SUM(monto) de los anticipos de cada cuenta."""
+        return self.annotate(suma_real=_suma_anticipos())
+
+    def descuadrados(self):
+        """Cuentas cuyo total o saldo guardado no coincide con la suma de anticipos."""
+        return self.con_suma_real().filter(
+            ~Q(total_pagado=F('suma_real')) | ~Q(saldo_pendiente=F('costo_total') - F('suma_real'))
+        )
+
+    def reconciliar(self):
+        """Recalcula ``total_pagado`` y ``saldo_pendiente`` desde los anticipos con un solo UPDATE."""
+        return self.update(
+            total_pagado=_suma_anticipos(),
+            saldo_pendiente=F('costo_total') - _suma_anticipos(),
+        )
+
+
+def _suma_anticipos():
+    suma = Anticipo.objects.filter(estado_cuenta=OuterRef('pk')).order_by().values('estado_cuenta').annotate(
+        total=Sum('monto')
+    ).values('total')
+    dinero = DecimalField(max_digits=10, decimal_places=2)
+    return Coalesce(Subquery(suma, output_field=dinero), Value(Decimal('0')), output_field=dinero)
+
+
 class EstadoCuenta(models.Model):
     """Estado de cuentas del tratamiento estético"""
+    # Se mantienen con F() desde Anticipo; save() nunca los escribe
+    CAMPOS_SALDO = ('total_pagado', 'saldo_pendiente')
+
     tratamiento = models.OneToOneField(TratamientoEstetico, on_delete=models.CASCADE, related_name='estado_cuenta')
     
     # Costo total del tratamiento
     costo_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    # Desnormalizados: suma de anticipos y costo_total - total_pagado
+    total_pagado = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    saldo_pendiente = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, db_index=True)
     
     # Fecha de creación
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    objects = EstadoCuentaQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Estado de Cuenta'
@@ -234,14 +314,33 @@ class EstadoCuenta(models.Model):
     
     def __str__(self):
         return f"Estado de Cuenta - {self.tratamiento.paciente}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self._state.adding:
+                self.saldo_pendiente = self.costo_total - self.total_pagado
+                super().save(*args, **kwargs)
+                return
+            # Los saldos en memoria pueden estar desfasados de otro proceso: no se escriben
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [campo for campo in update_fields if campo not in self.CAMPOS_SALDO]
+            super().save(*args, **kwargs)
+            EstadoCuenta.objects.filter(pk=self.pk).update(saldo_pendiente=F('costo_total') - F('total_pagado'))
+            self.total_pagado, self.saldo_pendiente = EstadoCuenta.objects.filter(pk=self.pk).values_list(
+                *self.CAMPOS_SALDO
+            ).get()
     
     def obtener_total_pagado(self):
-        """Calcula el total de anticipos pagados"""
-        return sum(anticipo.monto for anticipo in self.anticipos.all())
+        """Total de anticipos pagados (columna desnormalizada)"""
+        return self.total_pagado
+    obtener_total_pagado.short_description = 'Total pagado'
     
     def obtener_saldo_pendiente(self):
-        """Calcula el saldo pendiente"""
-        return self.costo_total - self.obtener_total_pagado()
+        """Saldo pendiente (columna desnormalizada)"""
+        return self.saldo_pendiente
+    obtener_saldo_pendiente.short_description = 'Saldo pendiente'
 
 
 class Anticipo(models.Model):
@@ -263,6 +362,25 @@ class Anticipo(models.Model):
         verbose_name = 'Anticipo'
         verbose_name_plural = 'Anticipos'
         ordering = ['fecha_pago']
+        indexes = [
+            # Último pago por cuenta (antigüedad de saldos) y cobranza por fecha
+            models.Index(fields=['estado_cuenta', 'fecha_pago'], name='anticipo_cuenta_fecha_idx'),
+            models.Index(fields=['fecha_pago'], name='anticipo_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Anticipo ${self.monto} - {self.fecha_pago}"
+
+    def save(self, *args, **kwargs):
+        # El borrado se refleja en el saldo desde tratamientos/signals.py (cubre cascadas)
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                anterior = Anticipo.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'estado_cuenta_id', 'monto'
+                ).first()
+            super().save(*args, **kwargs)
+            ajustes = {self.estado_cuenta_id: Decimal(str(self.monto))}
+            if anterior:
+                ajustes[anterior[0]] = ajustes.get(anterior[0], Decimal('0')) - anterior[1]
+            EstadoCuenta.objects.aplicar_pagos(ajustes)
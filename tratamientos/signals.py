@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from fisioterapia import contadores
+from tratamientos.models import Anticipo, EstadoCuenta, TratamientoEstetico
+
+contadores.registrar('tratamientos_activos', TratamientoEstetico, activo=True)
+
+
+@receiver(post_delete, sender=Anticipo)
+def descontar_anticipo(sender, instance, **kwargs):
+    """Resta del saldo el anticipo borrado (también en borrados en cascada o por queryset)."""
+    EstadoCuenta.objects.aplicar_pagos({instance.estado_cuenta_id: -instance.monto})
@@ -1,3 +1,280 @@
-from django.test import TestCase
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from historiaclinica.models import HistoriaClinica
+from pacientes.tests import crear_pacientes
+from tratamientos import cuentas_por_cobrar, medidas
+from tratamientos.models import (
+    Anticipo, EstadoCuenta, EvolucionTratamientoEstetico, MedidasZona, TratamientoEstetico, ZonaCorporal,
+)
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class PresupuestoConsultasTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        for paciente in crear_pacientes(25):
+            historia = HistoriaClinica.objects.create(
+                paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+            )
+            TratamientoEstetico.objects.create(
+                paciente=paciente, historia_clinica=historia,
+                objetivo_principal='Reducir medidas', zona_trabajo='Abdomen',
+            )
+
+    def test_lista_no_crece_con_las_filas(self):
+        respuesta = self.client.get(reverse('tratamientos:lista'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_detalle_no_crece_con_las_zonas(self):
+        tratamiento = TratamientoEstetico.objects.first()
+        for zona, _ in ZonaCorporal.ZONA_CHOICES:
+            zona_corporal = ZonaCorporal.objects.create(tratamiento=tratamiento, zona=zona)
+            for sesion, medida in ((1, 90), (3, 87), (6, 85)):
+                MedidasZona.objects.create(
+                    zona_corporal=zona_corporal, numero_sesion=sesion,
+                    medida_cm=medida, fecha_medicion=date.today(),
+                )
+        respuesta = self.client.get(reverse('tratamientos:detalle', args=[tratamiento.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, '-3,00')
+
+
+class CambioMedidasTests(TestCase):
+    def test_cambio_respecto_a_la_sesion_medida_anterior(self):
+        paciente = crear_pacientes(1)[0]
+        historia = HistoriaClinica.objects.create(
+            paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+        )
+        tratamiento = TratamientoEstetico.objects.create(
+            paciente=paciente, historia_clinica=historia, objetivo_principal='Reducir medidas'
+        )
+        cintura = ZonaCorporal.objects.create(tratamiento=tratamiento, zona='cintura')
+        abdomen = ZonaCorporal.objects.create(tratamiento=tratamiento, zona='abdomen_alto')
+        for zona, sesion, medida in ((cintura, 1, '80.50'), (cintura, 3, '78.00'), (cintura, 6, '77.25'),
+                                     (abdomen, 1, '95.00'), (abdomen, 6, '92.00')):
+            MedidasZona.objects.create(
+                zona_corporal=zona, numero_sesion=sesion, medida_cm=Decimal(medida), fecha_medicion=date.today()
+            )
+
+        cambios = {
+            (m.zona_corporal.zona, m.numero_sesion): m.cambio
+            for m in MedidasZona.objects.con_cambio().select_related('zona_corporal')
+        }
+        self.assertIsNone(cambios[('cintura', 1)])
+        self.assertEqual(cambios[('cintura', 3)], Decimal('-2.50'))
+        self.assertEqual(cambios[('cintura', 6)], Decimal('-0.75'))
+        self.assertEqual(cambios[('abdomen_alto', 6)], Decimal('-3.00'))
+        # El filtro por sesión no afecta la subconsulta de la medida anterior
+        self.assertEqual(
+            MedidasZona.objects.con_cambio().get(zona_corporal=cintura, numero_sesion=6).cambio, Decimal('-0.75')
+        )
+        self.assertEqual(MedidasZona.objects.get(zona_corporal=cintura, numero_sesion=3).obtener_cambio(), Decimal('-2.50'))
+
+
+class SaldosEstadoCuentaTests(TestCase):
+    def setUp(self):
+        cuentas = []
+        for paciente in crear_pacientes(2):
+            historia = HistoriaClinica.objects.create(
+                paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+            )
+            tratamiento = TratamientoEstetico.objects.create(
+                paciente=paciente, historia_clinica=historia, objetivo_principal='Reducir medidas'
+            )
+            cuentas.append(EstadoCuenta.objects.create(tratamiento=tratamiento, costo_total=Decimal('1000')))
+        self.cuenta, self.otra = cuentas
+
+    def saldos(self, cuenta):
+        cuenta.refresh_from_db()
+        return cuenta.total_pagado, cuenta.saldo_pendiente
+
+    def anticipo(self, cuenta, monto):
+        return Anticipo.objects.create(estado_cuenta=cuenta, monto=Decimal(monto), fecha_pago=date.today())
+
+    def test_alta_edicion_y_borrado_de_anticipos(self):
+        primero = self.anticipo(self.cuenta, '300')
+        self.anticipo(self.cuenta, '200')
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('500'), Decimal('500')))
+
+        primero.monto = Decimal('350')
+        primero.save()
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('550'), Decimal('450')))
+
+        primero.estado_cuenta = self.otra
+        primero.save()
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('200'), Decimal('800')))
+        self.assertEqual(self.saldos(self.otra), (Decimal('350'), Decimal('650')))
+
+        Anticipo.objects.filter(estado_cuenta=self.cuenta).delete()
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('0'), Decimal('1000')))
+        self.assertFalse(EstadoCuenta.objects.descuadrados().exists())
+
+    def test_guardar_una_instancia_desfasada_no_pisa_los_saldos(self):
+        desfasada = EstadoCuenta.objects.get(pk=self.cuenta.pk)
+        self.anticipo(self.cuenta, '400')
+        desfasada.costo_total = Decimal('1500')
+        desfasada.save()
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('400'), Decimal('1100')))
+        self.assertEqual(desfasada.saldo_pendiente, Decimal('1100'))
+
+    def test_reconciliar_corrige_la_deriva(self):
+        self.anticipo(self.cuenta, '250')
+        EstadoCuenta.objects.filter(pk=self.cuenta.pk).update(total_pagado=0, saldo_pendiente=0)
+        self.assertEqual(list(EstadoCuenta.objects.descuadrados().values_list('pk', flat=True)), [self.cuenta.pk])
+        EstadoCuenta.objects.descuadrados().reconciliar()
+        self.assertEqual(self.saldos(self.cuenta), (Decimal('250'), Decimal('750')))
+        self.assertFalse(EstadoCuenta.objects.descuadrados().exists())
+
+
+@override_settings(PRESUPUESTOS_ESTRICTOS=True)
+class CuentasPorCobrarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoy = date(2026, 3, 31)
+        self.client.force_login(User.objects.create_user('terapeuta', password='x'))
+        pacientes = crear_pacientes(3)
+        costos = ('1000', '500', '800')
+        # (paciente, días desde el pago, monto)
+        pagos = ((0, 10, '400'), (0, 45, '100'), (1, 200, '500'))
+        self.cuentas = []
+        for paciente, costo in zip(pacientes, costos):
+            historia = HistoriaClinica.objects.create(
+                paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+            )
+            tratamiento = TratamientoEstetico.objects.create(
+                paciente=paciente, historia_clinica=historia, objetivo_principal='Reducir medidas'
+            )
+            self.cuentas.append(EstadoCuenta.objects.create(tratamiento=tratamiento, costo_total=Decimal(costo)))
+            for numero, tecnica in enumerate(('Cavitación', 'Cavitación', 'Radiofrecuencia'), 1):
+                EvolucionTratamientoEstetico.objects.create(
+                    tratamiento=tratamiento, numero_sesion=numero, fecha_sesion=self.hoy, tecnica_utilizada=tecnica
+                )
+        for indice, dias, monto in pagos:
+            Anticipo.objects.create(
+                estado_cuenta=self.cuentas[indice], monto=Decimal(monto), fecha_pago=self.hoy - timedelta(days=dias)
+            )
+
+    def test_secciones_agregadas(self):
+        reporte = cuentas_por_cobrar.generar(self.hoy)
+        self.assertEqual(reporte['totales']['por_cobrar'], Decimal('1300'))
+        self.assertEqual(reporte['totales']['cuentas_con_saldo'], 2)
+        self.assertEqual(
+            [(fila[1], fila[5]) for fila in reporte['pacientes']],
+            [(self.cuentas[2].tratamiento.paciente.nombre_completo, Decimal('800')),
+             (self.cuentas[0].tratamiento.paciente.nombre_completo, Decimal('500'))],
+        )
+        self.assertEqual(reporte['pacientes'][1][6], self.hoy - timedelta(days=10))
+        antiguedad = {tramo: (cuentas, saldo) for tramo, cuentas, saldo in reporte['antiguedad']}
+        self.assertEqual(antiguedad['0-30 días'], (1, Decimal('500')))
+        self.assertEqual(antiguedad[cuentas_por_cobrar.SIN_PAGOS], (1, Decimal('800')))
+        self.assertEqual(sum(mes[2] for mes in reporte['mensual']), Decimal('1000'))
+        # Cada tratamiento cuenta una vez por técnica aunque tenga varias sesiones con ella
+        self.assertEqual(
+            reporte['tecnicas'][0],
+            ('Cavitación', 3, 6, Decimal('2300'), Decimal('1000'), Decimal('1300')),
+        )
+
+    def test_reporte_cacheado_y_exportaciones(self):
+        url = reverse('tratamientos:cuentas_por_cobrar')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(2):  # sesión y usuario: el reporte sale de la caché
+            self.client.get(url)
+
+        respuesta = self.client.get(url, {'formato': 'csv', 'seccion': 'antiguedad'})
+        lineas = b''.join(respuesta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0], 'Tramo,Cuentas,Saldo pendiente')
+
+        respuesta = self.client.get(url, {'formato': 'xlsx'})
+        with zipfile.ZipFile(BytesIO(b''.join(respuesta.streaming_content))) as libro:
+            self.assertIn('xl/worksheets/sheet4.xml', libro.namelist())
+            self.assertIn('Saldo por paciente', libro.read('xl/workbook.xml').decode())
+
+        self.assertEqual(self.client.get(url, {'formato': 'csv', 'seccion': 'otra'}).status_code, 400)
+
+    def test_xlsx_valido_con_caracteres_de_control(self):
+        # Texto pegado desde Excel trae tabuladores verticales y otros controles
+        paciente = self.cuentas[0].tratamiento.paciente
+        paciente.apellidos = 'Ruiz\x0bGarcía\x01'
+        paciente.save()
+        respuesta = self.client.get(reverse('tratamientos:cuentas_por_cobrar'), {'formato': 'xlsx'})
+        with zipfile.ZipFile(BytesIO(b''.join(respuesta.streaming_content))) as libro:
+            hojas = [nombre for nombre in libro.namelist() if nombre.startswith('xl/worksheets/')]
+            for nombre in hojas:
+                ElementTree.fromstring(libro.read(nombre))
+            self.assertIn('Ruiz García', ''.join(libro.read(nombre).decode() for nombre in hojas))
+
+
+class CuadriculaMedidasTests(TestCase):
+    def setUp(self):
+        paciente = crear_pacientes(1)[0]
+        historia = HistoriaClinica.objects.create(
+            paciente=paciente, diagnostico='Celulitis', tratamiento_planificado='Reductivo'
+        )
+        self.tratamiento = TratamientoEstetico.objects.create(
+            paciente=paciente, historia_clinica=historia, objetivo_principal='Reducir medidas'
+        )
+
+    def datos(self, base):
+        return {
+            f'{zona}{sufijo}': str(base - i)
+            for zona in medidas.ZONAS_POR_REGION['abdomen']
+            for i, sufijo in enumerate(medidas.SESIONES)
+        }
+
+    def test_alta_y_edicion_con_consultas_constantes(self):
+        datos = self.datos(90)
+        datos['cintura_s67'] = ''
+        datos['abdomen_bajo_s34'] = 'abc'
+        # Fuera de rango para medida_cm (max_digits=5): se reportan en lugar de fallar al guardar
+        datos['abdomen_alto_s34'] = '1e30'
+        datos['abdomen_alto_s67'] = '999.999'
+        datos['abdomen_bajo_s67'] = 'Infinity'
+        cuadricula, errores = medidas.leer_cuadricula(datos, 'abdomen')
+        self.assertEqual(cuadricula['cintura'], {1: Decimal('90.00'), 3: Decimal('89.00')})
+        self.assertEqual(cuadricula['abdomen_alto'], {1: Decimal('90.00')})
+        self.assertEqual(cuadricula['abdomen_bajo'], {1: Decimal('90.00')})
+        self.assertEqual(errores, {
+            'abdomen_bajo_s34': 'Introduce un número.',
+            'abdomen_alto_s34': 'La medida debe ser menor que 1000 cm.',
+            'abdomen_alto_s67': 'La medida debe ser menor que 1000 cm.',
+            'abdomen_bajo_s67': 'Introduce un número.',
+        })
+
+        with self.assertNumQueries(4):  # savepoint, zonas, medidas, release
+            medidas.guardar_cuadricula(self.tratamiento, cuadricula)
+        self.assertEqual(MedidasZona.objects.filter(zona_corporal__tratamiento=self.tratamiento).count(), 4)
+
+        with self.assertNumQueries(4):
+            medidas.guardar_cuadricula(self.tratamiento, medidas.leer_cuadricula(self.datos(80), 'abdomen')[0])
+        self.assertEqual(ZonaCorporal.objects.filter(tratamiento=self.tratamiento).count(), 3)
+        valores = medidas.valores_formulario(self.tratamiento)
+        self.assertEqual(len(valores), 9)
+        self.assertEqual(valores['cintura_s67'], 78.0)
+
+    def test_formulario_reporta_medidas_invalidas_sin_guardar(self):
+        self.client.force_login(User.objects.create_user('admin', password='x'))
+        datos = {
+            'paciente': self.tratamiento.paciente_id, 'historia_clinica': self.tratamiento.historia_clinica_id,
+            'zona_trabajo': 'Abdomen', 'activo': 'on', 'zona_principal': 'abdomen', **self.datos(90),
+        }
+        url = reverse('tratamientos:editar', args=[self.tratamiento.pk])
+        respuesta = self.client.post(url, {**datos, 'cintura_s34': '1e30', 'abdomen_bajo_s1': '1000'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['form'].errores_cuadricula(), [
+            ('Cintura (cm), sesión 3-4', 'La medida debe ser menor que 1000 cm.'),
+            ('Abdomen bajo (cm), sesión 1', 'La medida debe ser menor que 1000 cm.'),
+        ])
+        self.assertContains(respuesta, 'Cintura (cm), sesión 3-4: La medida debe ser menor que 1000 cm.')
+        self.assertFalse(MedidasZona.objects.filter(zona_corporal__tratamiento=self.tratamiento).exists())
+
+        self.assertRedirects(self.client.post(url, datos), reverse('tratamientos:detalle', args=[self.tratamiento.pk]))
+        self.assertEqual(MedidasZona.objects.filter(zona_corporal__tratamiento=self.tratamiento).count(), 9)
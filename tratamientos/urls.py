@@ -21,6 +21,8 @@ urlpatterns = [
     path('<int:tratamiento_pk>/estado-cuenta/', views.EstadoCuentaDetailView.as_view(), name='estado_cuenta'),
     path('<int:tratamiento_pk>/estado-cuenta/editar/', views.EstadoCuentaUpdateView.as_view(), name='estado_cuenta_editar'),
     
+    path('cuentas-por-cobrar/', views.CuentasPorCobrarView.as_view(), name='cuentas_por_cobrar'),
+
     # Anticipos
     path('<int:tratamiento_pk>/anticipos/crear/', views.AnticipoCreateView.as_view(), name='anticipo_crear'),
     path('anticipos/<int:pk>/editar/', views.AnticipoUpdateView.as_view(), name='anticipo_editar'),
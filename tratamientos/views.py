@@ -1,17 +1,29 @@
 
 
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from fisioterapia.paginacion import CursorPaginationMixin
+from fisioterapia import contadores, exportacion
 from django.urls import reverse_lazy
 from django.contrib import messages
-from tratamientos.models import TratamientoEstetico, MedidasZona, EvolucionTratamientoEstetico, ZonaCorporal, EstadoCuenta, Anticipo
+from django.db import transaction
+from tratamientos.models import TratamientoEstetico, MedidasZona, EvolucionTratamientoEstetico, EstadoCuenta, Anticipo
+from tratamientos import cuentas_por_cobrar, medidas
 from tratamientos.forms import TratamientoEstaticoForm, MedidasZonaForm, EvolucionTratamientoEstaticoForm, EstadoCuentaForm, AnticipoForm
 from pacientes.models import Paciente
-from datetime import date
+from django.db.models import Count, Prefetch
 
 # ...existing code...
 
+
+def zonas_con_medidas(tratamiento):
+    """Zonas del tratamiento con sus medidas y el cambio entre sesiones en dos consultas."""
+    return tratamiento.zonas_corporales.prefetch_related(
+        Prefetch('medidas', queryset=MedidasZona.objects.con_cambio())
+    )
+
 # Colocar la vista de eliminación al final para asegurar importaciones
 class TratamientoEstaticoDeleteView(LoginRequiredMixin, DeleteView):
     model = TratamientoEstetico
@@ -22,12 +34,13 @@ class TratamientoEstaticoDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy('tratamientos:lista')
 
 
-class TratamientoEstaticoListView(LoginRequiredMixin, ListView):
+class TratamientoEstaticoListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """Lista de tratamientos estéticos."""
     model = TratamientoEstetico
     template_name = 'tratamientos/tratamiento_list.html'
     context_object_name = 'tratamientos'
     paginate_by = 20
+    cursor_campo = 'fecha_inicio'
 
     def get_queryset(self):
         queryset = TratamientoEstetico.objects.all().order_by('-fecha_inicio')
@@ -46,11 +59,13 @@ class TratamientoEstaticoListView(LoginRequiredMixin, ListView):
                 paciente__apellidos__icontains=buscar
             )
         
-        return queryset
+        return queryset.select_related('paciente').annotate(
+            num_evoluciones=Count('evoluciones')
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_activos'] = TratamientoEstetico.objects.filter(activo=True).count()
+        context['total_activos'] = contadores.valor('tratamientos_activos')
         context['buscar'] = self.request.GET.get('buscar', '')
         context['activos'] = self.request.GET.get('activos', '')
         return context
@@ -62,11 +77,13 @@ class TratamientoEstaticoDetailView(LoginRequiredMixin, DetailView):
     template_name = 'tratamientos/tratamiento_detail.html'
     context_object_name = 'tratamiento'
 
+    def get_queryset(self):
+        return TratamientoEstetico.objects.select_related('paciente', 'historia_clinica')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        tratamiento = self.get_object()
-        context['zonas'] = tratamiento.zonas_corporales.all()
-        context['evoluciones'] = tratamiento.evoluciones.all()
+        context['zonas'] = zonas_con_medidas(self.object)
+        context['evoluciones'] = self.object.evoluciones.all()
         return context
 
 
@@ -83,84 +100,12 @@ class TratamientoEstaticoCreateView(LoginRequiredMixin, CreateView):
         return context
 
     def form_valid(self, form):
-        # Guardar el tratamiento
-        response = super().form_valid(form)
-        tratamiento = self.object
-
-        # Procesar zonas y medidas
-        zona_principal = self.request.POST.get('zona_principal')
-
-        if zona_principal == 'abdomen':
-            self._crear_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s67'), 6)
-        elif zona_principal == 'espalda':
-            self._crear_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s67'), 6)
-        elif zona_principal == 'pierna':
-            self._crear_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s1'), 1)
-            self._crear_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s34'), 3)
-            self._crear_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s67'), 6)
-            self._crear_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s67'), 6)
-
+        # Tratamiento y cuadrícula de medidas en una sola transacción
+        with transaction.atomic():
+            response = super().form_valid(form)
+            medidas.guardar_cuadricula(self.object, form.cuadricula)
         messages.success(self.request, 'Tratamiento creado correctamente')
         return response
-    
-    def _crear_zona_medida(self, tratamiento, zona_key, valor, numero_sesion):
-        """Crear zona corporal y medida para la sesión especificada."""
-        if not valor:
-            return
-        
-        # Mapeo de claves a zona_corporal choices
-        zona_mapping = {
-            'abdomen_alto': 'abdomen_alto',
-            'cintura': 'cintura',
-            'abdomen_bajo': 'abdomen_bajo',
-            'espalda_alta': 'espalda_alta',
-            'zona_axilar': 'zona_axilar',
-            'espalda_baja': 'espalda_baja',
-            'femur_proximal': 'femur_proximal',
-            'femur_medial': 'femur_medial',
-            'cadera_distal': 'cadera_distal',
-        }
-        
-        zona_choice = zona_mapping.get(zona_key)
-        if not zona_choice:
-            return
-        
-        # Crear o obtener la zona corporal
-        zona_corporal, created = ZonaCorporal.objects.get_or_create(
-            tratamiento=tratamiento,
-            zona=zona_choice
-        )
-        
-        # Crear la medida para la sesión especificada
-        MedidasZona.objects.get_or_create(
-            zona_corporal=zona_corporal,
-            numero_sesion=numero_sesion,
-            defaults={
-                'medida_cm': float(valor),
-                'fecha_medicion': date.today(),
-            }
-        )
 
     def get_success_url(self):
         return reverse_lazy('tratamientos:detalle', kwargs={'pk': self.object.pk})
@@ -178,112 +123,15 @@ class TratamientoEstaticoUpdateView(LoginRequiredMixin, UpdateView):
         context['accion'] = 'editar'
         
         # Cargar medidas existentes para mostrar en el formulario
-        tratamiento = self.object
-        zonas = tratamiento.zonas_corporales.all()
-        
-        medidas_existentes = {}
-        for zona in zonas:
-            zona_key = zona.zona
-            for medida in zona.medidas.all():
-                sesion = medida.numero_sesion
-                if sesion == 1:
-                    sufijo = '_s1'
-                elif sesion == 3:
-                    sufijo = '_s34'
-                elif sesion == 6:
-                    sufijo = '_s67'
-                else:
-                    continue
-                medidas_existentes[f"{zona_key}{sufijo}"] = float(medida.medida_cm)
-        
-        context['medidas_existentes'] = medidas_existentes
+        context['medidas_existentes'] = medidas.valores_formulario(self.object)
         return context
     
     def form_valid(self, form):
-        # Guardar el tratamiento
-        response = super().form_valid(form)
-        tratamiento = self.object
-        
-        # Procesar zonas y medidas
-        zona_principal = self.request.POST.get('zona_principal')
-        
-        if zona_principal == 'abdomen':
-            self._actualizar_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'abdomen_alto', self.request.POST.get('abdomen_alto_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'cintura', self.request.POST.get('cintura_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'abdomen_bajo', self.request.POST.get('abdomen_bajo_s67'), 6)
-        elif zona_principal == 'espalda':
-            self._actualizar_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'espalda_alta', self.request.POST.get('espalda_alta_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'zona_axilar', self.request.POST.get('zona_axilar_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'espalda_baja', self.request.POST.get('espalda_baja_s67'), 6)
-        elif zona_principal == 'pierna':
-            self._actualizar_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s1'), 1)
-            self._actualizar_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s34'), 3)
-            self._actualizar_zona_medida(tratamiento, 'femur_proximal', self.request.POST.get('femur_proximal_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'femur_medial', self.request.POST.get('femur_medial_s67'), 6)
-            self._actualizar_zona_medida(tratamiento, 'cadera_distal', self.request.POST.get('cadera_distal_s67'), 6)
-        
+        with transaction.atomic():
+            response = super().form_valid(form)
+            medidas.guardar_cuadricula(self.object, form.cuadricula)
         messages.success(self.request, 'Tratamiento actualizado correctamente')
         return response
-    
-    def _actualizar_zona_medida(self, tratamiento, zona_key, valor, numero_sesion):
-        """Actualizar zona corporal y medida para la sesión especificada."""
-        if not valor:
-            return
-        
-        # Mapeo de claves a zona_corporal choices
-        zona_mapping = {
-            'abdomen_alto': 'abdomen_alto',
-            'cintura': 'cintura',
-            'abdomen_bajo': 'abdomen_bajo',
-            'espalda_alta': 'espalda_alta',
-            'zona_axilar': 'zona_axilar',
-            'espalda_baja': 'espalda_baja',
-            'femur_proximal': 'femur_proximal',
-            'femur_medial': 'femur_medial',
-            'cadera_distal': 'cadera_distal',
-        }
-        
-        zona_choice = zona_mapping.get(zona_key)
-        if not zona_choice:
-            return
-        
-        # Crear o obtener la zona corporal
-        zona_corporal, created = ZonaCorporal.objects.get_or_create(
-            tratamiento=tratamiento,
-            zona=zona_choice
-        )
-        
-        # Actualizar o crear la medida para la sesión especificada
-        medida, created = MedidasZona.objects.get_or_create(
-            zona_corporal=zona_corporal,
-            numero_sesion=numero_sesion,
-            defaults={
-                'medida_cm': float(valor),
-                'fecha_medicion': date.today(),
-            }
-        )
-        
-        # Si ya existe, actualizar el valor
-        if not created:
-            medida.medida_cm = float(valor)
-            medida.fecha_medicion = date.today()
-            medida.save()
 
     def get_success_url(self):
         return reverse_lazy('tratamientos:detalle', kwargs={'pk': self.object.pk})
@@ -344,8 +192,8 @@ class EstadoCuentaDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         context['tratamiento'] = get_object_or_404(TratamientoEstetico, pk=self.kwargs['tratamiento_pk'])
         context['anticipos'] = context['estado_cuenta'].anticipos.all()
-        context['total_pagado'] = context['estado_cuenta'].obtener_total_pagado()
-        context['saldo_pendiente'] = context['estado_cuenta'].obtener_saldo_pendiente()
+        context['total_pagado'] = context['estado_cuenta'].total_pagado
+        context['saldo_pendiente'] = context['estado_cuenta'].saldo_pendiente
         return context
 
 
@@ -433,9 +281,36 @@ class TratamientoHistorialView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['zonas'] = self.object.zonas_corporales.all()
+        context['zonas'] = zonas_con_medidas(self.object)
         context['evoluciones'] = self.object.evoluciones.all()
         return context
 
 
+class CuentasPorCobrarView(LoginRequiredMixin, TemplateView):
+    """Reporte de cuentas por cobrar (cacheado por día); ``?formato=csv|xlsx`` lo descarga."""
+    template_name = 'tratamientos/cuentas_por_cobrar.html'
+    # Pacientes mostrados en la página; la exportación incluye todos
+    pacientes_en_pagina = 50
+
+    def get(self, request, *args, **kwargs):
+        reporte = cuentas_por_cobrar.obtener(actualizar=request.GET.get('actualizar') == '1')
+        formato = request.GET.get('formato')
+        nombre = f'cuentas_por_cobrar_{reporte["fecha"].isoformat()}'
+        if formato == 'xlsx':
+            return exportacion.respuesta_xlsx(f'{nombre}.xlsx', cuentas_por_cobrar.hojas(reporte))
+        if formato == 'csv':
+            seccion = request.GET.get('seccion', 'pacientes')
+            if seccion not in cuentas_por_cobrar.SECCIONES:
+                return JsonResponse({'error': 'Sección inválida.'}, status=400)
+            _, encabezados = cuentas_por_cobrar.SECCIONES[seccion]
+            return exportacion.respuesta_csv(f'{nombre}_{seccion}.csv', encabezados, reporte[seccion])
+        if formato:
+            return JsonResponse({'error': 'Formato inválido.'}, status=400)
+        return self.render_to_response(self.get_context_data(reporte=reporte, **kwargs))
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        reporte = context['reporte']
+        context['pacientes'] = reporte['pacientes'][:self.pacientes_en_pagina]
+        context['secciones'] = cuentas_por_cobrar.SECCIONES
+        return context